@@ -1,6 +1,9 @@
 from collections.abc import AsyncGenerator
+from collections.abc import Sequence
 from functools import lru_cache
+from typing import TYPE_CHECKING
 from typing import Annotated
+from typing import cast
 
 import httpx
 from fastapi import Depends
@@ -13,6 +16,11 @@ from pqnstack.network.client import Client
 from pqnstack.pqn.drivers.rotaryencoder import MockRotaryEncoder
 from pqnstack.pqn.drivers.rotaryencoder import RotaryEncoderInstrument
 from pqnstack.pqn.drivers.rotaryencoder import SerialRotaryEncoder
+from pqnstack.pqn.protocols.rng import RandomnessPool
+from pqnstack.pqn.protocols.rng import ToeplitzExtractor
+
+if TYPE_CHECKING:
+    from pqnstack.base.instrument import TimeTaggerInstrument
 
 
 async def get_http_client() -> AsyncGenerator[httpx.AsyncClient, None]:
@@ -50,3 +58,38 @@ def get_rotary_encoder() -> RotaryEncoderInstrument:
 
 
 SERDep = Annotated[RotaryEncoderInstrument, Depends(get_rotary_encoder)]
+
+
+@lru_cache
+def get_rng_pool() -> RandomnessPool | None:
+    rng_settings = settings.rng_settings
+    if not rng_settings.pool_enabled:
+        return None
+    if settings.timetagger is None:
+        logger.warning("Randomness pool enabled but no timetagger configured, pool disabled")
+        return None
+
+    provider_name, tagger_name = settings.timetagger
+    tagger: TimeTaggerInstrument | None = None
+
+    def count_singles() -> Sequence[int]:
+        # Instantiated lazily so the client's socket belongs to the harvester thread.
+        nonlocal tagger
+        if tagger is None:
+            client = Client(host=settings.router_address, port=settings.router_port, timeout=60_000)
+            tagger = cast("TimeTaggerInstrument", client.get_device(provider_name, tagger_name))
+        return tagger.count_singles(rng_settings.channels, rng_settings.pool_integration_time_s)
+
+    n_in = rng_settings.pool_extractor_input_bits
+    pool = RandomnessPool(
+        source=count_singles,
+        extractor=ToeplitzExtractor(n_in=n_in, n_out=max(1, int(n_in * rng_settings.pool_extraction_ratio))),
+        capacity_bits=rng_settings.pool_capacity_bits,
+        low_watermark_bits=rng_settings.pool_low_watermark_bits,
+        high_watermark_bits=rng_settings.pool_high_watermark_bits,
+    )
+    pool.start()
+    return pool
+
+
+RNGPoolDep = Annotated[RandomnessPool | None, Depends(get_rng_pool)]
@@ -5,6 +5,7 @@ from pqnstack.app.api.routes import coordination
 from pqnstack.app.api.routes import debug
 from pqnstack.app.api.routes import games
 from pqnstack.app.api.routes import health
+from pqnstack.app.api.routes import metrics
 from pqnstack.app.api.routes import qkd
 from pqnstack.app.api.routes import rng
 from pqnstack.app.api.routes import serial
@@ -20,3 +21,4 @@ api_router.include_router(coordination.router)
 api_router.include_router(debug.router)
 api_router.include_router(games.router)
 api_router.include_router(health.router)
+api_router.include_router(metrics.router)
@@ -1,8 +1,9 @@
 import asyncio
 import json
 import logging
+import time
 from collections.abc import AsyncGenerator
-from typing import TYPE_CHECKING
+from dataclasses import dataclass
 from typing import cast
 
 from fastapi import APIRouter
@@ -15,21 +16,33 @@ from pqnstack.app.api.deps import ClientDep
 from pqnstack.app.api.deps import StateDep
 from pqnstack.app.core.config import chsh_progress_event
 from pqnstack.app.core.config import settings
-from pqnstack.app.core.models import calculate_chsh_expectation_error
+from pqnstack.base.instrument import RotatorInstrument
 from pqnstack.network.client import Client
-
-if TYPE_CHECKING:
-    from pqnstack.base.instrument import RotatorInstrument
+from pqnstack.pqn.protocols.statistics import calculate_chsh_expectation_error
 
 logger = logging.getLogger(__name__)
 
 
+class ChshStepTiming(BaseModel):
+    step: int
+    leader_angle: float
+    follower_index: int
+    perp: bool
+    leader_move_s: float
+    follower_move_s: float
+    move_wall_s: float  # Time between the end of the previous measurement and the start of this one.
+    measure_s: float
+
+
 class ChshResult(BaseModel):
     chsh_value: float
     chsh_error: float
     expectation_values: list[float]
     expectation_errors: list[float]
     expectation_values_sign_fixed: list[float]
+    elapsed_s: float = 0.0
+    move_time_saved_s: float = 0.0  # Serial move time minus the time actually spent waiting on motors.
+    step_timings: list[ChshStepTiming] = []
 
 
 router = APIRouter(prefix="/chsh", tags=["chsh"])
@@ -76,6 +89,171 @@ async def chsh_progress(state: StateDep) -> StreamingResponse:
     )
 
 
+@dataclass(frozen=True, slots=True)
+class _ChshStep:
+    leader_angle: float
+    follower_index: int
+    perp: bool
+
+
+def _chsh_schedule(basis: tuple[float, float]) -> list[_ChshStep]:
+    """Return the 16 CHSH settings in measurement order, every 4 consecutive steps make one expectation value."""
+    return [
+        _ChshStep(leader_angle=a, follower_index=i, perp=perp)
+        for angle in basis  # Going through my basis angles
+        for i in range(2)  # Going through follower basis angles
+        for a in [angle, angle + 90]
+        for perp in [False, True]
+    ]
+
+
+async def _send_follower_schedule(http_client: ClientDep, follower_node_address: str, steps: list[_ChshStep]) -> None:
+    r = await http_client.post(
+        f"http://{follower_node_address}/chsh/request-angle-schedule",
+        json=[[step.follower_index, step.perp] for step in steps],
+    )
+    if r.status_code != status.HTTP_200_OK:
+        logger.error("Failed to send angle schedule to follower: %s", r.text)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to send angle schedule to follower",
+        )
+
+
+async def _move_leader(hwp: RotatorInstrument, angle: float) -> float:
+    start = time.perf_counter()
+    await asyncio.to_thread(hwp.move_to, angle / 2)
+    return time.perf_counter() - start
+
+
+async def _move_follower(http_client: ClientDep, follower_node_address: str, step: int) -> float:
+    url = f"http://{follower_node_address}/chsh/request-angle-by-step?step={step}"
+    r = await http_client.post(url)
+    if r.is_server_error:
+        # The follower resolves its waveplate again after a timeout or a lost connection, worth one more try.
+        logger.warning("Follower failed to move for step %s, retrying: %s", step, r.text)
+        r = await http_client.post(url)
+    if r.status_code == status.HTTP_400_BAD_REQUEST:
+        logger.error("Follower rejected step %s: %s", step, r.text)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Follower is out of sync with the CHSH angle schedule",
+        )
+    if r.status_code != status.HTTP_200_OK:
+        logger.error("Failed to request follower: %s", r.text)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to request follower",
+        )
+    return cast("float", r.json())
+
+
+async def _move_step(
+    hwp: RotatorInstrument,
+    http_client: ClientDep,
+    follower_node_address: str,
+    steps: list[_ChshStep],
+    index: int,
+) -> tuple[float, float]:
+    """Move both waveplates for step `index` at the same time, skipping the leader if it is already in place."""
+    leader_in_place = index > 0 and steps[index - 1].leader_angle == steps[index].leader_angle
+    leader_move = asyncio.sleep(0, result=0.0) if leader_in_place else _move_leader(hwp, steps[index].leader_angle)
+    leader_s, follower_s = await asyncio.gather(leader_move, _move_follower(http_client, follower_node_address, index))
+    return leader_s, follower_s
+
+
+async def _measure_correlation(http_client: ClientDep, timetagger_address: str) -> int:
+    config = settings.chsh_settings.measurement_config
+    count_ret = await http_client.get(
+        f"http://{timetagger_address}/timetagger/measure_correlation?integration_time_s={config.integration_time_s}&coincidence_window_ps={config.binwidth_ps}&channel1={config.channel1}&channel2={config.channel2}&dark_count={config.dark_count}"
+    )
+    if count_ret.status_code != status.HTTP_200_OK:
+        logger.error("Failed to get correlation from timetagger: %s", count_ret.text)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get correlation from timetagger",
+        )
+    return cast("int", count_ret.json())
+
+
+def _expectation_values(steps: list[_ChshStep], counts: list[int]) -> tuple[list[float], list[float]]:
+    dark_count = settings.chsh_settings.measurement_config.dark_count
+    expectation_values: list[float] = []
+    expectation_errors: list[float] = []
+    for group in range(len(steps) // 4):
+        group_counts = counts[4 * group : 4 * group + 4]
+
+        # Calculating expectation value
+        numerator = group_counts[0] - group_counts[1] - group_counts[2] + group_counts[3]
+        denominator = sum(group_counts) - 4 * dark_count
+        expectation_value = 0 if denominator == 0 else numerator / denominator
+        expectation_values.append(expectation_value)
+
+        # Calculating error
+        error = calculate_chsh_expectation_error(group_counts, dark_count)
+        expectation_errors.append(error)
+
+        logger.info(
+            "For angle %s, for follower index %s, expectation value: %s, error: %s",
+            steps[4 * group].leader_angle,
+            steps[4 * group].follower_index,
+            expectation_value,
+            error,
+        )
+    return expectation_values, expectation_errors
+
+
+def _get_hwp() -> RotatorInstrument:
+    logger.debug("Instantiating client")
+    client = Client(host=settings.router_address, port=settings.router_port, timeout=600_000)
+
+    # TODO: Check if settings.chsh_settings.hwp is set before even trying to get the device.
+    hwp = cast("RotatorInstrument", client.get_device(settings.chsh_settings.hwp[0], settings.chsh_settings.hwp[1]))
+    if hwp is None:
+        logger.error("Could not find half waveplate device")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find half waveplate device",
+        )
+    return hwp
+
+
+async def _run_schedule(  # noqa: PLR0913
+    hwp: RotatorInstrument,
+    http_client: ClientDep,
+    follower_node_address: str,
+    timetagger_address: str,
+    steps: list[_ChshStep],
+    state: StateDep,
+) -> tuple[list[int], list[ChshStepTiming]]:
+    counts: list[int] = []
+    step_timings: list[ChshStepTiming] = []
+    for index, step in enumerate(steps):
+        move_start = time.perf_counter()
+        leader_move_s, follower_move_s = await _move_step(hwp, http_client, follower_node_address, steps, index)
+
+        measure_start = time.perf_counter()
+        counts.append(await _measure_correlation(http_client, timetagger_address))
+        step_timings.append(
+            ChshStepTiming(
+                step=index,
+                leader_angle=step.leader_angle,
+                follower_index=step.follower_index,
+                perp=step.perp,
+                leader_move_s=leader_move_s,
+                follower_move_s=follower_move_s,
+                move_wall_s=measure_start - move_start,
+                measure_s=time.perf_counter() - measure_start,
+            )
+        )
+
+        # Update progress
+        state.chsh_progress_current += 1
+        chsh_progress_event.set()
+
+    return counts, step_timings
+
+
 async def _chsh(  # Complexity is high due to the nature of the CHSH experiment.
     basis: tuple[float, float],
     follower_node_address: str,
@@ -84,6 +262,7 @@ async def _chsh(  # Complexity is high due to the nature of the CHSH experiment.
     state: StateDep,
 ) -> ChshResult:
     logger.debug("Starting CHSH")
+    run_start = time.perf_counter()
 
     # Initialize progress tracking
     state.chsh_running = True
@@ -91,73 +270,26 @@ async def _chsh(  # Complexity is high due to the nature of the CHSH experiment.
     state.chsh_progress_total = 16  # 2 basis x 2 follower x 2 angles x 2 perp
     chsh_progress_event.set()
 
-    logger.debug("Instantiating client")
-    client = Client(host=settings.router_address, port=settings.router_port, timeout=600_000)
-
-    # TODO: Check if settings.chsh_settings.hwp is set before even trying to get the device.
-    hwp = cast("RotatorInstrument", client.get_device(settings.chsh_settings.hwp[0], settings.chsh_settings.hwp[1]))
-    if hwp is None:
-        logger.error("Could not find half waveplate device")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Could not find half waveplate device",
-        )
+    basis = (0, abs(basis[0] - basis[1]) % 90)
+    steps = _chsh_schedule(basis)
 
+    # The follower gets every step up front so each step afterwards is a single, argument-free move request. It
+    # resolves its waveplate while we resolve ours.
+    hwp, _ = await asyncio.gather(
+        asyncio.to_thread(_get_hwp), _send_follower_schedule(http_client, follower_node_address, steps)
+    )
     logger.debug("Halfwaveplate device found: %s", hwp)
 
-    expectation_values = []
-    expectation_errors = []
-    basis = (0, abs(basis[0] - basis[1]) % 90)
-    for angle in basis:  # Going through my basis angles
-        for i in range(2):  # Going through follower basis angles
-            counts = []
-            for a in [angle, (angle + 90)]:
-                hwp.move_to(a / 2)
-                for perp in [False, True]:
-                    r = await http_client.post(
-                        f"http://{follower_node_address}/chsh/request-angle-by-basis?index={i}&perp={perp}"
-                    )
-                    # TODO: Handle other status codes
-                    if r.status_code != status.HTTP_200_OK:
-                        logger.error("Failed to request follower: %s", r.text)
-                        raise HTTPException(
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Failed to request follower",
-                        )
-
-                    count_ret = await http_client.get(
-                        f"http://{timetagger_address}/timetagger/measure_correlation?integration_time_s={settings.chsh_settings.measurement_config.integration_time_s}&coincidence_window_ps={settings.chsh_settings.measurement_config.binwidth_ps}&channel1={settings.chsh_settings.measurement_config.channel1}&channel2={settings.chsh_settings.measurement_config.channel2}&dark_count={settings.chsh_settings.measurement_config.dark_count}"
-                    )
-                    if count_ret.status_code != status.HTTP_200_OK:
-                        logger.error("Failed to get correlation from timetagger: %s", count_ret.text)
-                        raise HTTPException(
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Failed to get correlation from timetagger",
-                        )
-                    count = cast("int", count_ret.json())
-                    counts.append(count)
-
-                    # Update progress
-                    state.chsh_progress_current += 1
-                    chsh_progress_event.set()
-
-            # Calculating expectation value
-            numerator = counts[0] - counts[1] - counts[2] + counts[3]
-            denominator = sum(counts) - 4 * settings.chsh_settings.measurement_config.dark_count
-            expectation_value = 0 if denominator == 0 else numerator / denominator
-            expectation_values.append(expectation_value)
-
-            # Calculating error
-            error = calculate_chsh_expectation_error(counts, settings.chsh_settings.measurement_config.dark_count)
-            expectation_errors.append(error)
-
-            logger.info(
-                "For angle %s, for follower index %s, expectation value: %s, error: %s",
-                angle,
-                i,
-                expectation_value,
-                error,
-            )
+    try:
+        counts, step_timings = await _run_schedule(
+            hwp, http_client, follower_node_address, timetagger_address, steps, state
+        )
+    finally:
+        # Mark CHSH as complete
+        state.chsh_running = False
+        chsh_progress_event.set()
+
+    expectation_values, expectation_errors = _expectation_values(steps, counts)
 
     logger.info("Expectation values: %s", expectation_values)
     logger.info("Expectation errors: %s", expectation_errors)
@@ -171,9 +303,10 @@ async def _chsh(  # Complexity is high due to the nature of the CHSH experiment.
     chsh_value = abs(sum(x for x in expectation_values_sign_fixed))
     chsh_error = sum(x**2 for x in expectation_errors) ** 0.5
 
-    # Mark CHSH as complete
-    state.chsh_running = False
-    chsh_progress_event.set()
+    serial_move_s = sum(t.leader_move_s + t.follower_move_s for t in step_timings)
+    move_time_saved_s = serial_move_s - sum(t.move_wall_s for t in step_timings)
+    elapsed_s = time.perf_counter() - run_start
+    logger.info("CHSH took %.2f s, overlapping motor moves saved %.2f s", elapsed_s, move_time_saved_s)
 
     return ChshResult(
         chsh_value=chsh_value,
@@ -181,6 +314,9 @@ async def _chsh(  # Complexity is high due to the nature of the CHSH experiment.
         expectation_values=expectation_values,
         expectation_errors=expectation_errors,
         expectation_values_sign_fixed=expectation_values_sign_fixed,
+        elapsed_s=elapsed_s,
+        move_time_saved_s=move_time_saved_s,
+        step_timings=step_timings,
     )
 
 
@@ -196,8 +332,7 @@ async def chsh(
     return await _chsh(basis, follower_node_address, http_client, timetagger_address, state)
 
 
-@router.post("/request-angle-by-basis")
-async def request_angle_by_basis(index: int, state: StateDep, *, perp: bool = False) -> bool:
+def _get_request_hwp() -> RotatorInstrument:
     client = Client(host=settings.router_address, port=settings.router_port, timeout=600_000)
     hwp = cast(
         "RotatorInstrument",
@@ -208,8 +343,54 @@ async def request_angle_by_basis(index: int, state: StateDep, *, perp: bool = Fa
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Could not find half waveplate device",
         )
+    return hwp
+
+
+@router.post("/request-angle-by-basis")
+async def request_angle_by_basis(index: int, state: StateDep, *, perp: bool = False) -> bool:
+    hwp = _get_request_hwp()
 
     angle = state.chsh_request_basis[index] + 90 * perp
     hwp.move_to(angle / 2)
     logger.info("moving waveplate", extra={"angle": angle})
     return True
+
+
+@router.post("/request-angle-schedule")
+async def request_angle_schedule(schedule: list[tuple[int, bool]], state: StateDep) -> int:
+    """Store the follower HWP angle for every step of a CHSH run, given as (basis index, perpendicular) pairs."""
+    if any(not 0 <= index < len(state.chsh_request_basis) for index, _ in schedule):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Basis indices must be smaller than {len(state.chsh_request_basis)}",
+        )
+
+    state.chsh_request_hwp = await asyncio.to_thread(_get_request_hwp)
+    state.chsh_request_schedule = [state.chsh_request_basis[index] + 90 * perp for index, perp in schedule]
+    logger.info("Received CHSH angle schedule with %d steps", len(schedule))
+    return len(schedule)
+
+
+@router.post("/request-angle-by-step")
+async def request_angle_by_step(step: int, state: StateDep) -> float:
+    """Move to the angle of `step` in the stored schedule and return how long the move took in seconds."""
+    if not 0 <= step < len(state.chsh_request_schedule):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Step {step} is not part of the current angle schedule",
+        )
+
+    hwp = state.chsh_request_hwp
+    if hwp is None:
+        hwp = state.chsh_request_hwp = await asyncio.to_thread(_get_request_hwp)
+
+    angle = state.chsh_request_schedule[step]
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(hwp.move_to, angle / 2)
+    except (TimeoutError, ConnectionError):
+        # The proxy may belong to a provider or router that went away, the next step resolves the waveplate again.
+        state.chsh_request_hwp = None
+        raise
+    logger.info("moving waveplate", extra={"angle": angle, "step": step})
+    return time.perf_counter() - start
@@ -17,6 +17,7 @@ from pqnstack.app.api.deps import StateDep
 from pqnstack.app.core.config import NodeRole
 from pqnstack.app.core.config import ask_user_for_follow_event
 from pqnstack.app.core.config import protocol_cancelled_event
+from pqnstack.app.core.config import qkd_follower_ready_event
 from pqnstack.app.core.config import settings
 from pqnstack.app.core.config import user_replied_event
 
@@ -86,9 +87,14 @@ async def reset_coordination_state(state: StateDep, http_client: ClientDep) -> R
     state.qkd_follower_basis_list = []
     state.qkd_single_bit_current_index = 0
     state.qkd_resulting_bit_list = []
+    state.qkd_cascade_responder = None
     state.qkd_request_basis_list = []
     state.qkd_request_bit_list = []
     state.qkd_n_matching_bits = -1
+    state.qkd_seconds_per_bit = 0.0
+    state.qkd_seconds_per_key_bit = None
+    state.qkd_qber = None
+    qkd_follower_ready_event.clear()
 
     # Clear the cancellation event for next use
     protocol_cancelled_event.clear()
@@ -1,9 +1,13 @@
+from typing import Any
+
 from fastapi import APIRouter
 
 from pqnstack.app.api.deps import StateDep
 from pqnstack.app.core.config import NodeState
 from pqnstack.app.core.config import Settings
 from pqnstack.app.core.config import settings
+from pqnstack.base.tracing import TRACER
+from pqnstack.base.tracing import TraceFormat
 
 router = APIRouter(prefix="/debug", tags=["debug"])
 
@@ -16,3 +20,9 @@ async def get_state(state: StateDep) -> NodeState:
 @router.get("/settings")
 async def get_settings() -> Settings:
     return settings
+
+
+@router.get("/trace")
+async def get_trace(trace_format: TraceFormat = "chrome") -> dict[str, Any]:
+    """Spans recorded by this node, empty unless the `tracing` setting is on."""
+    return TRACER.chrome_trace() if trace_format == "chrome" else TRACER.otlp_json()
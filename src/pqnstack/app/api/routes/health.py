@@ -1,24 +1,32 @@
+import asyncio
+import contextlib
 import logging
 import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from functools import partial
 from typing import Annotated
+from typing import Any
 
 import httpx
-import serial
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Query
 from pydantic import BaseModel
 from pydantic import Field
 
+from pqnstack.app.api.deps import get_rotary_encoder
+from pqnstack.app.core.config import HealthSettings
 from pqnstack.app.core.config import settings
 from pqnstack.network.client import Client
+from pqnstack.pqn.drivers.rotaryencoder import SerialRotaryEncoder
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/health", tags=["health"])
 
-_ROUTER_TIMEOUT_MS = 5000
-_FOLLOWER_TIMEOUT_S = 5.0
-
 
 class ComponentStatus(BaseModel):
     reachable: bool
@@ -37,6 +45,7 @@ class HealthStatus(BaseModel):
     devices: list[DeviceStatus] = Field(default_factory=list)
     rotary_encoder: ComponentStatus | None = None
     follower_node: ComponentStatus | None = None
+    age_s: float = 0.0  # Seconds since the oldest probe in this report ran.
 
     @property
     def all_ok(self) -> bool:
@@ -57,20 +66,6 @@ def _format_error(exc: BaseException) -> str:
     return f"{type(exc).__name__}: {exc}"
 
 
-def _connect_router() -> tuple[ComponentStatus, Client | None]:
-    start = time.perf_counter()
-    try:
-        client = Client(
-            host=settings.router_address,
-            port=settings.router_port,
-            router_name=settings.router_name,
-            timeout=_ROUTER_TIMEOUT_MS,
-        )
-    except Exception as e:  # noqa: BLE001 - any failure to connect must be reported, not swallowed
-        return ComponentStatus(reachable=False, error=_format_error(e)), None
-    return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start)), client
-
-
 def _configured_devices() -> list[tuple[str, str, str]]:
     """Return deduplicated (provider, name, purpose) triples for all configured devices.
 
@@ -96,91 +91,308 @@ def _configured_devices() -> list[tuple[str, str, str]]:
     return [(provider, name, " / ".join(purposes)) for (provider, name), purposes in merged.items()]
 
 
-def _probe_devices(client: Client) -> list[DeviceStatus]:
-    configured = _configured_devices()
-    # Group by provider so we make one get_available_devices call per provider.
-    by_provider: dict[str, list[tuple[str, str]]] = {}
-    for provider, name, purpose in configured:
-        by_provider.setdefault(provider, []).append((name, purpose))
+def _probe_rotary_encoder(max_sample_age_s: float) -> ComponentStatus | None:
+    if settings.virtual_rotator:
+        return None
+    start = time.perf_counter()
+    try:
+        # The shared encoder keeps the port open and samples it, opening a second handle would reset the board.
+        rotary_encoder = get_rotary_encoder()
+    except Exception as e:  # noqa: BLE001 - any failure must surface, not crash the endpoint
+        return ComponentStatus(reachable=False, error=_format_error(e))
+    if isinstance(rotary_encoder, SerialRotaryEncoder) and rotary_encoder.sample_age_s > max_sample_age_s:
+        return ComponentStatus(
+            reachable=False, error=f"no angle from the rotary encoder for {rotary_encoder.sample_age_s:.1f} s"
+        )
+    return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start))
+
 
+def _device_statuses(
+    provider: str, name_purpose_pairs: list[tuple[str, str]], available: dict[str, str], latency: float
+) -> list[DeviceStatus]:
     results: list[DeviceStatus] = []
-    for provider, name_purpose_pairs in by_provider.items():
+    for name, purpose in name_purpose_pairs:
+        if name in available:
+            results.append(
+                DeviceStatus(provider=provider, name=name, purpose=purpose, reachable=True, latency_ms=latency)
+            )
+        else:
+            results.append(
+                DeviceStatus(
+                    provider=provider,
+                    name=name,
+                    purpose=purpose,
+                    reachable=False,
+                    error=f"device '{name}' not registered on provider '{provider}'",
+                )
+            )
+    return results
+
+
+def _unreachable_devices(name_purpose_pairs: list[tuple[str, str]], provider: str, error: str) -> list[DeviceStatus]:
+    return [
+        DeviceStatus(provider=provider, name=name, purpose=purpose, reachable=False, error=error)
+        for name, purpose in name_purpose_pairs
+    ]
+
+
+async def _with_deadline[T](
+    probe: Callable[[], T],
+    timeout_s: float,
+    on_timeout: Callable[[str], T],
+    on_abandon: Callable[[asyncio.Future[T]], None] | None = None,
+) -> T:
+    """
+    Run a blocking probe in a worker thread, giving up on it after `timeout_s`.
+
+    The thread of a probe that was given up on keeps running, `on_abandon` is called with its future to clean up.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(probe))
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout_s)
+    except TimeoutError:
+        if on_abandon is not None:
+            on_abandon(future)
+        return on_timeout(f"probe timed out after {timeout_s} s")
+
+
+@dataclass(frozen=True, slots=True)
+class _LocalHealth:
+    router: ComponentStatus
+    devices: list[DeviceStatus]
+    rotary_encoder: ComponentStatus | None
+
+
+@dataclass(frozen=True, slots=True)
+class _Sample[T]:
+    value: T
+    taken_at: float  # time.monotonic() when the probe finished.
+
+
+class HealthMonitor:
+    def __init__(self, health_settings: HealthSettings) -> None:
+        """
+        Run the health probes concurrently and cache their latest results.
+
+        The router, every provider, the rotary encoder and the follower node are probed at the same time, each with
+        its own deadline, so a report takes as long as the slowest probe instead of the sum of all of them. Results
+        are reused while they are younger than `max_age_s`, and a background task refreshes them every
+        `monitor_interval_s` so that `/health/` normally answers from the cache.
+
+        zmq clients are kept between probe cycles, one per provider so they can be used concurrently, and are only
+        recreated after a failure.
+        """
+        self.health_settings = health_settings
+        self._clients: dict[str, Client] = {}
+        self._samples: dict[str | None, _Sample[Any]] = {}  # None holds the local probes, addresses the followers.
+        self._inflight: dict[str | None, asyncio.Task[Any]] = {}
+        self._follower_requested_at: dict[str, float] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None and self.health_settings.monitor_interval_s > 0:
+            self._task = asyncio.create_task(self._monitor_loop(), name="health-monitor")
+            logger.info("Health monitor started, probing every %s s", self.health_settings.monitor_interval_s)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for key in list(self._clients):
+            self._drop_client(key)
+
+    async def status(self, follower_node_address: str | None = None, max_age_s: float | None = None) -> HealthStatus:
+        """Latest health report, probing again whatever is older than `max_age_s` (defaults to the settings)."""
+        max_age_s = self.health_settings.max_age_s if max_age_s is None else max_age_s
+        local_task = self._fresh(None, self._probe_local, max_age_s)
+        if follower_node_address:
+            self._follower_requested_at[follower_node_address] = time.monotonic()
+            local, follower = await asyncio.gather(
+                local_task,
+                self._fresh(follower_node_address, partial(self._probe_follower, follower_node_address), max_age_s),
+            )
+        else:
+            local, follower = await local_task, None
+
+        oldest = min(sample.taken_at for sample in (local, follower) if sample is not None)
+        return HealthStatus(
+            router=local.value.router,
+            devices=local.value.devices,
+            rotary_encoder=local.value.rotary_encoder,
+            follower_node=None if follower is None else follower.value,
+            age_s=time.monotonic() - oldest,
+        )
+
+    async def _fresh[T](self, key: str | None, probe: Callable[[], Awaitable[T]], max_age_s: float) -> _Sample[T]:
+        sample = self._samples.get(key)
+        if sample is not None and time.monotonic() - sample.taken_at <= max_age_s:
+            return sample
+
+        # Concurrent requests share the probe that is already running instead of starting their own.
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._take_sample(key, probe))
+        result: _Sample[T] = await asyncio.shield(task)
+        return result
+
+    async def _take_sample[T](self, key: str | None, probe: Callable[[], Awaitable[T]]) -> _Sample[T]:
+        try:
+            sample = _Sample(await probe(), time.monotonic())
+            self._samples[key] = sample
+            return sample
+        finally:
+            del self._inflight[key]
+
+    async def _monitor_loop(self) -> None:
+        interval_s = self.health_settings.monitor_interval_s
+        while True:
+            # Keep refreshing followers that were asked about recently, the daily report and dashboards poll these.
+            now = time.monotonic()
+            for address, requested_at in list(self._follower_requested_at.items()):
+                if now - requested_at > 10 * interval_s:
+                    del self._follower_requested_at[address]
+                    self._samples.pop(address, None)
+
+            try:
+                await self.status(None, max_age_s=0)
+                await asyncio.gather(
+                    *(
+                        self._fresh(address, partial(self._probe_follower, address), 0)
+                        for address in self._follower_requested_at
+                    )
+                )
+            except Exception:
+                logger.exception("Health monitor cycle failed")
+            await asyncio.sleep(interval_s)
+
+    def _client(self, key: str) -> Client:
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = Client(
+                host=settings.router_address,
+                port=settings.router_port,
+                router_name=settings.router_name,
+                timeout=round(self.health_settings.router_timeout_s * 1000),
+            )
+        return client
+
+    def _drop_client(self, key: str, client: Client | None = None) -> None:
+        # A REQ socket that timed out cannot send again, so failed clients are always replaced. Passing `client` only
+        # drops that one, never a client that already replaced it.
+        current = self._clients.get(key)
+        if current is None or (client is not None and current is not client):
+            return
+        del self._clients[key]
+        current.disconnect()
+
+    def _abandon_client(self, key: str, probe: asyncio.Future[Any]) -> None:
+        # The worker thread of a probe that timed out may still be blocked on the client, the next probe must not
+        # share it. It is disconnected once the thread is done with it.
+        client = self._clients.pop(key, None)
+        if client is not None:
+            probe.add_done_callback(lambda _: client.disconnect())
+
+    def _probe_router(self) -> ComponentStatus:
         start = time.perf_counter()
+        client = self._clients.get("")
         try:
+            if client is None:
+                client = self._client("")  # Creating a client registers it with the router.
+            else:
+                client.register()
+        except Exception as e:  # noqa: BLE001 - any failure to connect must be reported, not swallowed
+            if client is not None:
+                self._drop_client("", client)
+            return ComponentStatus(reachable=False, error=_format_error(e))
+        return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start))
+
+    def _probe_provider(self, provider: str, name_purpose_pairs: list[tuple[str, str]]) -> list[DeviceStatus]:
+        start = time.perf_counter()
+        client = None
+        try:
+            client = self._client(provider)
             available = client.get_available_devices(provider)
         except Exception as e:  # noqa: BLE001 - any failure must surface as device status, not a crash
-            err = _format_error(e)
-            results.extend(
-                DeviceStatus(provider=provider, name=name, purpose=purpose, reachable=False, error=err)
-                for name, purpose in name_purpose_pairs
-            )
-            continue
-        latency = _elapsed_ms(start)
-        for name, purpose in name_purpose_pairs:
-            if name in available:
-                results.append(
-                    DeviceStatus(provider=provider, name=name, purpose=purpose, reachable=True, latency_ms=latency)
-                )
-            else:
-                results.append(
-                    DeviceStatus(
-                        provider=provider,
-                        name=name,
-                        purpose=purpose,
-                        reachable=False,
-                        error=f"device '{name}' not registered on provider '{provider}'",
-                    )
+            if client is not None:
+                self._drop_client(provider, client)
+            return _unreachable_devices(name_purpose_pairs, provider, _format_error(e))
+        return _device_statuses(provider, name_purpose_pairs, available, _elapsed_ms(start))
+
+    async def _probe_devices(self) -> tuple[ComponentStatus, list[DeviceStatus]]:
+        hs = self.health_settings
+        by_provider: dict[str, list[tuple[str, str]]] = {}
+        for provider, name, purpose in _configured_devices():
+            by_provider.setdefault(provider, []).append((name, purpose))
+
+        router_status = await _with_deadline(
+            self._probe_router,
+            hs.router_timeout_s,
+            lambda e: ComponentStatus(reachable=False, error=e),
+            partial(self._abandon_client, ""),
+        )
+        if not router_status.reachable:
+            devices = [
+                status
+                for provider, pairs in by_provider.items()
+                for status in _unreachable_devices(pairs, provider, "router unreachable")
+            ]
+            return router_status, devices
+
+        per_provider = await asyncio.gather(
+            *(
+                _with_deadline(
+                    partial(self._probe_provider, provider, pairs),
+                    hs.device_timeout_s,
+                    partial(_unreachable_devices, pairs, provider),
+                    partial(self._abandon_client, provider),
                 )
-    return results
+                for provider, pairs in by_provider.items()
+            )
+        )
+        return router_status, [status for statuses in per_provider for status in statuses]
+
+    async def _probe_local(self) -> _LocalHealth:
+        (router_status, devices), rotary_encoder = await asyncio.gather(
+            self._probe_devices(),
+            _with_deadline(
+                partial(_probe_rotary_encoder, self.health_settings.rotary_encoder_max_sample_age_s),
+                self.health_settings.rotary_encoder_timeout_s,
+                lambda e: ComponentStatus(reachable=False, error=e),
+            ),
+        )
+        return _LocalHealth(router=router_status, devices=devices, rotary_encoder=rotary_encoder)
+
+    async def _probe_follower(self, follower_node_address: str) -> ComponentStatus:
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=self.health_settings.follower_timeout_s) as http:
+                response = await http.get(f"http://{follower_node_address}/")
+            response.raise_for_status()
+        except Exception as e:  # noqa: BLE001 - any failure must surface, not crash the endpoint
+            return ComponentStatus(reachable=False, error=_format_error(e))
+        return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start))
 
 
-def _probe_rotary_encoder() -> ComponentStatus | None:
-    if settings.virtual_rotator:
-        return None
-    start = time.perf_counter()
-    try:
-        with serial.Serial(settings.rotary_encoder_address, 115200, timeout=1):
-            pass
-    except Exception as e:  # noqa: BLE001 - any failure must surface, not crash the endpoint
-        return ComponentStatus(reachable=False, error=_format_error(e))
-    return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start))
+@lru_cache
+def get_health_monitor() -> HealthMonitor:
+    return HealthMonitor(settings.health_settings)
 
 
-def _probe_follower(follower_node_address: str) -> ComponentStatus:
-    start = time.perf_counter()
-    try:
-        with httpx.Client(timeout=_FOLLOWER_TIMEOUT_S) as http:
-            response = http.get(f"http://{follower_node_address}/")
-        response.raise_for_status()
-    except Exception as e:  # noqa: BLE001 - any failure must surface, not crash the endpoint
-        return ComponentStatus(reachable=False, error=_format_error(e))
-    return ComponentStatus(reachable=True, latency_ms=_elapsed_ms(start))
+HealthMonitorDep = Annotated[HealthMonitor, Depends(get_health_monitor)]
 
 
 @router.get("/")
-def health(
+async def health(
+    monitor: HealthMonitorDep,
     follower_node_address: Annotated[str | None, Query()] = None,
+    max_age_s: Annotated[float | None, Query(ge=0)] = None,
 ) -> HealthStatus:
-    """Probe router, configured devices, rotary encoder, and optional follower node."""
-    router_status, client = _connect_router()
+    """
+    Report the router, configured devices, rotary encoder, and optional follower node.
 
-    if client is not None:
-        try:
-            devices = _probe_devices(client)
-        finally:
-            client.disconnect()
-    else:
-        devices = [
-            DeviceStatus(provider=provider, name=name, purpose=purpose, reachable=False, error="router unreachable")
-            for provider, name, purpose in _configured_devices()
-        ]
-
-    rotary_encoder = _probe_rotary_encoder()
-    follower_node = _probe_follower(follower_node_address) if follower_node_address else None
-
-    return HealthStatus(
-        router=router_status,
-        devices=devices,
-        rotary_encoder=rotary_encoder,
-        follower_node=follower_node,
-    )
+    Answers from the health monitor's cache when its results are younger than `max_age_s` (see the health settings),
+    `max_age_s=0` forces a fresh probe.
+    """
+    return await monitor.status(follower_node_address, max_age_s)
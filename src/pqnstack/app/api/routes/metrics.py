@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi import Response
+
+from pqnstack.app.core.config import get_state
+from pqnstack.base.metrics import CONTENT_TYPE
+from pqnstack.base.metrics import REGISTRY
+from pqnstack.base.metrics import Gauge
+
+router = APIRouter(tags=["metrics"])
+
+# Progress is read from the node state when scraped, so the protocols do not need to update the metrics themselves.
+PROGRESS_CURRENT = Gauge("pqnstack_protocol_progress_current", "Steps done in the current protocol run.", ["protocol"])
+PROGRESS_TOTAL = Gauge("pqnstack_protocol_progress_total", "Steps of the current protocol run.", ["protocol"])
+PROGRESS_CURRENT.labels("chsh").set_function(lambda: get_state().chsh_progress_current)
+PROGRESS_TOTAL.labels("chsh").set_function(lambda: get_state().chsh_progress_total)
+PROGRESS_CURRENT.labels("rng").set_function(lambda: get_state().rng_progress_current)
+PROGRESS_TOTAL.labels("rng").set_function(lambda: get_state().rng_progress_total)
+
+
+@router.get("/metrics", response_class=Response)
+async def metrics() -> Response:
+    """Metrics of the node in the Prometheus text exposition format."""
+    return Response(REGISTRY.expose(), media_type=CONTENT_TYPE)
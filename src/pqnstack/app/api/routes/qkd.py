@@ -1,29 +1,52 @@
 import asyncio
+import json
 import logging
 import random
 import secrets
-from typing import TYPE_CHECKING
+import time
+from collections.abc import Coroutine
+from typing import Any
+from typing import Literal
 from typing import cast
 
 import httpx
+import numpy as np
 from fastapi import APIRouter
 from fastapi import HTTPException
+from fastapi import WebSocket
+from fastapi import WebSocketDisconnect
 from fastapi import status
 from pydantic import BaseModel
+from pydantic import ValidationError
+from websockets.asyncio.client import ClientConnection
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
 
 from pqnstack.app.api.deps import ClientDep
 from pqnstack.app.api.deps import StateDep
+from pqnstack.app.api.deps import get_rng_pool
 from pqnstack.app.core.config import NodeRole
 from pqnstack.app.core.config import NodeState
 from pqnstack.app.core.config import protocol_cancelled_event
+from pqnstack.app.core.config import qkd_follower_ready_event
 from pqnstack.app.core.config import qkd_result_received_event
 from pqnstack.app.core.config import settings
-from pqnstack.constants import BasisBool
+from pqnstack.base.instrument import RotatorInstrument
 from pqnstack.constants import QKDEncodingBasis
 from pqnstack.network.client import Client
-
-if TYPE_CHECKING:
-    from pqnstack.base.instrument import RotatorInstrument
+from pqnstack.pqn.protocols.cascade import CascadeReconciler
+from pqnstack.pqn.protocols.cascade import CascadeResponder
+from pqnstack.pqn.protocols.cascade import ParityQuery
+from pqnstack.pqn.protocols.qkd import amplify
+from pqnstack.pqn.protocols.qkd import bases_to_bits
+from pqnstack.pqn.protocols.qkd import choose_sample
+from pqnstack.pqn.protocols.qkd import estimate_qber
+from pqnstack.pqn.protocols.qkd import measurement_outcomes
+from pqnstack.pqn.protocols.qkd import pack_bits
+from pqnstack.pqn.protocols.qkd import secure_key_length
+from pqnstack.pqn.protocols.qkd import sift
+from pqnstack.pqn.protocols.qkd import unpack_bits
+from pqnstack.pqn.protocols.rng import Bits
 
 logger = logging.getLogger(__name__)
 
@@ -35,93 +58,295 @@ class QKDResult(BaseModel):
     n_total_bits: int
     emoji: str
     role: str
+    seconds_per_bit: float = 0.0  # Wall time of the bit exchange divided by the number of raw bits.
+    seconds_per_key_bit: float | None = None  # Wall time of the whole run divided by the final key length.
+    qber: float | None = None  # Only estimated when post-processing is enabled.
+    n_secret_bits: int | None = None  # Key length after error correction and privacy amplification.
 
 
-async def _qkd(
-    follower_node_address: str,
-    http_client: ClientDep,
-    state: StateDep,
-    timetagger_address: str | None = None,
-) -> list[int]:
-    logger.debug("Starting QKD")
-    client = Client(host=settings.router_address, port=settings.router_port, timeout=600_000)
-    hwp = cast("RotatorInstrument", client.get_device(settings.qkd_settings.hwp[0], settings.qkd_settings.hwp[1]))
+class PackedBits(BaseModel):
+    """Bit array on the wire, see `pack_bits`."""
+
+    n_bits: int
+    data: str
+
+    def unpack(self) -> Bits:
+        return unpack_bits(self.data, self.n_bits)
+
+
+class QKDExchange(BaseModel):
+    final_bits: list[int]
+    seconds_per_bit: float
+    seconds_per_key_bit: float | None
+    n_sifted_bits: int
+    qber: float | None = None
+
+
+class SessionMessage(BaseModel):
+    """Message from the leader in a QKD session, see `qkd_session`."""
+
+    event: Literal["step", "done"]
+    index: int | None = None
+
 
+class ParityRequest(BaseModel):
+    seed: int
+    pass_index: int
+    starts: list[int]
+    stops: list[int]
+
+
+class AmplificationRequest(BaseModel):
+    seed: int
+    n_bits: int
+
+
+def _random_bit() -> int:
+    """Draw a bit from the quantum randomness pool, or from the OS when the pool is not enabled."""
+    pool = get_rng_pool()
+    if pool is None:
+        return secrets.randbits(1)
+    return pool.randbits(1)
+
+
+def _get_hwp(device: tuple[str, str]) -> RotatorInstrument:
+    client = Client(host=settings.router_address, port=settings.router_port, timeout=600_000)
+    hwp = cast("RotatorInstrument", client.get_device(device[0], device[1]))
     if hwp is None:
         logger.error("Could not find half waveplate device")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Could not find half waveplate device",
         )
+    return hwp
+
+
+async def _unless_cancelled[T](coro: Coroutine[Any, Any, T]) -> T:
+    """Await `coro`, raising a 409 if the protocol gets cancelled by the peer or the user before it finishes."""
+    task = asyncio.create_task(coro)
+    cancelled = asyncio.create_task(protocol_cancelled_event.wait())
+    done, pending = await asyncio.wait([task, cancelled], return_when=asyncio.FIRST_COMPLETED)
+    for pending_task in pending:
+        pending_task.cancel()
+
+    if task not in done:
+        logger.warning("Protocol cancelled while waiting on QKD peer")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Protocol cancelled by peer or user")
+    return task.result()
+
+
+async def _receive_session_event(session: ClientConnection, expected: str) -> dict[str, Any]:
+    message = cast("dict[str, Any]", json.loads(await _unless_cancelled(session.recv())))
+    if message["event"] == "cancelled":
+        logger.warning("Follower cancelled the QKD session")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Protocol cancelled by peer or user")
+    if message["event"] != expected:
+        logger.error("Unexpected QKD session message, wanted '%s': %s", expected, message)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"QKD session with follower failed: {message.get('detail', message['event'])}",
+        )
+    return message
 
-    counts = []
-    for basis in state.qkd_leader_basis_list:
-        r = await http_client.post(f"http://{follower_node_address}/qkd/single_bit")
 
-        if r.status_code != status.HTTP_200_OK:
-            logger.error("Failed to handshake with follower: %s", r.text)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to handshake with follower",
-            )
-        logger.debug("Handshake with follower successful")
+async def _move_follower(session: ClientConnection, index: int) -> float:
+    await session.send(json.dumps({"event": "step", "index": index}))
+    message = await _receive_session_event(session, "moved")
+    if message["index"] != index:
+        logger.error("Follower acknowledged step %s while waiting for step %s", message["index"], index)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="QKD session with follower went out of sync",
+        )
+    return cast("float", message["move_s"])
+
+
+async def _measure_coincidences(http_client: httpx.AsyncClient, timetagger_address: str | None) -> int:
+    config = settings.chsh_settings.measurement_config
+    count_ret = await http_client.get(
+        f"http://{timetagger_address}/timetagger/measure_correlation?integration_time_s={config.integration_time_s}&coincidence_window_ps={config.binwidth_ps}&channel1={config.channel1}&channel2={config.channel2}&dark_count={config.dark_count}"
+    )
+    if count_ret.status_code != status.HTTP_200_OK:
+        logger.error("Failed to get correlation from timetagger: %s", count_ret.text)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get correlation from timetagger",
+        )
+    return cast("int", count_ret.json())
+
 
-        int_choice = secrets.randbits(1)  # FIXME: Make this real quantum random.
+async def _exchange_bits(
+    session: ClientConnection, http_client: httpx.AsyncClient, state: NodeState, timetagger_address: str | None
+) -> tuple[list[int], float]:
+    """Run the quantum part of QKD over an open session, returning the coincidence counts and the seconds per bit."""
+    n_bits = len(state.qkd_leader_basis_list)
+
+    # Resolve our waveplate while the follower commits to its schedule, it pushes `ready` once it is done.
+    hwp, ready = await asyncio.gather(
+        asyncio.to_thread(_get_hwp, settings.qkd_settings.hwp), _receive_session_event(session, "ready")
+    )
+    if ready["n_bits"] != n_bits:
+        logger.error("Follower committed to %s bits but the leader has %s", ready["n_bits"], n_bits)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Leader and follower basis lists have different lengths",
+        )
+    logger.info("Follower is ready")
+
+    counts = []
+    state.qkd_bit_list = []
+    start = time.perf_counter()
+    for index, basis in enumerate(state.qkd_leader_basis_list):
+        int_choice = _random_bit()
         logger.debug("Chosen integer choice: %s", int_choice)
         state.qkd_bit_list.append(int_choice)
-        hwp.move_to(basis.angles[int_choice].value)
-        logger.debug("Moving half waveplate to angle: %s", basis.angles[int_choice].value)
 
-        count_ret = await http_client.get(
-            f"http://{timetagger_address}/timetagger/measure_correlation?integration_time_s={settings.chsh_settings.measurement_config.integration_time_s}&coincidence_window_ps={settings.chsh_settings.measurement_config.binwidth_ps}&channel1={settings.chsh_settings.measurement_config.channel1}&channel2={settings.chsh_settings.measurement_config.channel2}&dark_count={settings.chsh_settings.measurement_config.dark_count}"
+        # Both waveplates move at the same time, the follower acknowledges once its move is done.
+        await asyncio.gather(
+            _move_follower(session, index), asyncio.to_thread(hwp.move_to, basis.angles[int_choice].value)
         )
-        if count_ret.status_code != status.HTTP_200_OK:
-            logger.error("Failed to get correlation from timetagger: %s", count_ret.text)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to get correlation from timetagger",
-            )
 
-        c = cast("int", count_ret.json())
+        c = await _measure_coincidences(http_client, timetagger_address)
         counts.append(c)
         logger.debug("Counted %d coincidences", c)
+    seconds_per_bit = (time.perf_counter() - start) / max(n_bits, 1)
+
+    await session.send(json.dumps({"event": "done"}))
+    return counts, seconds_per_bit
 
-    def get_outcome(state: int, basis: int, choice: int, counts: int) -> int:
-        above = counts > settings.qkd_settings.discriminating_threshold
-        return ((int(above) ^ choice) ^ (1 - state)) ^ basis
 
-    outcome = []
+async def _qkd(
+    follower_node_address: str,
+    http_client: ClientDep,
+    state: StateDep,
+    timetagger_address: str | None = None,
+) -> QKDExchange:
+    logger.debug("Starting QKD")
+    start = time.perf_counter()
+    try:
+        async with connect(f"ws://{follower_node_address}/qkd/session") as session:
+            counts, seconds_per_bit = await _exchange_bits(session, http_client, state, timetagger_address)
+    except (WebSocketException, OSError) as e:
+        logger.exception("QKD session with follower failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="QKD session with follower failed",
+        ) from e
+    logger.info("Exchanged %d raw bits at %.3f s per bit", len(counts), seconds_per_bit)
+
+    leader_bases = bases_to_bits(state.qkd_leader_basis_list)
+    outcome = measurement_outcomes(
+        leader_bases,
+        np.asarray(state.qkd_bit_list, dtype=np.uint8),
+        counts,
+        settings.qkd_settings.discriminating_threshold,
+        settings.bell_state,
+    )
     logger.debug(
-        "Going for qkd_leader_basis_list: %s, qkd_bit_list: %s, counts: %s",
+        "Going for qkd_leader_basis_list: %s, qkd_bit_list: %s, counts: %s, outcome: %s",
         state.qkd_leader_basis_list,
         state.qkd_bit_list,
         counts,
+        outcome,
     )
-    for basis, choice, count in zip(state.qkd_leader_basis_list, state.qkd_bit_list, counts, strict=False):
-        out = get_outcome(settings.bell_state.value, BasisBool[basis.name].value, choice, count)
-        logger.debug(
-            "Calculating outcome for basis: %s, choice: %s, count: %s, outcome: %s", basis.name, choice, count, out
-        )
-        outcome.append(out)
-
-    basis_list = [basis.name for basis in state.qkd_leader_basis_list]
 
-    # FIXME: Send already binary basis instead of HV/AD.
-    r = await http_client.post(f"http://{follower_node_address}/qkd/request_basis_list", json=basis_list)
+    n_bits = len(leader_bases)
+    r = await http_client.post(
+        f"http://{follower_node_address}/qkd/request_basis_list",
+        json=PackedBits(n_bits=n_bits, data=pack_bits(leader_bases)).model_dump(),
+    )
     if r.status_code != status.HTTP_200_OK:
         logger.error("Failed to request basis list from follower: %s", r.text)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to request basis list from follower",
         )
-    follower_basis_list = r.json()
+    follower_bases = PackedBits.model_validate(r.json()).unpack()
 
-    index_list = [i for i in range(len(follower_basis_list)) if follower_basis_list[i] == basis_list[i]]
-    final_bits = [outcome[i] for i in index_list]
+    sifted = sift(outcome, leader_bases, follower_bases)
+    key, qber = sifted, None
+    if settings.qkd_settings.post_processing:
+        key, qber = await _distill(follower_node_address, http_client, sifted)
 
+    final_bits = key.tolist()
+    state.qkd_resulting_bit_list = final_bits
     logger.info("Final bits: %s", final_bits)
 
-    return final_bits
+    # Sifting and post-processing discard most raw bits, the key rate is what the run is worth.
+    seconds_per_key_bit = (time.perf_counter() - start) / len(final_bits) if final_bits else None
+    return QKDExchange(
+        final_bits=final_bits,
+        seconds_per_bit=seconds_per_bit,
+        seconds_per_key_bit=seconds_per_key_bit,
+        n_sifted_bits=len(sifted),
+        qber=qber,
+    )
+
+
+async def _post_to_follower(http_client: httpx.AsyncClient, url: str, payload: object, error: str) -> Any:
+    r = await http_client.post(url, json=payload)
+    if r.status_code != status.HTTP_200_OK:
+        logger.error("%s: %s", error, r.text)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error)
+    return r.json()
+
+
+async def _distill(follower_node_address: str, http_client: httpx.AsyncClient, sifted: Bits) -> tuple[Bits, float]:
+    """Estimate the QBER on a disclosed sample, then run Cascade and privacy amplification with the follower."""
+    qkd_settings = settings.qkd_settings
+
+    sample = choose_sample(len(sifted), round(len(sifted) * qkd_settings.qber_sample_fraction))
+    peer_sample = await _post_to_follower(
+        http_client,
+        f"http://{follower_node_address}/qkd/disclose_sample",
+        sample.tolist(),
+        "Failed to disclose QBER sample with follower",
+    )
+    qber = estimate_qber(sifted[sample], PackedBits.model_validate(peer_sample).unpack())
+    key = np.delete(sifted, sample)
+
+    cascade_seed = secrets.randbits(63)
+
+    async def ask(query: ParityQuery) -> Bits:
+        request = ParityRequest(
+            seed=cascade_seed, pass_index=query.pass_index, starts=query.starts.tolist(), stops=query.stops.tolist()
+        )
+        parities = await _post_to_follower(
+            http_client,
+            f"http://{follower_node_address}/qkd/cascade_parities",
+            request.model_dump(),
+            "Failed to get Cascade parities from follower",
+        )
+        return PackedBits.model_validate(parities).unpack()
+
+    reconciler = CascadeReconciler(
+        key, qber, cascade_seed, n_passes=qkd_settings.cascade_passes, max_rounds=qkd_settings.cascade_max_rounds
+    )
+    result = await reconciler.run_async(ask)
+    if not result.converged:
+        logger.error("Cascade did not converge after %d rounds", result.rounds)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error correction did not converge within {result.rounds} rounds",
+        )
+
+    n_secret_bits = secure_key_length(len(result.key), qber, result.leaked_bits, qkd_settings.security_parameter)
+    amplification_seed = secrets.randbits(63)
+    await _post_to_follower(
+        http_client,
+        f"http://{follower_node_address}/qkd/amplify",
+        AmplificationRequest(seed=amplification_seed, n_bits=n_secret_bits).model_dump(),
+        "Failed to run privacy amplification with follower",
+    )
+    logger.info(
+        "QBER %.3f, corrected %d bits in %d rounds disclosing %d parities, %d secret bits left",
+        qber,
+        result.corrected_bits,
+        result.rounds,
+        result.leaked_bits,
+        n_secret_bits,
+    )
+    return amplify(result.key, n_secret_bits, amplification_seed), qber
 
 
 @router.post("")
@@ -131,7 +356,11 @@ async def qkd(
     state: StateDep,
     timetagger_address: str | None = None,
 ) -> list[int]:
-    """Perform a QKD protocol with the given follower node."""
+    """
+    Perform a QKD protocol with the given follower node.
+
+    The follower takes part once its user submitted a basis selection, see `/qkd/session`.
+    """
     if not state.qkd_leader_basis_list:
         logger.error("QKD basis list is empty")
         raise HTTPException(
@@ -139,7 +368,8 @@ async def qkd(
             detail="QKD basis list is empty",
         )
 
-    return await _qkd(follower_node_address, http_client, state, timetagger_address)
+    exchange = await _qkd(follower_node_address, http_client, state, timetagger_address)
+    return exchange.final_bits
 
 
 @router.post("/single_bit")
@@ -171,7 +401,7 @@ async def request_qkd_single_pass(state: StateDep) -> bool:
     basis_choice = state.qkd_follower_basis_list[state.qkd_single_bit_current_index]
     state.qkd_single_bit_current_index += 1
 
-    int_choice = secrets.randbits(1)  # FIXME: Make this real quantum random.
+    int_choice = _random_bit()
 
     state.qkd_request_basis_list.append(basis_choice)
     state.qkd_request_bit_list.append(int_choice)
@@ -182,26 +412,159 @@ async def request_qkd_single_pass(state: StateDep) -> bool:
     return True
 
 
+@router.websocket("/session")
+async def qkd_session(websocket: WebSocket, state: StateDep) -> None:
+    """
+    Follower side of a QKD run, driven by the leader over a single websocket.
+
+    Once the user submitted the basis selection, the follower commits to its whole schedule (basis and bit of every
+    step) and pushes `{"event": "ready", "n_bits": n}`. The leader then streams `{"event": "step", "index": i}` for
+    each raw bit, which the follower acknowledges with `{"event": "moved", "index": i, "move_s": t}` after its
+    waveplate arrived, and closes the session with `{"event": "done"}`. Malformed messages are answered with
+    `{"event": "error", "detail": ...}`, a leader silent for longer than the session timeout gets one and is dropped.
+
+    The follower commits to a new schedule for every session, it is only kept for sifting if the session finished.
+    """
+    await websocket.accept()
+    logger.info("Leader opened a QKD session")
+    finished = False
+    try:
+        try:
+            await _unless_cancelled(qkd_follower_ready_event.wait())
+            hwp = await asyncio.to_thread(_get_hwp, settings.qkd_settings.request_hwp)
+        except HTTPException as e:
+            event = "cancelled" if e.status_code == status.HTTP_409_CONFLICT else "error"
+            await websocket.send_json({"event": event, "detail": e.detail})
+            await websocket.close()
+            return
+
+        bases = list(state.qkd_follower_basis_list)
+        bits = [_random_bit() for _ in bases]
+        angles = [basis.angles[bit].value for basis, bit in zip(bases, bits, strict=True)]
+        state.qkd_request_basis_list = bases
+        state.qkd_request_bit_list = bits
+        await websocket.send_json({"event": "ready", "n_bits": len(angles)})
+
+        while True:
+            try:
+                message = SessionMessage.model_validate(
+                    await asyncio.wait_for(websocket.receive_json(), settings.qkd_settings.session_timeout_s)
+                )
+            except TimeoutError:
+                logger.warning(
+                    "Leader sent nothing for %s s, dropping the QKD session", settings.qkd_settings.session_timeout_s
+                )
+                await websocket.send_json({"event": "error", "detail": "QKD session timed out"})
+                await websocket.close()
+                return
+            except (json.JSONDecodeError, ValidationError) as e:
+                logger.warning("Malformed QKD session message: %s", e)
+                await websocket.send_json({"event": "error", "detail": "Malformed QKD session message"})
+                continue
+
+            if message.event == "done":
+                break
+            index = message.index
+            if index is None or not 0 <= index < len(angles):
+                await websocket.send_json({"event": "error", "detail": f"Step {index} is out of range"})
+                continue
+            start = time.perf_counter()
+            await asyncio.to_thread(hwp.move_to, angles[index])
+            await websocket.send_json({"event": "moved", "index": index, "move_s": time.perf_counter() - start})
+        finished = True
+        logger.info("QKD session finished after %d bits", len(angles))
+    except WebSocketDisconnect:
+        logger.warning("Leader disconnected in the middle of the QKD session")
+    finally:
+        qkd_follower_ready_event.clear()
+        if not finished:
+            state.qkd_request_basis_list = []
+            state.qkd_request_bit_list = []
+
+
 @router.post("/request_basis_list")
-def request_qkd_basis_list(leader_basis_list: list[str], state: StateDep) -> list[str]:
-    """Return the list of basis angles for QKD."""
+def request_qkd_basis_list(leader_bases: PackedBits, state: StateDep) -> PackedBits:
+    """Sift the follower's key against the leader's bases and reveal the follower's bases in return."""
     # Check that lengths match
-    if len(leader_basis_list) != len(state.qkd_request_basis_list):
+    if leader_bases.n_bits != len(state.qkd_request_basis_list):
         logger.error("Length of leader basis list does not match length of request basis list")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Length of leader basis list does not match length of request basis list",
         )
 
-    ret = [basis.name for basis in state.qkd_request_basis_list]
-    index_list = [i for i in range(len(leader_basis_list)) if ret[i] == leader_basis_list[i]]
-    final_bits = [state.qkd_request_bit_list[i] for i in index_list]
-    logger.error("Final bits: %s", final_bits)
+    follower_bases = bases_to_bits(state.qkd_request_basis_list)
+    try:
+        leader = leader_bases.unpack()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+    final_bits = sift(np.asarray(state.qkd_request_bit_list, dtype=np.uint8), follower_bases, leader)
+    _set_resulting_key(state, final_bits)
+    logger.info("Final bits: %s", state.qkd_resulting_bit_list)
 
     state.qkd_request_basis_list.clear()
     state.qkd_request_bit_list.clear()
 
-    return ret
+    return PackedBits(n_bits=len(follower_bases), data=pack_bits(follower_bases))
+
+
+def _resulting_key(state: NodeState) -> Bits:
+    return np.asarray(state.qkd_resulting_bit_list, dtype=np.uint8)
+
+
+def _set_resulting_key(state: NodeState, key: Bits) -> None:
+    state.qkd_resulting_bit_list = key.tolist()
+    state.qkd_cascade_responder = None
+
+
+@router.post("/disclose_sample")
+def disclose_sample(positions: list[int], state: StateDep) -> PackedBits:
+    """Reveal the sifted key bits at `positions` for QBER estimation and drop them from the key."""
+    key = _resulting_key(state)
+    if any(not 0 <= position < len(key) for position in positions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sample positions must be smaller than the key length {len(key)}",
+        )
+
+    sample = key[positions]
+    _set_resulting_key(state, np.delete(key, positions))
+    return PackedBits(n_bits=len(sample), data=pack_bits(sample))
+
+
+@router.post("/cascade_parities")
+def cascade_parities(request: ParityRequest, state: StateDep) -> PackedBits:
+    """Answer a batch of Cascade parity queries about the follower's key."""
+    responder = state.qkd_cascade_responder
+    if responder is None or responder.seed != request.seed:
+        responder = state.qkd_cascade_responder = CascadeResponder(_resulting_key(state), request.seed)
+
+    query = ParityQuery(
+        request.pass_index, np.asarray(request.starts, dtype=np.intp), np.asarray(request.stops, dtype=np.intp)
+    )
+    if len(query.starts) != len(query.stops) or not np.all(
+        (query.starts >= 0) & (query.starts < query.stops) & (query.stops <= len(responder.key))
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parity ranges are out of the key bounds")
+
+    parities = responder.parities(query)
+    return PackedBits(n_bits=len(parities), data=pack_bits(parities))
+
+
+@router.post("/amplify")
+def amplify_key(request: AmplificationRequest, state: StateDep) -> int:
+    """Replace the follower's reconciled key by its Toeplitz hash, returning the final key length."""
+    key = _resulting_key(state)
+    if not 0 <= request.n_bits <= len(key):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot amplify a {len(key)} bit key to {request.n_bits} bits",
+        )
+
+    _set_resulting_key(state, amplify(key, request.n_bits, request.seed))
+    logger.info("Privacy amplification left %d secret bits", request.n_bits)
+    return request.n_bits
 
 
 @router.post("/set_emoji")
@@ -290,43 +653,13 @@ async def submit_result(result: QKDResult, state: StateDep) -> None:
     """QKD leader calls this endpoint of the follower to submit the QKD result as well as the emoji chosen."""
     state.qkd_emoji_pick = result.emoji
     state.qkd_n_matching_bits = result.n_matching_bits
+    state.qkd_seconds_per_bit = result.seconds_per_bit
+    state.qkd_seconds_per_key_bit = result.seconds_per_key_bit
+    state.qkd_qber = result.qber
     qkd_result_received_event.set()  # Signal that the result has been received
     logger.info("Received QKD result from follower: %s", result)
 
 
-async def _wait_for_follower_ready(state: NodeState, http_client: httpx.AsyncClient) -> None:
-    """Poll the follower until it's ready, checking every 0.5 seconds."""
-    ready = False
-    first_503 = True
-    while not ready:
-        # Check if protocol was cancelled
-        if protocol_cancelled_event.is_set():
-            logger.warning("Protocol cancelled while waiting for follower ready")
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Protocol cancelled by peer or user")
-
-        r = await http_client.get(f"http://{state.followers_address}/qkd/is_follower_ready")
-
-        # If the follower disconnects while the leader is waiting, the 503 error of `Node is not a follower` error might come before we can handle the cancellation event.
-        if r.status_code == status.HTTP_503_SERVICE_UNAVAILABLE and first_503:
-            logger.warning("Received QKD result from follower: %s", r)
-            first_503 = False
-            continue
-
-        if r.status_code != status.HTTP_200_OK:
-            logger.error("Failed to check if follower is ready: %s", r.text)
-            raise HTTPException(
-                status_code=r.status_code,
-                detail=f"Failed to check if follower is ready, {r.text}",
-            )
-
-        ready = r.json()
-        if not ready:
-            logger.info("Follower is not ready yet, waiting.")
-            await asyncio.sleep(0.4)  # Make sure this is smaller than the protocol_cancelled event clear timer.
-
-    logger.info("Follower is ready")
-
-
 async def _submit_result_to_follower(state: NodeState, http_client: httpx.AsyncClient, qkd_result: QKDResult) -> None:
     """Submit the QKD result to the follower node."""
     r = await http_client.post(f"http://{state.followers_address}/qkd/submit_result", json=qkd_result.model_dump())
@@ -343,17 +676,21 @@ async def _submit_basis_list_leader(
     state: NodeState, http_client: httpx.AsyncClient, basis_list: list[QKDEncodingBasis], timetagger_address: str
 ) -> QKDResult:
     state.qkd_leader_basis_list = basis_list
-    await _wait_for_follower_ready(state, http_client)
 
-    ret = await _qkd(state.followers_address, http_client, state, timetagger_address)
-    logger.info("Final QKD bits: %s", str(ret))
+    # The session waits for the follower's selection by itself, no need to poll for it.
+    exchange = await _qkd(state.followers_address, http_client, state, timetagger_address)
+    logger.info("Final QKD bits: %s", str(exchange.final_bits))
 
     # Assemble QKDResult object
     qkd_result = QKDResult(
-        n_matching_bits=len(ret),
+        n_matching_bits=exchange.n_sifted_bits,
         n_total_bits=settings.qkd_settings.bitstring_length,
         emoji=state.qkd_emoji_pick,
         role="leader",
+        seconds_per_bit=exchange.seconds_per_bit,
+        seconds_per_key_bit=exchange.seconds_per_key_bit,
+        qber=exchange.qber,
+        n_secret_bits=None if exchange.qber is None else len(exchange.final_bits),
     )
 
     # Submit result to follower
@@ -363,26 +700,11 @@ async def _submit_basis_list_leader(
 
 async def _submit_basis_list_follower(state: NodeState, basis_list: list[QKDEncodingBasis]) -> QKDResult:
     state.qkd_follower_basis_list = basis_list
+    qkd_follower_ready_event.set()  # Wakes up the leader's session, if it is already connected.
 
     # don't wait for the event if the result is already set. This avoids deadlocks in case the result was set before this function is called.
     if state.qkd_n_matching_bits == -1:
-        # Wait for EITHER result OR cancellation
-        _done, pending = await asyncio.wait(
-            [
-                asyncio.create_task(qkd_result_received_event.wait()),
-                asyncio.create_task(protocol_cancelled_event.wait()),
-            ],
-            return_when=asyncio.FIRST_COMPLETED,
-        )
-
-        # Cancel pending tasks
-        for task in pending:
-            task.cancel()
-
-        # Check if protocol was cancelled
-        if protocol_cancelled_event.is_set():
-            logger.warning("Protocol cancelled while waiting for QKD result")
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Protocol cancelled by peer or user")
+        await _unless_cancelled(qkd_result_received_event.wait())
 
     # Reassemble the QKDResult object from the state
     qkd_result = QKDResult(
@@ -390,6 +712,10 @@ async def _submit_basis_list_follower(state: NodeState, basis_list: list[QKDEnco
         n_total_bits=settings.qkd_settings.bitstring_length,
         emoji=state.qkd_emoji_pick,
         role="follower",
+        seconds_per_bit=state.qkd_seconds_per_bit,
+        seconds_per_key_bit=state.qkd_seconds_per_key_bit,
+        qber=state.qkd_qber,
+        n_secret_bits=None if state.qkd_qber is None else len(state.qkd_resulting_bit_list),
     )
 
     # Clear the event for the next QKD run
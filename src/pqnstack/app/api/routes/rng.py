@@ -10,17 +10,32 @@ from fastapi import HTTPException
 from fastapi import Query
 from fastapi import status
 from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 from pqnstack.app.api.deps import ClientDep
+from pqnstack.app.api.deps import RNGPoolDep
 from pqnstack.app.api.deps import StateDep
 from pqnstack.app.core.config import rng_progress_event
 from pqnstack.app.core.config import settings
+from pqnstack.base.errors import RandomnessPoolExhaustedError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rng", tags=["rng"])
 
 
+class PoolStatus(BaseModel):
+    available_bits: int
+    capacity_bits: int
+    low_watermark_bits: int
+    high_watermark_bits: int
+    harvesting: bool
+    raw_bits_harvested: int
+    bits_extracted: int
+    bits_served: int
+    fallbacks: int
+
+
 @router.get("/progress")
 async def rng_progress(state: StateDep) -> StreamingResponse:
     """SSE endpoint for streaming RNG fortune measurement progress to frontend."""
@@ -160,3 +175,36 @@ async def fortune(  # noqa: PLR0913
     rng_progress_event.set()
 
     return results
+
+
+@router.get("/pool/status")
+async def pool_status(pool: RNGPoolDep) -> PoolStatus:
+    """Report the fill level and counters of the background randomness pool."""
+    if pool is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Randomness pool is not enabled")
+    pool_status = pool.status
+    return PoolStatus(
+        available_bits=pool_status.available_bits,
+        capacity_bits=pool_status.capacity_bits,
+        low_watermark_bits=pool_status.low_watermark_bits,
+        high_watermark_bits=pool_status.high_watermark_bits,
+        harvesting=pool_status.harvesting,
+        raw_bits_harvested=pool_status.raw_bits_harvested,
+        bits_extracted=pool_status.bits_extracted,
+        bits_served=pool_status.bits_served,
+        fallbacks=pool_status.fallbacks,
+    )
+
+
+@router.get("/pool/bits")
+async def pool_bits(n_bits: int, pool: RNGPoolDep) -> list[int]:
+    """Serve `n_bits` extracted random bits straight from the pool, without touching the timetagger."""
+    if pool is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Randomness pool is not enabled")
+    if n_bits <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="n_bits must be a positive integer")
+    try:
+        bits = pool.take(n_bits)
+    except RandomnessPoolExhaustedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=e.message) from e
+    return [int(b) for b in bits]
@@ -1,11 +1,25 @@
+import asyncio
 import logging
+import time
+from collections.abc import AsyncIterator
+from functools import lru_cache
 from typing import TYPE_CHECKING
+from typing import Annotated
 from typing import cast
 
 from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Query
+from fastapi import WebSocket
+from fastapi import WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from pqnstack.app.api.deps import SERDep
+from pqnstack.app.api.deps import get_rotary_encoder
+from pqnstack.app.core.config import AngleStreamSettings
+from pqnstack.app.core.config import settings
+from pqnstack.pqn.drivers.rotaryencoder import RotaryEncoderInstrument
 
 if TYPE_CHECKING:
     from pqnstack.pqn.drivers.rotaryencoder import MockRotaryEncoder
@@ -18,11 +32,123 @@ class AngleResponse(BaseModel):
     theta: float
 
 
+class AngleSample(BaseModel):
+    theta: float
+    timestamp: float  # time.time() when the angle was sampled.
+
+
+class AngleBroadcaster:
+    def __init__(self, encoder: RotaryEncoderInstrument, stream_settings: AngleStreamSettings) -> None:
+        """
+        Sample the rotary encoder once for every client streaming its angle.
+
+        The sampler only runs while someone is streaming, and only publishes angles that moved past the deadband.
+        Every client then gets the latest angle at its own rate, so slow clients skip values instead of falling
+        behind.
+        """
+        self.encoder = encoder
+        self.stream_settings = stream_settings
+        self.latest: AngleSample | None = None
+        self._update = asyncio.Event()
+        self._subscribers = 0
+        self._task: asyncio.Task[None] | None = None
+
+    async def stream(self, max_rate_hz: float | None = None) -> AsyncIterator[AngleSample]:
+        """Yield the latest angle whenever it changes, at most `max_rate_hz` times per second."""
+        max_rate_hz = self.stream_settings.max_client_rate_hz if max_rate_hz is None else max_rate_hz
+        period_s = 1 / min(max_rate_hz, self.stream_settings.max_client_rate_hz)
+        self._subscribers += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._sample_loop(), name="angle-sampler")
+        try:
+            sent: AngleSample | None = None
+            while True:
+                update = self._update
+                if self.latest is None or self.latest is sent:
+                    try:
+                        await asyncio.wait_for(update.wait(), timeout=self.stream_settings.keepalive_s)
+                    except TimeoutError:
+                        if sent is not None:
+                            yield sent
+                    continue
+
+                sent = self.latest
+                yield sent
+                await asyncio.sleep(period_s)
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and self._task is not None:
+                self._task.cancel()
+                self._task = None
+                # The next client gets a fresh reading instead of the last one before everyone left.
+                self.latest = None
+
+    def _publish(self, sample: AngleSample) -> None:
+        self.latest = sample
+        update, self._update = self._update, asyncio.Event()
+        update.set()
+
+    async def _sample_loop(self) -> None:
+        period_s = 1 / self.stream_settings.sample_rate_hz
+        while True:
+            try:
+                theta = self.encoder.read()
+            except Exception:
+                logger.exception("Could not sample the rotary encoder")
+            else:
+                if self.latest is None or abs(theta - self.latest.theta) >= self.stream_settings.deadband_degrees:
+                    self._publish(AngleSample(theta=theta, timestamp=time.time()))
+            await asyncio.sleep(period_s)
+
+
+@lru_cache
+def get_angle_broadcaster() -> AngleBroadcaster:
+    return AngleBroadcaster(get_rotary_encoder(), settings.angle_stream)
+
+
+AngleBroadcasterDep = Annotated[AngleBroadcaster, Depends(get_angle_broadcaster)]
+
+
 @router.get("/")
 async def read_angle(rotary_encoder: SERDep) -> AngleResponse:
     return AngleResponse(theta=rotary_encoder.read())
 
 
+@router.websocket("/stream")
+async def stream_angle(
+    websocket: WebSocket,
+    broadcaster: AngleBroadcasterDep,
+    max_rate_hz: Annotated[float | None, Query(gt=0)] = None,
+) -> None:
+    """Push `AngleSample`s as JSON while the angle changes, see the angle stream settings."""
+    await websocket.accept()
+    try:
+        async for sample in broadcaster.stream(max_rate_hz):
+            await websocket.send_json(sample.model_dump())
+    except WebSocketDisconnect:
+        logger.info("Angle stream websocket closed by client")
+
+
+@router.get("/events")
+async def angle_events(
+    broadcaster: AngleBroadcasterDep, max_rate_hz: Annotated[float | None, Query(gt=0)] = None
+) -> StreamingResponse:
+    """SSE version of `/serial/stream` for clients that only listen."""
+
+    async def event_generator() -> AsyncIterator[str]:
+        async for sample in broadcaster.stream(max_rate_hz):
+            yield f"data: {sample.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.post("/debug_set_angle")
 async def debug_set_angle(rotary_encoder: SERDep, angle: float) -> AngleResponse:
     try:
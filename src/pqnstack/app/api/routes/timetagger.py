@@ -9,6 +9,7 @@ from fastapi import Query
 from fastapi import status
 
 from pqnstack.app.core.config import settings
+from pqnstack.base.metrics import Histogram
 from pqnstack.network.client import Client
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
 
@@ -19,6 +20,10 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/timetagger", tags=["timetagger"])
 
+MEASUREMENT_SECONDS = Histogram(
+    "pqnstack_measurement_seconds", "Wall time of time tagger measurements, integration included.", ["kind"]
+)
+
 
 @router.get("/measure_correlation")
 async def measure_correlation(
@@ -50,12 +55,13 @@ async def measure_correlation(
         )
 
     logger.debug("Time tagger device found: %s", tagger)
-    count = tagger.measure_correlation(
-        mconf.channel1,
-        mconf.channel2,
-        integration_time_s=mconf.integration_time_s,
-        binwidth_ps=mconf.binwidth_ps,
-    )
+    with MEASUREMENT_SECONDS.labels("correlation").time():
+        count = tagger.measure_correlation(
+            mconf.channel1,
+            mconf.channel2,
+            integration_time_s=mconf.integration_time_s,
+            binwidth_ps=mconf.binwidth_ps,
+        )
 
     logger.info("Measured %d coincidences", count)
     return int(count)
@@ -83,7 +89,8 @@ async def count_singles(
         )
 
     logger.debug("Time tagger device found: %s", tagger)
-    counts = tagger.count_singles(channels, integration_time_s=integration_time_s)
+    with MEASUREMENT_SECONDS.labels("singles").time():
+        counts = tagger.count_singles(channels, integration_time_s=integration_time_s)
 
     logger.info("Measured singles counts: %s", counts)
     return [int(c) for c in counts]
@@ -5,13 +5,16 @@ from functools import lru_cache
 
 from pydantic import BaseModel
 from pydantic import Field
+from pydantic import PrivateAttr
 from pydantic_settings import BaseSettings
 from pydantic_settings import PydanticBaseSettingsSource
 from pydantic_settings import SettingsConfigDict
 from pydantic_settings import TomlConfigSettingsSource
 
+from pqnstack.base.instrument import RotatorInstrument
 from pqnstack.constants import BellState
 from pqnstack.constants import QKDEncodingBasis
+from pqnstack.pqn.protocols.cascade import CascadeResponder
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
 
 logger = logging.getLogger(__name__)
@@ -30,6 +33,14 @@ class DailyReportConfig(BaseModel):
 class RNGSettings(BaseModel):
     channels: list[int] = Field(default_factory=lambda: [1, 2])
     fortune_size: int = 8
+    # Background pool of extracted random bits harvested from singles parities. Used by QKD for basis/bit choices.
+    pool_enabled: bool = False
+    pool_integration_time_s: float = 0.1
+    pool_capacity_bits: int = 65536
+    pool_low_watermark_bits: int = 4096
+    pool_high_watermark_bits: int = 60000
+    pool_extractor_input_bits: int = 1024
+    pool_extraction_ratio: float = 0.5  # Output bits per raw bit, should not exceed the min-entropy of the source.
 
 
 class CHSHSettings(BaseModel):
@@ -48,6 +59,35 @@ class QKDSettings(BaseModel):
     maximum_question_index: int = 8
     discriminating_threshold: int = 10
     measurement_config: MeasurementConfig = Field(default_factory=lambda: MeasurementConfig(integration_time_s=5))
+    # The follower drops a QKD session when the leader sends nothing for this long, must exceed one integration.
+    session_timeout_s: float = 60.0
+    # Error correction (Cascade) and privacy amplification of the sifted key. Only worth it for long keys, as a
+    # fraction of the key is disclosed to estimate the QBER.
+    post_processing: bool = False
+    qber_sample_fraction: float = 0.1
+    cascade_passes: int = 4
+    cascade_max_rounds: int = 500
+    security_parameter: float = 1e-10
+
+
+class HealthSettings(BaseModel):
+    # `/health/` answers from results cached by a background monitor, probing again only when they are too old.
+    monitor_interval_s: float = 30.0  # 0 disables the background monitor, probes then only run on request.
+    max_age_s: float = 60.0
+    router_timeout_s: float = 5.0
+    device_timeout_s: float = 5.0
+    rotary_encoder_timeout_s: float = 1.0
+    # The encoder is reachable while its sampler got an angle this recently, its port is never opened a second time.
+    rotary_encoder_max_sample_age_s: float = 1.0
+    follower_timeout_s: float = 5.0
+
+
+class AngleStreamSettings(BaseModel):
+    # `/serial/stream` and `/serial/events` push rotary encoder angles from one sampler shared by every client.
+    sample_rate_hz: float = 50.0
+    deadband_degrees: float = 0.1  # Smaller changes are not sent.
+    max_client_rate_hz: float = 30.0  # Clients can ask for less, never for more.
+    keepalive_s: float = 15.0  # The latest angle is sent again after this long without changes.
 
 
 class GamesAvailability(BaseModel):
@@ -64,12 +104,16 @@ class Settings(BaseSettings):
     chsh_settings: CHSHSettings = CHSHSettings()
     qkd_settings: QKDSettings = QKDSettings()
     rng_settings: RNGSettings = RNGSettings()
+    health_settings: HealthSettings = HealthSettings()
     bell_state: BellState = BellState.Phi_plus
     daily_report: DailyReportConfig | None = None
     timetagger: tuple[str, str] | None = None  # Name of the timetagger to use for the CHSH experiment.
     rotary_encoder_address: str = "/dev/ttyACM0"
     virtual_rotator: bool = False  # If True, use terminal input instead of hardware rotary encoder
+    angle_stream: AngleStreamSettings = AngleStreamSettings()
     games_availability: GamesAvailability = Field(default_factory=GamesAvailability)
+    tracing: bool = False  # Record spans of requests to instruments, exported from /debug/trace.
+    log_level: str = "INFO"
 
     model_config = SettingsConfigDict(
         toml_file="./config.toml",
@@ -134,6 +178,9 @@ class NodeState(BaseModel):
     chsh_progress_current: int = 0  # Current iteration in CHSH measurement
     chsh_progress_total: int = 16  # Total iterations (2 basis x 2 follower x 2 angles x 2 perp)
     chsh_running: bool = False  # Whether CHSH measurement is currently running
+    chsh_request_schedule: list[float] = []  # Follower HWP angles pre-computed from the leader's step schedule
+    # Follower HWP resolved once per angle schedule instead of on every step, never serialized.
+    _chsh_request_hwp: RotatorInstrument | None = PrivateAttr(default=None)
 
     # QKD state
     # FIXME: At the moment the reset_coordination_state resets this, probably want to refactor that function out.
@@ -159,20 +206,42 @@ class NodeState(BaseModel):
     qkd_single_bit_current_index: int = 0  # Current index in follower basis list for single_bit endpoint
     qkd_bit_list: list[int] = []
     qkd_resulting_bit_list: list[int] = []  # Resulting bits after QKD
+    # Follower side of Cascade for the current resulting bits, dropped whenever they change.
+    _qkd_cascade_responder: CascadeResponder | None = PrivateAttr(default=None)
     qkd_request_basis_list: list[QKDEncodingBasis] = []  # Basis angles for QKD
     qkd_request_bit_list: list[int] = []
     qkd_n_matching_bits: int = -1  # Leaders populate this value after qkd is done. Same with the emoji
+    qkd_seconds_per_bit: float = 0.0  # Wall time per raw bit of the last QKD exchange, reported by the leader
+    qkd_seconds_per_key_bit: float | None = None  # Wall time per final key bit of the last QKD run, None without a key
+    qkd_qber: float | None = None  # QBER of the last QKD exchange, None when post-processing is disabled
 
     # RNG state
     rng_progress_current: int = 0  # Current iteration in RNG fortune measurement
     rng_progress_total: int = 0  # Total iterations (fortune_size)
     rng_running: bool = False  # Whether RNG fortune measurement is currently running
 
+    @property
+    def chsh_request_hwp(self) -> RotatorInstrument | None:
+        return self._chsh_request_hwp
+
+    @chsh_request_hwp.setter
+    def chsh_request_hwp(self, hwp: RotatorInstrument | None) -> None:
+        self._chsh_request_hwp = hwp
+
+    @property
+    def qkd_cascade_responder(self) -> CascadeResponder | None:
+        return self._qkd_cascade_responder
+
+    @qkd_cascade_responder.setter
+    def qkd_cascade_responder(self, responder: CascadeResponder | None) -> None:
+        self._qkd_cascade_responder = responder
+
 
 state = NodeState()
 ask_user_for_follow_event = asyncio.Event()
 user_replied_event = asyncio.Event()
 qkd_result_received_event = asyncio.Event()
+qkd_follower_ready_event = asyncio.Event()  # Follower submitted its basis list, pushed to the leader's QKD session
 protocol_cancelled_event = asyncio.Event()
 chsh_progress_event = asyncio.Event()
 rng_progress_event = asyncio.Event()
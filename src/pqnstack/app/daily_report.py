@@ -195,7 +195,7 @@ def _run_chsh(config: DailyReportConfig) -> GameResult:
         name="chsh",
         title="CHSH — Verify Quantum Link",
         status="ok",
-        data=parsed.model_dump(),
+        data=parsed.model_dump(exclude={"step_timings"}),
         elapsed_s=(datetime.now(UTC) - started).total_seconds(),
         emoji=emoji,
     )
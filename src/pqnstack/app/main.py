@@ -1,15 +1,47 @@
 import logging
+import time
+from collections.abc import AsyncGenerator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi import Request
+from fastapi import Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from pqnstack.app.api.deps import get_rng_pool
 from pqnstack.app.api.main import api_router
+from pqnstack.app.api.routes.health import get_health_monitor
+from pqnstack.app.core.config import settings
+from pqnstack.base.metrics import Histogram
+from pqnstack.base.tracing import TRACER
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=settings.log_level)
 logger = logging.getLogger(__name__)
 
+REQUEST_SECONDS = Histogram(
+    "pqnstack_http_request_seconds", "Time to answer an HTTP request of the API.", ["method", "route", "status"]
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    if settings.tracing:
+        TRACER.enable(process=settings.node_name)
+    # Start filling the randomness pool right away so the first protocol run does not find it empty.
+    pool = get_rng_pool()
+    health_monitor = get_health_monitor()
+    health_monitor.start()
+    yield
+    await health_monitor.stop()
+    if pool is not None:
+        pool.stop()
+
+
 app = FastAPI(
     title="Public Quantum Network",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware to allow all origins
@@ -24,6 +56,16 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template instead of raw path, so path parameters do not create a series per value.
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(time.perf_counter() - start)
+    return response
+
+
 @app.get("/")
 async def root() -> dict[str, str]:
     return {"message": "Hello World"}
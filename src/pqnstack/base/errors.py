@@ -56,3 +56,27 @@ class CouldNotConnectToNetworkElementError(Exception):
     def __init__(self, message: str = "Could not connect to network element") -> None:
         self.message = message
         super().__init__(self.message)
+
+
+class RandomnessPoolExhaustedError(Exception):
+    def __init__(self, message: str = "Not enough random bits available in the pool") -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+class MotionTimeoutError(Exception):
+    def __init__(self, message: str = "Motion did not finish in time") -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+class MotionStalledError(Exception):
+    def __init__(self, message: str = "Motor stopped making progress before reaching its target") -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+class SweepCancelledError(Exception):
+    def __init__(self, message: str = "Sweep was stopped before measuring every setting") -> None:
+        self.message = message
+        super().__init__(self.message)
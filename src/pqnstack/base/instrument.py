@@ -4,8 +4,8 @@
 # NCSA/Illinois Computes
 
 import atexit
-import datetime
 import logging
+import math
 from collections.abc import Callable
 from dataclasses import dataclass
 from dataclasses import field
@@ -13,9 +13,13 @@ from functools import wraps
 from time import perf_counter
 from typing import Any
 from typing import Protocol
+from typing import cast
 from typing import runtime_checkable
 
 from pqnstack.base.errors import LogDecoratorOutsideOfClassError
+from pqnstack.base.motion import MotionModel
+from pqnstack.base.motion import MotionProfiler
+from pqnstack.base.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,9 @@ class Instrument(Protocol):
 
       * You cannot use the character `:` in the names of instruments. This is used to separate parts of requests in
         proxy instruments.
+      * Parameters and operations listed in `observables` are published by the provider of the instrument when they
+        change: the new value of a parameter, or the return value of an operation. Changes that do not come from a
+        request, like samples streamed by the hardware, are published with `notify`.
 
     """
 
@@ -45,53 +52,188 @@ class Instrument(Protocol):
     hw_address: str
     parameters: set[str] = field(default_factory=set)
     operations: dict[str, Callable[..., Any]] = field(default_factory=dict)
+    observables: set[str] = field(default_factory=set)
+    # Set by the provider when it publishes state, called with the instrument name, observable and value.
+    observer: Callable[[str, str, Any], object] | None = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         atexit.register(self.close)
 
+    def notify(self, name: str, value: Any) -> None:
+        """Publish a new value of the observable `name`, can be called from any thread."""
+        if self.observer is not None:
+            self.observer(self.name, name, value)
+
     def start(self) -> None: ...
     def close(self) -> None: ...
 
     @property
     def info(self) -> InstrumentInfo: ...
 
+    @property
+    def hw_status(self) -> dict[str, Any]:
+        """
+        Status the hardware last reported, empty by default.
 
-def log_operation[T](func: Callable[..., T]) -> Callable[..., T]:
-    @wraps(func)
-    def wrapper(*args: Any, **kwargs: Any) -> T:
-        if len(args) == 0:
-            msg = "log_operation has 0 args, this usually indicates that it has been used to decorate something that is not a class method. This is not allowed."
-            raise LogDecoratorOutsideOfClassError(msg)
+        Providers send it with every heartbeat, so it must be cheap: it does not talk to the hardware or go through
+        the logged parameters the way `info` does.
+        """
+        return {}
 
-        ins = args[0]
-        if not isinstance(ins, Instrument):
-            msg = "log_operation has been used to decorate something that is not a Instrument method. This is not allowed."
-            raise LogDecoratorOutsideOfClassError(msg)
 
-        start_time = perf_counter()
-        logger.info(
-            "%s| %s, %s |Starting operation '%s' with args: '%s' and kwargs '%s'",
-            start_time,
+@dataclass(frozen=True, slots=True)
+class LogPolicy:
+    """
+    How `log_operation` and `log_parameter` log the calls to an instrument.
+
+    :param level: Level of the call records. Nothing is formatted when the logger does not log this level.
+    :param max_per_second: Most records per second for the instrument, the calls in between are summarized in the
+     next record.
+    :param aggregate_every: Log a summary of every this many calls to an operation or parameter instead of each call.
+    """
+
+    level: int = logging.INFO
+    max_per_second: float | None = None
+    aggregate_every: int = 1
+
+
+_default_log_policy = LogPolicy()
+_log_policies: dict[str, LogPolicy] = {}
+
+
+def set_log_policy(policy: LogPolicy, instrument: str | None = None) -> None:
+    """Set the log policy of `instrument`, or the default one of instruments without their own if None."""
+    global _default_log_policy  # noqa: PLW0603
+    if instrument is None:
+        _default_log_policy = policy
+    else:
+        _log_policies[instrument] = policy
+
+
+def get_log_policy(instrument: str) -> LogPolicy:
+    return _log_policies.get(instrument, _default_log_policy)
+
+
+@dataclass(slots=True)
+class _CallSummary:
+    calls: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+
+class _LazyMessage:
+    """Formats `template % args` only when the log record is emitted."""
+
+    __slots__ = ("args", "template")
+
+    def __init__(self, template: str, args: tuple[object, ...]) -> None:
+        self.template = template
+        self.args = args
+
+    def __str__(self) -> str:
+        return self.template % self.args
+
+
+_call_summaries: dict[tuple[str, str], _CallSummary] = {}
+_last_record_time: dict[str, float] = {}
+
+
+def _log_call(ins: "Instrument", member: str, duration: float, message: str, *message_args: object) -> None:
+    """Log a call according to the policy of the instrument, `message_args` are only formatted if it is logged."""
+    policy = _log_policies.get(ins.name, _default_log_policy)
+    if not logger.isEnabledFor(policy.level):
+        return
+
+    summary = _call_summaries.get((ins.name, member))
+    if summary is None:
+        summary = _call_summaries.setdefault((ins.name, member), _CallSummary())
+    summary.calls += 1
+    summary.total_s += duration
+    summary.max_s = max(summary.max_s, duration)
+    if summary.calls < policy.aggregate_every:
+        return
+
+    now = perf_counter()
+    if (
+        policy.max_per_second is not None
+        and now - _last_record_time.get(ins.name, -math.inf) < 1 / policy.max_per_second
+    ):
+        return
+    _last_record_time[ins.name] = now
+
+    call = _LazyMessage(message, message_args)
+    if summary.calls == 1:
+        logger.log(policy.level, "%s, %s | %s", ins.name, type(ins).__name__, call)
+    else:
+        logger.log(
+            policy.level,
+            "%s, %s | '%s' called %d times, mean duration %.3g s, max %.3g s. Last call: %s",
             ins.name,
-            type(ins),
-            func.__name__,
-            args,
-            kwargs,
+            type(ins).__name__,
+            member,
+            summary.calls,
+            summary.total_s / summary.calls,
+            summary.max_s,
+            call,
         )
+    summary.calls = 0
+    summary.total_s = 0.0
+    summary.max_s = 0.0
 
-        result = func(*args, **kwargs)
 
-        end_time = perf_counter()
-        duration = end_time - start_time
-        logger.info(
-            "%s | %s, %s | Completed operation %s. Duration: %s",
-            end_time,
-            ins.name,
-            type(ins),
-            func.__name__,
-            duration,
+# Checking a runtime protocol inspects every member of the class, so it is only done once per class.
+_instrument_types: set[type] = set()
+
+
+def _instrument_of(args: tuple[Any, ...], decorator: str) -> "Instrument":
+    if len(args) == 0:
+        msg = (
+            f"{decorator} has 0 args, "
+            "this usually indicates that it has been used to decorate something that is not a class method. "
+            "This is not allowed."
         )
+        raise LogDecoratorOutsideOfClassError(msg)
+
+    ins = args[0]
+    if type(ins) not in _instrument_types:
+        if not isinstance(ins, Instrument):
+            msg = (
+                f"{decorator} has been used to decorate something that is not a Instrument method. This is not allowed."
+            )
+            raise LogDecoratorOutsideOfClassError(msg)
+        _instrument_types.add(type(ins))
+    return cast("Instrument", ins)
 
+
+def _traced_call[T](ins: "Instrument", func: Callable[..., T], args: tuple[Any, ...], kwargs: dict[str, Any]) -> T:
+    if not TRACER.enabled:
+        return func(*args, **kwargs)
+
+    # The arguments are only formatted into the span when tracing is enabled.
+    span = TRACER.start_span(f"{ins.name}.{func.__name__}", attributes=lambda: {"args": args[1:], "kwargs": kwargs})
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        TRACER.end_span(span, error=e)
+        raise
+    TRACER.end_span(span)
+    return result
+
+
+def log_operation[T](func: Callable[..., T]) -> Callable[..., T]:
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        ins = _instrument_of(args, "log_operation")
+        if not TRACER.enabled and not logger.isEnabledFor(get_log_policy(ins.name).level):
+            return func(*args, **kwargs)
+
+        logger.debug("%s, %s | Starting operation '%s'", ins.name, type(ins).__name__, func.__name__)
+
+        start_time = perf_counter()
+        result = _traced_call(ins, func, args, kwargs)
+        duration = perf_counter() - start_time
+
+        _log_call(ins, func.__name__, duration, "Completed operation %s. Duration: %s", func.__name__, duration)
         return result
 
     return wrapper
@@ -100,45 +242,23 @@ def log_operation[T](func: Callable[..., T]) -> Callable[..., T]:
 def log_parameter[T](func: Callable[..., T]) -> Callable[..., T]:
     @wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> T:
-        if len(args) == 0:
-            msg = (
-                "log_parameter has 0 args, "
-                "this usually indicates that it has been used to decorate something that is not a class method. "
-                "This is not allowed."
-            )
-            raise LogDecoratorOutsideOfClassError(msg)
+        ins = _instrument_of(args, "log_parameter")
+        if not TRACER.enabled and not logger.isEnabledFor(get_log_policy(ins.name).level):
+            return func(*args, **kwargs)
 
-        ins = args[0]
-        if not isinstance(ins, Instrument):
-            msg = (
-                "log_operation has been used to decorate something that is not a Instrument method. "
-                "This is not allowed."
-            )
-            raise LogDecoratorOutsideOfClassError(msg)
+        start_time = perf_counter()
+        result = _traced_call(ins, func, args, kwargs)
+        duration = perf_counter() - start_time
 
         # if no args or kwargs, we are reading the value of the param, else we are setting it.
         if len(args) == 1 and len(kwargs) == 0:
-            current_time = datetime.datetime.now(tz=datetime.UTC)
-            result = func(*args, **kwargs)
-            logger.info(
-                "%s | %s, %s | Parameter '%s' got read with value %s",
-                current_time,
-                ins.name,
-                type(ins),
-                func.__name__,
-                result,
-            )
-
+            _log_call(ins, func.__name__, duration, "Parameter '%s' got read with value %s", func.__name__, result)
         else:
-            start_time = perf_counter()
-            result = func(*args, **kwargs)  # Always return None
-            end_time = perf_counter()
-            duration = end_time - start_time
-            logger.info(
-                "%s | %s, %s | Parameter '%s' got updated to '%s', parameter update took %s long ",
-                end_time,
-                ins.name,
-                type(ins),
+            _log_call(
+                ins,
+                func.__name__,
+                duration,
+                "Parameter '%s' got updated to '%s', parameter update took %s long",
                 func.__name__,
                 args[1:],
                 duration,
@@ -175,18 +295,37 @@ class TimeTaggerInstrument(Instrument, Protocol):
 class RotatorInfo(InstrumentInfo):
     degrees: float = 0.0
     offset_degrees: float = 0.0
+    # Estimates how long moves take, None until enough moves were recorded.
+    motion_model: MotionModel | None = None
 
 
 @runtime_checkable
 @dataclass(slots=True)
 class RotatorInstrument(Instrument, Protocol):
+    """
+    Instrument that turns to an angle.
+
+    Implementations pass every completed move to `motion.record`, which fits the `MotionModel` reported in the info.
+    With `motion_profile_path` the recorded moves are kept in that file across restarts.
+
+    `degrees` is the absolute position, it is not wrapped to a turn. With `period_degrees`, like 180 for waveplates,
+    `move_to` goes to the equivalent angle closest to the current position instead of the given one.
+    """
+
     offset_degrees: float = 0.0
+    period_degrees: float | None = None
+    motion_profile_path: str | None = None
+    motion: MotionProfiler = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self.operations["move_to"] = self.move_to
         self.operations["move_by"] = self.move_by
 
         self.parameters.add("degrees")
+        self.observables.add("degrees")
+
+        self.motion = MotionProfiler(self.motion_profile_path)
+        atexit.register(self.motion.save)
 
     @property
     @log_parameter
@@ -196,13 +335,25 @@ class RotatorInstrument(Instrument, Protocol):
     @log_parameter
     def degrees(self, degrees: float) -> None: ...
 
-    def move_to(self, angle: float) -> None:
-        """Move the rotator to the specified angle."""
-        self.degrees = angle
-
-    def move_by(self, angle: float) -> None:
-        """Move the rotator by the specified angle."""
-        self.degrees += angle
+    def nearest_equivalent(self, angle: float) -> float:
+        """Return the angle equivalent to `angle` closest to the current position, `angle` itself without a period."""
+        if self.period_degrees is None:
+            return angle
+        current = self.degrees
+        half_period = self.period_degrees / 2
+        return current + (angle - current + half_period) % self.period_degrees - half_period
+
+    def move_to(self, angle: float) -> float:
+        """Move the rotator to the specified angle, or the closest equivalent one, and return the new position."""
+        target = self.nearest_equivalent(angle)
+        self.degrees = target
+        return target
+
+    def move_by(self, angle: float) -> float:
+        """Move the rotator by the specified angle and return the new position, in one request through a proxy."""
+        target = self.degrees + angle
+        self.degrees = target
+        return target
 
 
 @dataclass(frozen=True, slots=True)
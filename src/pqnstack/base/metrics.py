@@ -0,0 +1,282 @@
+import abc
+import bisect
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Sequence
+from contextlib import AbstractContextManager
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format produced by `Registry.expose`.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class _Cells:
+    """
+    Per-thread accumulators of a metric.
+
+    Every thread only ever adds to its own list, so updating needs no lock and no update is lost. Reading sums the
+    lists of every thread that touched the metric, which is only done when the metrics are scraped.
+    """
+
+    __slots__ = ("_by_thread", "_size")
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._by_thread: dict[int, list[float]] = {}
+
+    def local(self) -> list[float]:
+        ident = threading.get_ident()
+        cells = self._by_thread.get(ident)
+        if cells is None:
+            cells = self._by_thread.setdefault(ident, [0.0] * self._size)
+        return cells
+
+    def read(self) -> list[float]:
+        totals = [0.0] * self._size
+        for cells in list(self._by_thread.values()):
+            for i, value in enumerate(cells):
+                totals[i] += value
+        return totals
+
+
+class CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self) -> None:
+        self._cells = _Cells(1)
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            msg = "Counters can only increase."
+            raise ValueError(msg)
+        self._cells.local()[0] += amount
+
+    def get(self) -> float:
+        return self._cells.read()[0]
+
+
+class GaugeChild:
+    __slots__ = ("_function", "_value")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the gauge from `function` when scraped instead of updating it on the hot path."""
+        self._function = function
+
+    def get(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+
+class HistogramChild:
+    __slots__ = ("_cells", "buckets")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        # One cell per bucket, then the sum of the observations.
+        self._cells = _Cells(len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        cells = self._cells.local()
+        cells[bisect.bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def get(self) -> tuple[list[float], float]:
+        """Cumulative count of every bucket and the sum of the observations."""
+        cells = self._cells.read()
+        cumulative = []
+        total = 0.0
+        for count in cells[:-1]:
+            total += count
+            cumulative.append(total)
+        return cumulative, cells[-1]
+
+
+class _Metric[C: CounterChild | GaugeChild | HistogramChild](abc.ABC):
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry | None" = None
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], C] = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self) -> C: ...
+
+    def labels(self, *values: object) -> C:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                msg = f"Metric {self.name} expects the labels {self.labelnames}, got {key}."
+                raise ValueError(msg)
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _child_samples(self, child: C) -> Iterator[Sample]: ...
+
+    def samples(self) -> Iterator[Sample]:
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key, strict=True))
+            for suffix, extra_labels, value in self._child_samples(child):
+                yield self.name + suffix, labels | extra_labels, value
+
+
+class Counter(_Metric[CounterChild]):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _child_samples(self, child: CounterChild) -> Iterator[Sample]:
+        yield "_total", {}, child.get()
+
+
+class Gauge(_Metric[GaugeChild]):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+    def _child_samples(self, child: GaugeChild) -> Iterator[Sample]:
+        yield "", {}, child.get()
+
+
+class Histogram(_Metric[HistogramChild]):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != math.inf:
+            self.buckets += (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> AbstractContextManager[None]:
+        return self.labels().time()
+
+    def _child_samples(self, child: HistogramChild) -> Iterator[Sample]:
+        cumulative, total = child.get()
+        for bound, count in zip(self.buckets, cumulative, strict=True):
+            yield "_bucket", {"le": _format_value(bound)}, count
+        yield "_count", {}, cumulative[-1]
+        yield "_sum", {}, total
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str, *, quotes: bool = True) -> str:
+    value = value.replace("\\", r"\\").replace("\n", r"\n")
+    return value.replace('"', r"\"") if quotes else value
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric[Any]] = {}
+
+    def register(self, metric: _Metric[Any]) -> None:
+        if metric.name in self._metrics:
+            msg = f"Metric {metric.name} is already registered."
+            raise ValueError(msg)
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> _Metric[Any] | None:
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        """All the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, quotes=False)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(
+                    f"{name}{{{label_str}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `/metrics` from a daemon thread, for processes like the router and providers that have no web app."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics at http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+# Moves needed before a model is fitted, and distinct distances among them.
+MIN_MOVES = 5
+MIN_DISTANCES = 3
+
+
+@dataclass(frozen=True, slots=True)
+class MoveRecord:
+    start_degrees: float
+    end_degrees: float
+    duration_s: float
+
+    @property
+    def distance_degrees(self) -> float:
+        return abs(self.end_degrees - self.start_degrees)
+
+
+def profile_time_s(
+    distance_degrees: npt.ArrayLike, velocity_dps: npt.ArrayLike, acceleration_dps2: npt.ArrayLike
+) -> npt.NDArray[np.float64]:
+    """
+    Time to travel `distance_degrees` with a trapezoidal velocity profile, without overhead.
+
+    The motor accelerates up to `velocity_dps` and decelerates at the same rate. Moves shorter than the distance
+    needed to reach full velocity follow a triangular profile instead.
+    """
+    d = np.abs(np.asarray(distance_degrees, dtype=np.float64))
+    v = np.asarray(velocity_dps, dtype=np.float64)
+    a = np.asarray(acceleration_dps2, dtype=np.float64)
+    return np.where(d <= v**2 / a, 2 * np.sqrt(d / a), d / v + v / a)
+
+
+@dataclass(frozen=True, slots=True)
+class MotionModel:
+    """Fitted move time of a rotator: a fixed overhead plus a trapezoidal velocity profile."""
+
+    overhead_s: float
+    velocity_dps: float
+    acceleration_dps2: float
+    moves: int  # Moves the model was fitted on.
+    rms_error_s: float  # Root mean square error of the fit over those moves.
+
+    def predict_s(self, start_degrees: float, end_degrees: float) -> float:
+        """Estimate how long a move takes."""
+        distance = end_degrees - start_degrees
+        return self.overhead_s + float(profile_time_s(distance, self.velocity_dps, self.acceleration_dps2))
+
+    def estimate_s(self, start_degrees: float, targets: Iterable[float]) -> float:
+        """Estimate how long moving through `targets` in order takes, starting at `start_degrees`."""
+        angles = np.fromiter(targets, dtype=np.float64)
+        if len(angles) == 0:
+            return 0.0
+        distances = np.diff(angles, prepend=start_degrees)
+        return float(
+            len(angles) * self.overhead_s + profile_time_s(distances, self.velocity_dps, self.acceleration_dps2).sum()
+        )
+
+
+def fit_motion_model(records: Iterable[MoveRecord]) -> MotionModel | None:
+    """
+    Least squares fit of a `MotionModel` to recorded moves, None without enough moves.
+
+    Velocity and acceleration are searched on a logarithmic grid, zooming in on the best point, the overhead of each
+    grid point has a closed form, the mean residual.
+    """
+    moves = list(records)
+    distances = np.array([move.distance_degrees for move in moves])
+    durations = np.array([move.duration_s for move in moves])
+    if len(moves) < MIN_MOVES or len(np.unique(np.round(distances, 3))) < MIN_DISTANCES:
+        return None
+
+    # Steps of the grids in decades, each pass searches two steps around the best point with steps 4 times smaller.
+    velocities, accelerations = np.logspace(-1, 4, 26), np.logspace(-1, 6, 36)
+    step = 0.2
+    for _ in range(6):
+        v, a = np.meshgrid(velocities, accelerations, indexing="ij")
+        travel = profile_time_s(distances, v[..., None], a[..., None])
+        overhead = np.maximum((durations - travel).mean(axis=-1), 0.0)
+        errors = ((durations - travel - overhead[..., None]) ** 2).mean(axis=-1)
+        i, j = np.unravel_index(np.argmin(errors), errors.shape)
+        best_v, best_a = velocities[i], accelerations[j]
+        velocities = best_v * np.logspace(-2 * step, 2 * step, 21)
+        accelerations = best_a * np.logspace(-2 * step, 2 * step, 21)
+        step /= 4
+
+    return MotionModel(
+        overhead_s=float(overhead[i, j]),
+        velocity_dps=float(best_v),
+        acceleration_dps2=float(best_a),
+        moves=len(moves),
+        rms_error_s=float(np.sqrt(errors[i, j])),
+    )
+
+
+class MotionProfiler:
+    def __init__(self, path: str | Path | None = None, max_moves: int = 500, save_every: int = 10) -> None:
+        """
+        Record the moves of a rotator and keep a `MotionModel` fitted to them.
+
+        :param path: JSON file the moves are kept in across restarts, None keeps them in memory only.
+        :param max_moves: Only the most recent moves are kept, so the model follows changes of the hardware.
+        :param save_every: Moves recorded between saves, `save` writes the rest.
+        """
+        self.path = None if path is None else Path(path).expanduser()
+        self.save_every = save_every
+        self._moves: deque[MoveRecord] = deque(maxlen=max_moves)
+        self._model: MotionModel | None = None
+        self._stale = False
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._moves)
+
+    @property
+    def model(self) -> MotionModel | None:
+        """Model of the recorded moves, refitted when read after new moves."""
+        with self._lock:
+            if self._stale:
+                self._model = fit_motion_model(self._moves)
+                self._stale = False
+            return self._model
+
+    def record(self, start_degrees: float, end_degrees: float, duration_s: float) -> None:
+        with self._lock:
+            self._moves.append(MoveRecord(start_degrees, end_degrees, duration_s))
+            self._stale = True
+            self._unsaved += 1
+            save = self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if self._unsaved == 0:
+                return
+            moves = [[move.start_degrees, move.end_degrees, move.duration_s] for move in self._moves]
+            self._unsaved = 0
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Written next to the file and renamed, a crash never leaves half a file behind.
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps({"moves": moves}))
+            temporary.replace(self.path)
+        except OSError:
+            logger.exception("Could not save the motion profile to %s", self.path)
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            moves = json.loads(self.path.read_text())["moves"]
+            self._moves.extend(MoveRecord(*map(float, move)) for move in moves)
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Could not load the motion profile from %s, starting a new one", self.path)
+            return
+        self._stale = True
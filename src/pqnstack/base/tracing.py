@@ -0,0 +1,203 @@
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Literal
+
+logger = logging.getLogger(__name__)
+
+TraceFormat = Literal["chrome", "otlp"]
+
+# Longest representation of an attribute kept in a span, payloads can be whole arrays.
+MAX_ATTRIBUTE_LENGTH = 200
+
+
+@dataclass(frozen=True, slots=True)
+class SpanContext:
+    """Identifies a span across processes, packets carry it so every hop can attach its spans to the same trace."""
+
+    trace_id: str
+    span_id: str
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: str | None
+    process: str
+    thread: int
+    start_ns: int
+    end_ns: int = 0
+    error: bool = False
+    attributes: dict[str, str] = field(default_factory=dict)
+    # Restores the previous current span when this one ends.
+    token: contextvars.Token[SpanContext | None] | None = field(default=None, repr=False)
+
+
+_current: contextvars.ContextVar[SpanContext | None] = contextvars.ContextVar("pqnstack_current_span", default=None)
+
+
+def _format_attribute(value: object) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_ATTRIBUTE_LENGTH else text[: MAX_ATTRIBUTE_LENGTH - 3] + "..."
+
+
+class Tracer:
+    def __init__(self) -> None:
+        """
+        Record spans of the work done in this process into a ring buffer.
+
+        Tracing is off by default, and then `start_span` returns None right away: no ids are generated and the lazy
+        attributes of the span, which usually format whole payloads, are never evaluated. Spans are only converted to
+        Chrome trace or OTLP JSON when exported.
+        """
+        self.enabled = False
+        self.process = ""
+        self.spans: deque[Span] = deque(maxlen=10_000)
+
+    def enable(self, process: str = "", capacity: int = 10_000) -> None:
+        """:param process: Name of this process in the exported traces, usually the name of the router or provider."""
+        self.process = process
+        if capacity != self.spans.maxlen:
+            self.spans = deque(self.spans, maxlen=capacity)
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def current(self) -> SpanContext | None:
+        return _current.get() if self.enabled else None
+
+    def start_span(
+        self,
+        name: str,
+        parent: SpanContext | None = None,
+        attributes: Callable[[], dict[str, object]] | None = None,
+    ) -> Span | None:
+        """
+        Start a span and make it the current one, returns None if tracing is disabled.
+
+        :param parent: Context of the parent span, usually from an incoming packet. Defaults to the current span.
+        :param attributes: Called only when tracing is enabled, so formatting payloads costs nothing otherwise.
+        """
+        if not self.enabled:
+            return None
+
+        if parent is None:
+            parent = _current.get()
+        trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        span = Span(
+            name=name,
+            context=SpanContext(trace_id, f"{random.getrandbits(64):016x}"),
+            parent_id=parent.span_id if parent is not None else None,
+            process=self.process,
+            thread=threading.get_ident(),
+            start_ns=time.time_ns(),
+            attributes={} if attributes is None else {k: _format_attribute(v) for k, v in attributes().items()},
+        )
+        span.token = _current.set(span.context)
+        return span
+
+    def end_span(self, span: Span | None, error: BaseException | str | None = None) -> None:
+        if span is None:
+            return
+
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = True
+            span.attributes["error"] = _format_attribute(error)
+        if span.token is not None:
+            # Ended from another context than the one that started it, the current span there is left alone.
+            with contextlib.suppress(ValueError):
+                _current.reset(span.token)
+            span.token = None
+        self.spans.append(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        parent: SpanContext | None = None,
+        attributes: Callable[[], dict[str, object]] | None = None,
+    ) -> Iterator[Span | None]:
+        span = self.start_span(name, parent, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        self.end_span(span)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """Convert the recorded spans to the Chrome trace event format, for chrome://tracing or Perfetto."""
+        spans = list(self.spans)
+        pids = {process: pid for pid, process in enumerate(dict.fromkeys(s.process for s in spans), start=1)}
+        events: list[dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}} for process, pid in pids.items()
+        ]
+        events += [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pids[span.process],
+                "tid": span.thread,
+                "args": {
+                    "trace_id": span.context.trace_id,
+                    "span_id": span.context.span_id,
+                    "parent_id": span.parent_id,
+                    "error": span.error,
+                    **span.attributes,
+                },
+            }
+            for span in spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_json(self) -> dict[str, Any]:
+        """Convert the recorded spans to the OTLP JSON encoding, one resource per process."""
+        by_process: dict[str, list[dict[str, Any]]] = {}
+        for span in list(self.spans):
+            by_process.setdefault(span.process, []).append(
+                {
+                    "traceId": span.context.trace_id,
+                    "spanId": span.context.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": k, "value": {"stringValue": v}} for k, v in span.attributes.items()],
+                    "status": {"code": 2 if span.error else 1},  # STATUS_CODE_ERROR / STATUS_CODE_OK
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": process}}]},
+                    "scopeSpans": [{"scope": {"name": "pqnstack"}, "spans": spans}],
+                }
+                for process, spans in by_process.items()
+            ]
+        }
+
+    def export(self, path: Path | str, trace_format: TraceFormat = "chrome") -> None:
+        data = self.chrome_trace() if trace_format == "chrome" else self.otlp_json()
+        Path(path).write_text(json.dumps(data))
+        logger.info("Exported %d spans to %s", len(self.spans), path)
+
+
+TRACER = Tracer()
@@ -1,8 +1,15 @@
+import atexit
+import dataclasses
 import json
 import logging
+import signal
+import sys
 import tomllib
 from pathlib import Path
 from typing import Annotated
+from typing import Any
+from typing import cast
+from typing import get_args
 
 import tomli_w
 import typer
@@ -14,6 +21,11 @@ from pqnstack.app.cron_manager import remove_daily_report_job
 from pqnstack.app.cron_manager import set_daily_report_schedule
 from pqnstack.app.daily_report import run_daily_report
 from pqnstack.base.errors import InvalidNetworkConfigurationError
+from pqnstack.base.instrument import LogPolicy
+from pqnstack.base.instrument import set_log_policy
+from pqnstack.base.metrics import start_metrics_server
+from pqnstack.base.tracing import TRACER
+from pqnstack.base.tracing import TraceFormat
 from pqnstack.network.instrument_provider import InstrumentProvider
 from pqnstack.network.router import Router
 
@@ -50,7 +62,45 @@ def _verify_instruments_config(instruments: list[dict[str, str]]) -> dict[str, d
     return ins
 
 
-def _load_and_parse_provider_config(
+def _parse_observability_config(section: dict[str, Any], kwargs: dict[str, str | int]) -> None:
+    """Options shared by routers and providers to serve metrics and record traces."""
+    if "metrics_port" in section:
+        kwargs["metrics_port"] = int(section["metrics_port"])
+    if "trace_file" in section:
+        kwargs["trace_file"] = str(section["trace_file"])
+    if "trace_format" in section:
+        kwargs["trace_format"] = str(section["trace_format"])
+
+
+def _log_policy(base: LogPolicy, config: dict[str, Any]) -> LogPolicy:
+    changes: dict[str, Any] = {}
+    if "level" in config:
+        level = config["level"]
+        changes["level"] = level if isinstance(level, int) else logging.getLevelNamesMapping()[str(level).upper()]
+    if "max_per_second" in config:
+        changes["max_per_second"] = float(config["max_per_second"])
+    if "aggregate_every" in config:
+        changes["aggregate_every"] = int(config["aggregate_every"])
+    return dataclasses.replace(base, **changes)
+
+
+def _configure_log_policies(config: dict[str, Any]) -> None:
+    """
+    Set how instrument calls are logged from the `log_policy` table of a provider config.
+
+    The keys of the table set the default policy and `log_policy.instruments.<name>` tables override it per instrument.
+    """
+    try:
+        default = _log_policy(LogPolicy(), config)
+        set_log_policy(default)
+        for name, instrument_config in config.get("instruments", {}).items():
+            set_log_policy(_log_policy(default, instrument_config), name)
+    except (KeyError, TypeError, ValueError) as e:
+        msg = f"Invalid log_policy configuration: {e}"
+        raise InvalidNetworkConfigurationError(msg) from e
+
+
+def _load_and_parse_provider_config(  # noqa: C901
     config_path: Path | str, kwargs: dict[str, str | int], instruments: dict[str, dict[str, str]]
 ) -> tuple[dict[str, str | int], dict[str, dict[str, str]]]:
     path = Path(config_path)
@@ -72,6 +122,13 @@ def _load_and_parse_provider_config(
         kwargs["port"] = int(provider["port"])
     if "beat_period" in provider:
         kwargs["beat_period"] = int(provider["beat_period"])
+    if "publish_port" in provider:
+        kwargs["publish_port"] = int(provider["publish_port"])
+    if "publish_host" in provider:
+        kwargs["publish_host"] = str(provider["publish_host"])
+    _parse_observability_config(provider, kwargs)
+    if "log_policy" in provider:
+        _configure_log_policies(provider["log_policy"])
 
     if "instruments" in provider:
         instruments = _verify_instruments_config(provider["instruments"])
@@ -79,8 +136,29 @@ def _load_and_parse_provider_config(
     return kwargs, instruments
 
 
+def _start_metrics_server(kwargs: dict[str, str | int]) -> None:
+    """Serve the metrics of a router or provider process if a `metrics_port` was configured."""
+    if "metrics_port" in kwargs:
+        start_metrics_server(str(kwargs.get("host", "localhost")), int(kwargs.pop("metrics_port")))
+
+
+def _start_tracing(kwargs: dict[str, str | int]) -> None:
+    """Trace a router or provider process and export the spans when it exits, if a `trace_file` was configured."""
+    trace_format = kwargs.pop("trace_format", "chrome")
+    if trace_format not in get_args(TraceFormat):
+        msg = f"Trace format must be 'chrome' or 'otlp', not '{trace_format}'"
+        raise InvalidNetworkConfigurationError(msg)
+    if "trace_file" not in kwargs:
+        return
+
+    TRACER.enable(process=str(kwargs["name"]))
+    atexit.register(TRACER.export, str(kwargs.pop("trace_file")), cast("TraceFormat", trace_format))
+    # Terminating the process would otherwise skip the export.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+
 @app.command()
-def start_provider(  # noqa: PLR0913
+def start_provider(  # noqa: C901, PLR0912, PLR0913
     name: Annotated[str | None, typer.Option(help="Name of the InstrumentProvider.")] = None,
     router_name: Annotated[
         str | None, typer.Option(help="Name of the router this provider will talk to (default: 'router1').")
@@ -95,6 +173,22 @@ def start_provider(  # noqa: PLR0913
         int | None, typer.Option(help="Port of the provider (default: 5555). Has to be the same port as the Router.")
     ] = None,
     beat_period: Annotated[int | None, typer.Option(help="Heartbeat period in milliseconds (default: 1000)")] = None,
+    publish_port: Annotated[
+        int | None,
+        typer.Option(help="Port to publish changes of observable instrument state on (default: nothing is published)"),
+    ] = None,
+    publish_host: Annotated[
+        str | None, typer.Option(help="Host clients reach the published changes at (default: 'localhost')")
+    ] = None,
+    metrics_port: Annotated[
+        int | None, typer.Option(help="Port to serve Prometheus metrics on (default: metrics are not served)")
+    ] = None,
+    trace_file: Annotated[
+        str | None, typer.Option(help="Record traces and write them to this file on exit (default: no tracing)")
+    ] = None,
+    trace_format: Annotated[
+        str | None, typer.Option(help="Format of the trace file, 'chrome' or 'otlp' (default: 'chrome')")
+    ] = None,
     instruments: Annotated[
         str | None,
         typer.Option(
@@ -126,6 +220,16 @@ def start_provider(  # noqa: PLR0913
         kwargs["port"] = port
     if beat_period:
         kwargs["beat_period"] = beat_period
+    if publish_port:
+        kwargs["publish_port"] = publish_port
+    if publish_host:
+        kwargs["publish_host"] = publish_host
+    if metrics_port:
+        kwargs["metrics_port"] = metrics_port
+    if trace_file:
+        kwargs["trace_file"] = trace_file
+    if trace_format:
+        kwargs["trace_format"] = trace_format
     if instruments:
         # We don't want to override instruments, instead combining them with the ones from config file is cleaner behaviour.
         ins = {**ins, **json.loads(instruments)}
@@ -134,6 +238,8 @@ def start_provider(  # noqa: PLR0913
         msg = "InstrumentProvider name is required"
         raise InvalidNetworkConfigurationError(msg)
 
+    _start_metrics_server(kwargs)
+    _start_tracing(kwargs)
     provider = InstrumentProvider(**kwargs, **ins)  # type: ignore[arg-type]
     provider.start()
 
@@ -152,11 +258,16 @@ def _load_and_parse_router_config(config_path: Path | str, kwargs: dict[str, str
         kwargs["host"] = str(router["host"])
     if "port" in router:
         kwargs["port"] = int(router["port"])
+    if "telemetry_port" in router:
+        kwargs["telemetry_port"] = int(router["telemetry_port"])
+    if "telemetry_history" in router:
+        kwargs["telemetry_history"] = int(router["telemetry_history"])
+    _parse_observability_config(router, kwargs)
     return kwargs
 
 
 @app.command()
-def start_router(
+def start_router(  # noqa: PLR0913
     name: Annotated[str | None, typer.Option(help="Name of the router (default 'router1')")] = None,
     host: Annotated[
         str | None,
@@ -165,6 +276,19 @@ def start_router(
         ),
     ] = None,
     port: Annotated[str | None, typer.Option(help="Port of the router (default: 5555)")] = None,
+    telemetry_port: Annotated[
+        str | None,
+        typer.Option(help="Port where provider telemetry is published (default: telemetry is not published)"),
+    ] = None,
+    metrics_port: Annotated[
+        str | None, typer.Option(help="Port to serve Prometheus metrics on (default: metrics are not served)")
+    ] = None,
+    trace_file: Annotated[
+        str | None, typer.Option(help="Record traces and write them to this file on exit (default: no tracing)")
+    ] = None,
+    trace_format: Annotated[
+        str | None, typer.Option(help="Format of the trace file, 'chrome' or 'otlp' (default: 'chrome')")
+    ] = None,
     config: Annotated[
         str | None, typer.Option(help="Path to the config file, will get overridden by command line arguments.")
     ] = None,
@@ -184,11 +308,22 @@ def start_router(
         kwargs["host"] = host
     if port:
         kwargs["port"] = int(port)
+    if telemetry_port:
+        kwargs["telemetry_port"] = int(telemetry_port)
+    if metrics_port:
+        kwargs["metrics_port"] = int(metrics_port)
+    if trace_file:
+        kwargs["trace_file"] = trace_file
+    if trace_format:
+        kwargs["trace_format"] = trace_format
 
     if "name" not in kwargs:
         msg = "Router name is required"
         raise InvalidNetworkConfigurationError(msg)
 
+    _start_metrics_server(kwargs)
+    _start_tracing(kwargs)
+
     # mypy doesn't like **kwargs https://github.com/python/mypy/issues/5382#issuecomment-417433738
     router = Router(**kwargs)  # type: ignore[arg-type]
     router.start()
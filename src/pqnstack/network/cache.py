@@ -0,0 +1,63 @@
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True, slots=True)
+class ParameterReading[T]:
+    value: T
+    # time.monotonic() when the request for the value was sent, the instrument held it at some point after that.
+    read_at: float
+
+    @property
+    def age_s(self) -> float:
+        """Upper bound of how old the value is."""
+        return time.monotonic() - self.read_at
+
+
+@dataclass(frozen=True, slots=True)
+class CacheInvalidation:
+    """Published by a provider when the state of one of its instruments changes."""
+
+    provider: str
+    instrument: str
+    # None invalidates every cached value of the instrument, operations can change any of them.
+    parameters: frozenset[str] | None = None
+
+
+class ParameterCache:
+    def __init__(self, ttl_s: dict[str, float] | None = None) -> None:
+        """
+        Client-side cache of parameter readings.
+
+        :param ttl_s: How long the readings of each parameter are served from the cache, in seconds. Parameters
+         missing from it are not cached unless a read asks for a maximum age explicitly.
+        """
+        self.ttl_s = dict(ttl_s or {})
+        self._readings: dict[str, ParameterReading[Any]] = {}
+
+    def get(self, name: str, max_age_s: float | None = None) -> ParameterReading[Any] | None:
+        """Return the reading of `name` if it is younger than `max_age_s`, the TTL of the parameter if None."""
+        if max_age_s is None:
+            max_age_s = self.ttl_s.get(name, 0.0)
+        reading = self._readings.get(name)
+        if reading is None or reading.age_s > max_age_s:
+            return None
+        return reading
+
+    def put(self, name: str, reading: ParameterReading[Any]) -> None:
+        self._readings[name] = reading
+
+    def invalidate(self, names: Iterable[str] | None = None) -> None:
+        if names is None:
+            self._readings.clear()
+            return
+        for name in names:
+            self._readings.pop(name, None)
+
+
+def invalidation_topic(provider: str, instrument: str | None = None) -> bytes:
+    """PUB/SUB topic of the invalidations of `instrument`, or of every instrument of `provider` if None."""
+    topic = b"invalidation\0" + provider.encode() + b"\0"
+    return topic if instrument is None else topic + instrument.encode() + b"\0"
@@ -2,8 +2,10 @@ import logging
 import pickle
 import secrets
 import string
+import time
 from collections.abc import Callable
 from dataclasses import dataclass
+from dataclasses import field
 from types import TracebackType
 from typing import Any
 from typing import NamedTuple
@@ -11,18 +13,49 @@ from typing import Self
 
 import zmq
 
+from pqnstack.base.errors import MotionStalledError
+from pqnstack.base.errors import MotionTimeoutError
 from pqnstack.base.errors import PacketError
 from pqnstack.base.instrument import Instrument
 from pqnstack.base.instrument import InstrumentInfo
+from pqnstack.base.tracing import TRACER
+from pqnstack.network.cache import CacheInvalidation
+from pqnstack.network.cache import ParameterCache
+from pqnstack.network.cache import ParameterReading
+from pqnstack.network.cache import invalidation_topic
 from pqnstack.network.packet import NetworkElementClass
 from pqnstack.network.packet import Packet
 from pqnstack.network.packet import PacketIntent
 from pqnstack.network.packet import create_registration_packet
+from pqnstack.network.state import StateChange
+from pqnstack.network.state import decode_state_change
+from pqnstack.network.state import state_topic
+from pqnstack.network.telemetry import TelemetrySnapshot
+from pqnstack.network.telemetry import telemetry_topic
 
 logger = logging.getLogger(__name__)
 
+# Errors of remote instruments raised again with their own type by the client, the transient ones callers retry.
+# Any other error of a remote instrument is raised as a `PacketError`.
+REMOTE_ERRORS: dict[str, type[Exception]] = {
+    error.__name__: error for error in (TimeoutError, ConnectionError, MotionTimeoutError, MotionStalledError)
+}
+
+
+def _random_suffix() -> str:
+    return "".join(secrets.choice(string.ascii_uppercase + string.ascii_lowercase + string.digits) for _ in range(6))
+
+
+def _remote_error(packet: Packet) -> Exception:
+    """Build the exception an error packet stands for, see `REMOTE_ERRORS`."""
+    _, _, name = packet.request.partition(":")
+    error = REMOTE_ERRORS.get(name)
+    return PacketError(str(packet)) if error is None else error(str(packet.payload))
+
 
 class ClientBase:
+    element_class = NetworkElementClass.CLIENT
+
     def __init__(
         self,
         name: str = "",
@@ -32,10 +65,11 @@ class ClientBase:
         timeout: int = 30000,
     ) -> None:
         if name == "":
-            name = "".join(
-                secrets.choice(string.ascii_uppercase + string.ascii_lowercase + string.digits) for _ in range(6)
-            )
+            name = _random_suffix()
         self.name = name
+        self._base_name = name
+        # Names left behind by `_reset_socket`, sent with the next registration.
+        self._stale_names: list[str] = []
 
         self.host = host
         self.port = port
@@ -44,7 +78,10 @@ class ClientBase:
 
         self.timeout = timeout
 
+        # Port of the PUB socket of the router, None if it does not publish.
+        self.telemetry_port: int | None = None
         self.connected = False
+        self.registered = False
         self.context: zmq.Context[zmq.Socket[bytes]] | None = None
         self.socket: zmq.Socket[bytes] | None = None
 
@@ -63,14 +100,24 @@ class ClientBase:
     def connect(self) -> None:
         logger.info("Starting client '%s' Connecting to %s", self.name, self.address)
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.setsockopt(zmq.RCVTIMEO, self.timeout)
-        self.socket.setsockopt_string(zmq.IDENTITY, self.name)
-        self.socket.connect(self.address)
+        self._open_socket()
         self.connected = True
 
+        try:
+            self.register()
+        except Exception:
+            self.disconnect()
+            raise
+        logger.info("Acknowledged by server. Client is connected.")
+
+    def register(self) -> Packet:
+        """Register with the router, which also serves as a round trip check that the router is alive."""
         reg_packet = create_registration_packet(
-            source=self.name, destination=self.router_name, payload=NetworkElementClass.CLIENT, hops=0
+            source=self.name,
+            destination=self.router_name,
+            payload=self.element_class,
+            hops=0,
+            replaces=tuple(self._stale_names),
         )
         ret = self.ask(reg_packet)
         if ret is None:
@@ -79,7 +126,35 @@ class ClientBase:
         if ret.intent != PacketIntent.REGISTRATION_ACK:
             msg = "Registration failed."
             raise RuntimeError(msg)
-        logger.info("Acknowledged by server. Client is connected.")
+        self.telemetry_port = ret.payload if isinstance(ret.payload, int) else None
+        self.registered = True
+        self._stale_names.clear()
+        return ret
+
+    def _open_socket(self) -> None:
+        if self.context is None:
+            msg = "Context is None. Cannot open a socket."
+            raise RuntimeError(msg)
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.RCVTIMEO, self.timeout)
+        self.socket.setsockopt_string(zmq.IDENTITY, self.name)
+        self.socket.connect(self.address)
+
+    def _reset_socket(self) -> None:
+        """
+        Replace the socket after a request timed out, a REQ socket cannot send again before it gets the reply.
+
+        The reply may still come, so the new socket connects under a new name. The router routes the late reply to
+        the closed socket, where it is dropped, instead of answering the next request. The next request registers the
+        new name first, telling the router to forget the old one.
+        """
+        if self.socket is not None:
+            self.socket.close(linger=0)
+        self._stale_names.append(self.name)
+        self.name = f"{self._base_name}_{_random_suffix()}"
+        self.registered = False
+        self._open_socket()
+        logger.info("Reconnected to %s as %s after a timeout", self.address, self.name)
 
     def disconnect(self) -> None:
         logger.info("Disconnecting from %s", self.address)
@@ -88,7 +163,8 @@ class ClientBase:
             self.connected = False
             return
 
-        self.socket.close()
+        # Drop unanswered requests right away, otherwise the context blocks forever if the router is gone.
+        self.socket.close(linger=0)
         self.connected = False
         logger.info("Disconnected from %s", self.address)
 
@@ -103,20 +179,30 @@ class ClientBase:
             logger.error(msg)
             raise RuntimeError(msg)
 
-        # try so that if timeout happens, the client remains usable
-
-        self.socket.send(pickle.dumps(packet))
-        try:
-            response = self.socket.recv()
-        except zmq.error.Again as e:
-            logger.exception("Timeout occurred.")
-            raise TimeoutError from e
-
-        ret: Packet = pickle.loads(response)
-        logger.debug("Response received.")
-        logger.debug("Response: %s", str(ret))
-        if ret.intent == PacketIntent.ERROR:
-            raise PacketError(str(ret))
+        if not self.registered and packet.intent != PacketIntent.REGISTRATION:
+            self.register()
+            packet.source = self.name
+
+        with TRACER.span(
+            f"client {packet.request}",
+            attributes=lambda: {"destination": packet.destination, "payload": packet.payload},
+        ) as span:
+            if span is not None:
+                packet.trace = span.context
+
+            self.socket.send(pickle.dumps(packet))
+            try:
+                response = self.socket.recv()
+            except zmq.error.Again as e:
+                logger.exception("Timeout occurred.")
+                # So that the client remains usable.
+                self._reset_socket()
+                raise TimeoutError from e
+
+            ret: Packet = pickle.loads(response)
+            logger.debug("Response received.")
+            if ret.intent == PacketIntent.ERROR:
+                raise _remote_error(ret)
 
         return ret
 
@@ -159,6 +245,36 @@ class InstrumentClient(ClientBase):
 
         self.instrument_name = init_args.instrument_name
         self.provider_name = init_args.provider_name
+        self.invalidations: zmq.Socket[bytes] | None = None
+
+    def disconnect(self) -> None:
+        if self.invalidations is not None:
+            self.invalidations.close(linger=0)
+            self.invalidations = None
+        super().disconnect()
+
+    def subscribe_invalidations(self) -> bool:
+        """Subscribe to the cache invalidations of the instrument, returns False if the router does not publish them."""
+        if self.invalidations is not None:
+            return True
+        if self.telemetry_port is None or self.context is None:
+            return False
+
+        self.invalidations = self.context.socket(zmq.SUB)
+        self.invalidations.connect(f"tcp://{self.host}:{self.telemetry_port}")
+        self.invalidations.setsockopt(zmq.SUBSCRIBE, invalidation_topic(self.provider_name, self.instrument_name))
+        return True
+
+    def pending_invalidations(self) -> list[CacheInvalidation]:
+        """Invalidations received since the last call, without waiting for new ones."""
+        if self.invalidations is None:
+            return []
+
+        pending = []
+        while self.invalidations.poll(0):
+            _, pickled_invalidation = self.invalidations.recv_multipart()
+            pending.append(pickle.loads(pickled_invalidation))
+        return pending
 
     def trigger_operation(self, operation: str, *args: Any, **kwargs: Any) -> Any:
         packet = self.create_control_packet(
@@ -204,7 +320,14 @@ class ProxyInstrumentInit(NamedTuple):
 
 @dataclass
 class ProxyInstrument(Instrument):
-    """The address here is the zmq address of the router that the InstrumentClient will talk to."""
+    """
+    The address here is the zmq address of the router that the InstrumentClient will talk to.
+
+    Reading a parameter is a round trip to the provider, unless `cache_ttl_s` gives it a time to live. Cached readings
+    are dropped when the parameter is written through this proxy, after any operation, and when the provider
+    publishes that the instrument changed, so the TTL only bounds how long changes made outside the network go
+    unnoticed. The key "info" caches `info`.
+    """
 
     name: str = ""
     desc: str = ""
@@ -216,6 +339,7 @@ class ProxyInstrument(Instrument):
     client_name: str = ""
     provider_name: str = "provider1"
     instrument_name: str = "instrument1"
+    cache_ttl_s: dict[str, float] = field(default_factory=dict)
 
     # Boolean used to control when new attributes are being set.
     _instantiating: bool = True
@@ -238,24 +362,62 @@ class ProxyInstrument(Instrument):
             provider_name=self.provider_name,
         )
         self.client = InstrumentClient(instrument_client_init)
+        self.cache = ParameterCache(self.cache_ttl_s)
+        if self.cache_ttl_s and not self.client.subscribe_invalidations():
+            logger.warning(
+                "Router %s does not publish invalidations, cached readings expire on TTL only", self.router_name
+            )
 
         self._instantiating = False
 
     def __getattr__(self, name: str) -> Any:
         if name in self.operations:
-            return lambda *args, **kwargs: self.client.trigger_operation(name, *args, **kwargs)
+            return lambda *args, **kwargs: self._trigger_operation(name, *args, **kwargs)
         if name in self.parameters:
-            return self.client.trigger_parameter(name)
+            return self.read_parameter(name).value
         msg = f"Attribute '{name}' not found."
         raise AttributeError(msg)
 
+    def _trigger_operation(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return self.client.trigger_operation(name, *args, **kwargs)
+        finally:
+            self.cache.invalidate()
+
+    def read_parameter(self, name: str, max_age_s: float | None = None) -> ParameterReading[Any]:
+        """
+        Read a parameter along with a bound of how stale the value is.
+
+        :param max_age_s: Oldest cached reading accepted, defaults to the TTL of the parameter. 0 always asks the
+         provider.
+        """
+        if name not in self.parameters and name != "info":
+            msg = f"Parameter '{name}' not found."
+            raise AttributeError(msg)
+
+        if max_age_s is not None:
+            self.client.subscribe_invalidations()
+        for invalidation in self.client.pending_invalidations():
+            self.cache.invalidate(invalidation.parameters)
+
+        reading = self.cache.get(name, max_age_s)
+        if reading is None:
+            read_at = time.monotonic()
+            value = self.client.get_info() if name == "info" else self.client.trigger_parameter(name)
+            reading = ParameterReading(value, read_at)
+            self.cache.put(name, reading)
+        return reading
+
     def __setattr__(self, name: str, value: Any) -> None:
         # Catch the first iteration
         if name == "_instantiating" or self._instantiating:
             super().__setattr__(name, value)
             return
         if name in self.parameters:
-            self.client.trigger_parameter(name, value)
+            try:
+                self.client.trigger_parameter(name, value)
+            finally:
+                self.cache.invalidate([name])
             return
         msg = "Cannot manually set attributes in a ProxyInstrument"
         raise AttributeError(msg)
@@ -268,10 +430,29 @@ class ProxyInstrument(Instrument):
 
     @property
     def info(self) -> InstrumentInfo:
-        return self.client.get_info()
+        info: InstrumentInfo = self.read_parameter("info").value
+        return info
 
 
 class Client(ClientBase):
+    def __init__(
+        self,
+        name: str = "",
+        host: str = "127.0.0.1",
+        port: int = 5555,
+        router_name: str = "router1",
+        timeout: int = 30000,
+    ) -> None:
+        # SUB sockets to the providers this client subscribed to, by provider name.
+        self.subscribers: dict[str, zmq.Socket[bytes]] = {}
+        super().__init__(name, host, port, router_name, timeout)
+
+    def disconnect(self) -> None:
+        for subscriber in self.subscribers.values():
+            subscriber.close(linger=0)
+        self.subscribers.clear()
+        super().disconnect()
+
     def ping(self, destination: str) -> Packet | None:
         ping_packet = Packet(
             intent=PacketIntent.PING, request="PING", source=self.name, destination=destination, hops=0, payload=None
@@ -288,7 +469,14 @@ class Client(ClientBase):
 
         return response.payload
 
-    def get_device(self, provider_name: str, device_name: str, timeout_ms: int = 60_000) -> Instrument:
+    def get_device(
+        self,
+        provider_name: str,
+        device_name: str,
+        timeout_ms: int = 60_000,
+        cache_ttl_s: dict[str, float] | None = None,
+    ) -> Instrument:
+        """:param cache_ttl_s: Seconds the readings of each parameter are cached for, see `ProxyInstrument`."""
         packet = self.create_data_packet(provider_name, "GET_DEVICE_STRUCTURE", device_name)
 
         response = self.ask(packet)
@@ -316,4 +504,119 @@ class Client(ClientBase):
             provider_name=provider_name,
             parameters=set(response.payload["parameters"]),
             operations=response.payload["operations"],
+            observables=set(response.payload.get("observables", ())),
+            cache_ttl_s=cache_ttl_s or {},
         )
+
+    def get_publish_address(self, provider_name: str) -> str | None:
+        """Address of the PUB socket of a provider, None if it does not publish the state of its instruments."""
+        response = self.ask(self.create_data_packet(provider_name, "GET_PUBLISH_ADDRESS", None))
+        if response.payload is not None and not isinstance(response.payload, str):
+            msg = "Payload is not an address."
+            raise PacketError(msg)
+        return response.payload
+
+    def subscribe(self, provider_name: str, instrument: str | None = None, name: str | None = None) -> None:
+        """
+        Start receiving the changes of the observables of a provider, see `Instrument`.
+
+        :param instrument: Only receive the changes of this instrument, every instrument of the provider if None.
+        :param name: Only receive the changes of this observable of `instrument`, all of them if None.
+        """
+        if self.context is None:
+            msg = "No connection yet."
+            raise RuntimeError(msg)
+
+        subscriber = self.subscribers.get(provider_name)
+        if subscriber is None:
+            address = self.get_publish_address(provider_name)
+            if address is None:
+                msg = f"Provider {provider_name} does not publish the state of its instruments."
+                raise RuntimeError(msg)
+            subscriber = self.context.socket(zmq.SUB)
+            subscriber.connect(address)
+            self.subscribers[provider_name] = subscriber
+        subscriber.setsockopt(zmq.SUBSCRIBE, state_topic(provider_name, instrument, name))
+
+    def unsubscribe(self, provider_name: str, instrument: str | None = None, name: str | None = None) -> None:
+        """Undo a `subscribe` call made with the same arguments."""
+        if provider_name in self.subscribers:
+            self.subscribers[provider_name].setsockopt(zmq.UNSUBSCRIBE, state_topic(provider_name, instrument, name))
+
+    def receive_state(self, timeout_ms: int | None = None) -> StateChange | None:
+        """Next change from any subscribed provider, None if nothing arrives within `timeout_ms` (None waits forever)."""
+        if not self.subscribers:
+            msg = "Call subscribe before receiving state changes."
+            raise RuntimeError(msg)
+
+        poller = zmq.Poller()
+        for subscriber in self.subscribers.values():
+            poller.register(subscriber, zmq.POLLIN)
+        ready = dict(poller.poll(timeout_ms))
+        for subscriber in self.subscribers.values():
+            if subscriber in ready:
+                return decode_state_change(subscriber.recv_multipart())
+        return None
+
+
+class TelemetryClient(ClientBase):
+    """
+    Reads the provider telemetry collected by the router.
+
+    `history` queries the ring buffers of the router. Live snapshots are received with `subscribe` and `receive`
+    from the PUB socket of the router, so watching the network adds no load to the request path.
+    """
+
+    element_class = NetworkElementClass.TELEMETRY
+
+    def __init__(
+        self,
+        name: str = "",
+        host: str = "127.0.0.1",
+        port: int = 5555,
+        router_name: str = "router1",
+        timeout: int = 30000,
+    ) -> None:
+        self.subscriber: zmq.Socket[bytes] | None = None
+        super().__init__(name, host, port, router_name, timeout)
+
+    def disconnect(self) -> None:
+        if self.subscriber is not None:
+            self.subscriber.close(linger=0)
+            self.subscriber = None
+        super().disconnect()
+
+    def history(self, provider: str | None = None, since: float | None = None) -> list[TelemetrySnapshot]:
+        """Snapshots stored by the router for `provider` (every provider if None) taken after `since`."""
+        packet = self.create_data_packet(self.router_name, "GET_TELEMETRY", {"provider": provider, "since": since})
+        response = self.ask(packet)
+        if not isinstance(response.payload, list):
+            msg = "Payload is not a list of telemetry snapshots."
+            raise PacketError(msg)
+        return response.payload
+
+    def subscribe(self, provider: str | None = None) -> None:
+        """Start receiving the snapshots of `provider`, or of every provider if None."""
+        if self.telemetry_port is None:
+            msg = f"Router {self.router_name} does not publish telemetry."
+            raise RuntimeError(msg)
+        if self.context is None:
+            msg = "No connection yet."
+            raise RuntimeError(msg)
+
+        if self.subscriber is None:
+            self.subscriber = self.context.socket(zmq.SUB)
+            self.subscriber.connect(f"tcp://{self.host}:{self.telemetry_port}")
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, telemetry_topic(provider))
+
+    def receive(self, timeout_ms: int | None = None) -> TelemetrySnapshot | None:
+        """Next published snapshot, None if nothing arrives within `timeout_ms` (None waits forever)."""
+        if self.subscriber is None:
+            msg = "Call subscribe before receiving telemetry."
+            raise RuntimeError(msg)
+
+        if not self.subscriber.poll(timeout_ms):
+            return None
+        _, pickled_snapshot = self.subscriber.recv_multipart()
+        snapshot: TelemetrySnapshot = pickle.loads(pickled_snapshot)
+        return snapshot
@@ -2,6 +2,7 @@ import datetime
 import importlib
 import logging
 import pickle
+import time
 from typing import Any
 
 import zmq
@@ -9,22 +10,40 @@ import zmq
 from pqnstack.base.errors import CouldNotConnectToNetworkElementError
 from pqnstack.base.errors import InvalidInstrumentsConfigurationError
 from pqnstack.base.instrument import Instrument
+from pqnstack.base.metrics import Counter
+from pqnstack.base.metrics import Histogram
+from pqnstack.base.tracing import TRACER
+from pqnstack.network.cache import CacheInvalidation
 from pqnstack.network.packet import NetworkElementClass
 from pqnstack.network.packet import Packet
 from pqnstack.network.packet import PacketIntent
 from pqnstack.network.packet import create_registration_packet
+from pqnstack.network.state import StatePublisher
+from pqnstack.network.telemetry import TelemetryRecorder
+from pqnstack.network.telemetry import TelemetrySnapshot
 
 logger = logging.getLogger(__name__)
 
+REQUEST_SECONDS = Histogram(
+    "pqnstack_provider_request_seconds",
+    "Time an instrument takes to serve an operation, parameter or info request.",
+    ["instrument", "kind", "name"],
+)
+REQUEST_ERRORS = Counter(
+    "pqnstack_provider_request_errors", "Instrument requests answered with an error.", ["instrument", "kind", "name"]
+)
+
 
 class InstrumentProvider:
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         name: str,
         host: str = "localhost",
         port: int = 5555,
         router_name: str = "router1",
         beat_period: int = 1000,
+        publish_port: int | None = None,
+        publish_host: str = "localhost",
         **instruments: dict[str, Any],
     ) -> None:
         """
@@ -34,12 +53,18 @@ class InstrumentProvider:
         single `Router` instance through zqm and awaits for instructions from it. Every `beat_interval` milliseconds,
         sends a registration packet to the router.
         This is done so if the router goes offline, the provider can reconnect to the router automatically.
+        Every beat also carries the telemetry of the provider: call counts, latency histograms, error counts and
+        hardware status of every instrument.
 
         :param name: Name for the InstrumentProvider.
         :param host: Hostname or IP address of the Router this provider talks to.
         :param port: Port of the name of the Router this provider talks to.
         :param router_name: Name of the Router this provider talks to.
         :param beat_period: Interval in milliseconds to send a beat to the Router.
+        :param publish_port: Port of the PUB socket where the changes of the observables of the instruments are
+         published. Nothing is published if None.
+        :param publish_host: Host clients connect to for the published changes, the address of this machine as seen
+         by them.
         :param instruments: Instruments is a Dictionary holding the necessary instructions to initialize any hardware
          the InstrumentProvider talks to. The keys are the names of the instruments, every key has another dictionary as its value
          with all the necessary instructions to initialize the instrument. Inside of the dictionary for the specific
@@ -70,6 +95,9 @@ class InstrumentProvider:
 
         self.context: zmq.Context[zmq.Socket[bytes]] | None = None
         self.socket: zmq.Socket[bytes] | None = None  # Has the instance of the socket talking to the router.
+        self.publish_port = publish_port
+        self.publish_host = publish_host
+        self.publisher: StatePublisher | None = None
 
         # Verify that every instrument contains the minimum required keys.
         for ins_name, ins_dict in instruments.items():
@@ -91,6 +119,7 @@ class InstrumentProvider:
 
         self.instruments = instruments
         self.instantiated_instruments: dict[str, Instrument] = {}
+        self.telemetry = TelemetryRecorder()
 
         self.running = False
 
@@ -137,6 +166,7 @@ class InstrumentProvider:
             msg = "Could not connect to router."
             raise CouldNotConnectToNetworkElementError(msg) from er
 
+        self._start_publisher()
         # Set the beat interval to the normal value.
         self.socket.setsockopt(zmq.RCVTIMEO, self.beat_period)
         self.running = True
@@ -159,14 +189,9 @@ class InstrumentProvider:
                         self._handle_reg_acknowledge()
 
                     case PacketIntent.DATA:
-                        match packet.request:
-                            case "GET_DEVICES":
-                                response = self._handle_get_devices(packet)
-                                self.socket.send(pickle.dumps(response))
-
-                            case "GET_DEVICE_STRUCTURE":
-                                response = self._handle_get_device_structure(packet)
-                                self.socket.send(pickle.dumps(response))
+                        data_response = self._handle_data(packet)
+                        if data_response is not None:
+                            self.socket.send(pickle.dumps(data_response))
 
                     case PacketIntent.CONTROL:
                         response = self._handle_instrument_control(packet)
@@ -174,6 +199,30 @@ class InstrumentProvider:
 
         finally:
             self.socket.close()
+            if self.publisher is not None:
+                self.publisher.socket.close(linger=0)
+
+    def _start_publisher(self) -> None:
+        if self.publish_port is None or self.context is None:
+            return
+
+        publish_socket = self.context.socket(zmq.PUB)
+        publish_socket.setsockopt(zmq.SNDHWM, 1000)
+        publish_socket.bind(f"tcp://*:{self.publish_port}")
+        self.publisher = StatePublisher(self.name, publish_socket)
+        for instrument in self.instantiated_instruments.values():
+            instrument.observer = self.publisher.publish
+        logger.info("Provider %s is publishing instrument state on port %s", self.name, self.publish_port)
+
+    def _handle_data(self, packet: Packet) -> Packet | None:
+        match packet.request:
+            case "GET_DEVICES":
+                return self._handle_get_devices(packet)
+            case "GET_DEVICE_STRUCTURE":
+                return self._handle_get_device_structure(packet)
+            case "GET_PUBLISH_ADDRESS":
+                return self._handle_get_publish_address(packet)
+        return None
 
     def _listen(self) -> Packet:
         # This should never happen, but mypy complains if the check is not done
@@ -189,7 +238,7 @@ class InstrumentProvider:
             msg = f"Packet intended for {packet.destination} but received by {self.name}. Packet: {packet}"
             raise RuntimeError(msg)
 
-        logger.info("Received packet: %s", packet)
+        logger.debug("Received %s packet %s from %s", packet.intent.name, packet.request, packet.source)
 
         if not isinstance(packet, Packet):
             msg = f"Received packet is not a Packet object, got {type(packet)}"
@@ -223,7 +272,11 @@ class InstrumentProvider:
 
             self.socket.connect(self.address)
             reg_packet = create_registration_packet(
-                source=self.name, destination=self.router_name, payload=NetworkElementClass.PROVIDER, hops=0
+                source=self.name,
+                destination=self.router_name,
+                payload=NetworkElementClass.PROVIDER,
+                hops=0,
+                telemetry=self._telemetry_snapshot(),
             )
             self.socket.send(pickle.dumps(reg_packet))
             logger.info("Sent registration packet to router at %s", self.address)
@@ -232,6 +285,43 @@ class InstrumentProvider:
         except zmq.error.Again:
             logger.warning("Error while sending beat to router at %s", self.address)
 
+    def invalidate(self, instrument: str, parameters: set[str] | None = None) -> None:
+        """
+        Tell the clients caching parameters of `instrument` that their values changed.
+
+        Writes and operations requested through the network invalidate on their own, this is for changes the
+        provider learns about otherwise. The router publishes the invalidation to the subscribed clients.
+
+        :param parameters: Parameters that changed, None if any of them could have.
+        """
+        if self.socket is None:
+            msg = "Socket is None, cannot send invalidations."
+            logger.error(msg)
+            raise RuntimeError(msg)
+
+        invalidation = CacheInvalidation(
+            self.name, instrument, frozenset(parameters) if parameters is not None else None
+        )
+        packet = Packet(
+            intent=PacketIntent.DATA,
+            request="INVALIDATE",
+            source=self.name,
+            destination=self.router_name,
+            payload=invalidation,
+        )
+        self.socket.send(pickle.dumps(packet))
+
+    def _telemetry_snapshot(self) -> TelemetrySnapshot:
+        hw_status = {}
+        for ins_name, ins in self.instantiated_instruments.items():
+            try:
+                # Not `info`, that reads every logged parameter and can talk to the hardware on every beat.
+                hw_status[ins_name] = ins.hw_status
+            # A failing instrument should not stop the beats, its status is simply missing from this snapshot.
+            except Exception:  # noqa: BLE001
+                logger.debug("Could not read the hardware status of %s", ins_name)
+        return self.telemetry.snapshot(self.name, hw_status)
+
     def _handle_reg_acknowledge(self) -> None:
         logger.info("InstrumentProvider %s is connected to router at %s", self.name, self.address)
         self.running = True
@@ -272,6 +362,7 @@ class InstrumentProvider:
             "hw_address": self.instantiated_instruments[ins_name].hw_address,
             "parameters": params,
             "operations": operations,
+            "observables": self.instantiated_instruments[ins_name].observables,
         }
 
         return Packet(
@@ -282,6 +373,16 @@ class InstrumentProvider:
             payload=payload,
         )
 
+    def _handle_get_publish_address(self, packet: Packet) -> Packet:
+        address = f"tcp://{self.publish_host}:{self.publish_port}" if self.publisher is not None else None
+        return Packet(
+            intent=PacketIntent.DATA,
+            request="GET_PUBLISH_ADDRESS",
+            source=self.name,
+            destination=packet.source,
+            payload=address,
+        )
+
     def _validate_instrument_control_packet(
         self, packet: Packet
     ) -> tuple[str, str, str, Instrument, tuple[Any, ...], dict[str, Any]] | Packet:
@@ -328,8 +429,9 @@ class InstrumentProvider:
         # Adding ruff exception due to not know what type of exceptions instruments can raise.
         except Exception as e:  # noqa:BLE001
             msg = f"Error executing operation '{request_name}' in '{instrument.name}'. Error: {e}"
-            return self._create_error_packet(packet.source, msg)
+            return self._create_error_packet(packet.source, msg, e)
 
+        self.invalidate(instrument.name)
         return self._create_control_packet(packet.source, f"{instrument.name}:OPERATION:{request_name}", operation_ret)
 
     def _handle_parameter_control(
@@ -359,6 +461,7 @@ class InstrumentProvider:
             msg = f"Error setting parameter '{request_name}' in '{instrument.name}'. Error: {e}"
             return self._create_error_packet(packet.source, msg)
 
+        self.invalidate(instrument.name, {request_name})
         return self._create_control_packet(packet.source, f"{instrument.name}:PARAMETER:{request_name}", "OK")
 
     def _handle_instrument_control(self, packet: Packet) -> Packet:
@@ -370,23 +473,65 @@ class InstrumentProvider:
 
         ins_name, request_type, request_name, instrument, args, kwargs = validated_packet
 
+        start = time.perf_counter()
+        span = TRACER.start_span(
+            f"provider {packet.request}",
+            parent=packet.trace,
+            attributes=lambda: {"source": packet.source, "payload": packet.payload},
+        )
         if request_type == "OPERATION":
-            return self._handle_operation_control(request_name, instrument, packet, args, kwargs)
-
-        if request_type == "PARAMETER":
-            return self._handle_parameter_control(request_name, instrument, packet, args, kwargs)
-
-        if request_type == "INFO":
-            return self._create_control_packet(packet.source, f"{ins_name}:INFO", instrument.info)
+            response = self._handle_operation_control(request_name, instrument, packet, args, kwargs)
+        elif request_type == "PARAMETER":
+            response = self._handle_parameter_control(request_name, instrument, packet, args, kwargs)
+        elif request_type == "INFO":
+            response = self._create_control_packet(packet.source, f"{ins_name}:INFO", instrument.info)
+        else:
+            # All the possible packet options should have been handled by now, so if we get here, something went wrong.
+            msg = f"Something inside provider {self.name} went wrong. Check that your packet is correct and try again."
+            response = self._create_error_packet(packet.source, msg)
+
+        if self.publisher is not None and response.intent != PacketIntent.ERROR:
+            self._publish_changes(
+                instrument, request_type, request_name, response.payload, written=bool(args or kwargs)
+            )
 
-        # All the possible packet options should have been handled by now, so if we get here, something went wrong.
-        msg = f"Something inside provider {self.name} went wrong. Check that your packet is correct and try again."
-        return self._create_error_packet(packet.source, msg)
+        elapsed = time.perf_counter() - start
+        error = response.intent == PacketIntent.ERROR
+        TRACER.end_span(span, error=str(response.payload) if error else None)
+        self.telemetry.record(ins_name, elapsed, error=error)
+        REQUEST_SECONDS.labels(ins_name, request_type, request_name).observe(elapsed)
+        if error:
+            REQUEST_ERRORS.labels(ins_name, request_type, request_name).inc()
+        return response
+
+    def _publish_changes(
+        self, instrument: Instrument, request_type: str, request_name: str, payload: Any, *, written: bool
+    ) -> None:
+        """Publish the observables of `instrument` that a request could have changed."""
+        if self.publisher is None or not instrument.observables:
+            return
+
+        if request_type == "PARAMETER" and request_name in instrument.observables:
+            # Writes reply "OK", the value is read back in case the instrument adjusted it.
+            value = getattr(instrument, request_name) if written else payload
+            self.publisher.publish(instrument.name, request_name, value)
+        elif request_type == "OPERATION":
+            if request_name in instrument.observables:
+                self.publisher.publish(instrument.name, request_name, payload, force=True)
+            # Operations like moves change parameters, only the ones that did change get published.
+            for parameter in instrument.observables & instrument.parameters:
+                try:
+                    value = getattr(instrument, parameter)
+                except Exception:  # noqa: BLE001
+                    logger.debug("Could not read observable %s of %s", parameter, instrument.name)
+                    continue
+                self.publisher.publish(instrument.name, parameter, value)
 
-    def _create_error_packet(self, destination: str, error_msg: str) -> Packet:
+    def _create_error_packet(self, destination: str, error_msg: str, error: Exception | None = None) -> Packet:
+        # The type of the error an instrument raised lets clients raise it again, see `REMOTE_ERRORS`.
         return Packet(
             intent=PacketIntent.ERROR,
-            request="ERROR",
+            request="ERROR" if error is None else f"ERROR:{type(error).__name__}",
             source=self.name,
             destination=destination,
             payload=error_msg,
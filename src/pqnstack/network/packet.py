@@ -5,11 +5,14 @@
 #
 #
 from dataclasses import dataclass
+from dataclasses import field
 from enum import Enum
 from enum import auto
 from typing import Any
 
 from pqnstack.base.errors import PacketError
+from pqnstack.base.tracing import SpanContext
+from pqnstack.network.telemetry import TelemetrySnapshot
 
 
 class NetworkElementClass(Enum):
@@ -39,6 +42,12 @@ class Packet:
     payload: object = None
     hops: int = 0
     version: int = 1
+    # Providers piggyback their telemetry on registration heartbeats.
+    telemetry: TelemetrySnapshot | None = field(default=None, repr=False)
+    # Span the packet was sent from, so every hop can attach its own spans to the same trace.
+    trace: SpanContext | None = field(default=None, repr=False)
+    # Names a client registering again gave up after timeouts, the router forgets them.
+    replaces: tuple[str, ...] = field(default=(), repr=False)
 
     def signature(self) -> tuple[str, str, str]:
         return self.intent.name, self.request, str(self.payload)
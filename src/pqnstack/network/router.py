@@ -1,22 +1,52 @@
 import copy
 import logging
 import pickle
+import time
 
 import zmq
 
+from pqnstack.base.metrics import Counter
+from pqnstack.base.metrics import Gauge
+from pqnstack.base.metrics import Histogram
+from pqnstack.base.tracing import TRACER
+from pqnstack.network.cache import CacheInvalidation
+from pqnstack.network.cache import invalidation_topic
 from pqnstack.network.packet import NetworkElementClass
 from pqnstack.network.packet import Packet
 from pqnstack.network.packet import PacketIntent
+from pqnstack.network.telemetry import TelemetrySnapshot
+from pqnstack.network.telemetry import TelemetryStore
+from pqnstack.network.telemetry import telemetry_topic
 
 logger = logging.getLogger(__name__)
 
+HANDLE_SECONDS = Histogram(
+    "pqnstack_router_handle_seconds",
+    "Time the router takes to handle a packet, from picking it up to sending it on.",
+    ["intent"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+QUEUE_DEPTH = Gauge(
+    "pqnstack_router_queue_depth", "Packets the router handled in a row with another already waiting, 0 when idle."
+)
+REGISTERED = Gauge("pqnstack_router_registered", "Network elements registered with the router.", ["element_class"])
+ERRORS = Counter("pqnstack_router_errors", "Error packets sent back by the router.")
+
 
 # FIXME: handle not finding destination and source better
 class Router:
-    def __init__(self, name: str, host: str = "localhost", port: int = 5555) -> None:
+    def __init__(
+        self,
+        name: str,
+        host: str = "localhost",
+        port: int = 5555,
+        telemetry_port: int | None = None,
+        telemetry_history: int = 512,
+    ) -> None:
         self.name = name
         self.host = host
         self.port = port
+        self.telemetry_port = telemetry_port
 
         # TODO: Verify that this address is valid
         self.address = f"tcp://{host}:{port}"
@@ -25,19 +55,38 @@ class Router:
         self.routers: dict[str, bytes] = {}  # Holds what other routers are in the network
         self.providers: dict[str, bytes] = {}
         self.clients: dict[str, bytes] = {}
+        self.telemetry_clients: dict[str, bytes] = {}
+
+        # Telemetry providers piggyback on their heartbeats, queried with GET_TELEMETRY and published on a PUB socket.
+        # The same socket publishes the cache invalidations of the providers.
+        self.telemetry = TelemetryStore(telemetry_history)
 
         self.context: zmq.Context[zmq.Socket[bytes]] | None = None
         self.socket: zmq.Socket[bytes] | None = None
+        self.telemetry_socket: zmq.Socket[bytes] | None = None
         self.running = False
 
+        REGISTERED.labels("router").set_function(lambda: len(self.routers))
+        REGISTERED.labels("provider").set_function(lambda: len(self.providers))
+        REGISTERED.labels("client").set_function(lambda: len(self.clients))
+        REGISTERED.labels("telemetry").set_function(lambda: len(self.telemetry_clients))
+
     def start(self) -> None:
         logger.info("Starting router %s at %s", self.name, self.address)
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.ROUTER)
         self.socket.bind(self.address)
         logger.info("Router %s is now listening on %s", self.name, self.address)
+        if self.telemetry_port is not None:
+            self.telemetry_socket = self.context.socket(zmq.PUB)
+            self.telemetry_socket.setsockopt(zmq.SNDHWM, 100)
+            self.telemetry_socket.bind(f"tcp://{self.host}:{self.telemetry_port}")
+            logger.info("Router %s is publishing telemetry on port %s", self.name, self.telemetry_port)
         self.running = True
 
+        # ZMQ does not expose the length of its queues. The depth counts the packets handled in a row with another
+        # one already waiting, which grows while the router falls behind and drops to 0 once it catches up.
+        depth = 0
         try:
             while self.running:
                 identity_binary, packet = self.listen()
@@ -45,21 +94,40 @@ class Router:
                     logger.error("Error listening to packets. Either the packet is None or the identity is None.")
                     continue
 
-                match packet.intent:
-                    case PacketIntent.REGISTRATION:
-                        self.handle_registration(identity_binary, packet)
-                    case PacketIntent.ROUTING:
-                        logger.info("Got routing packet from %s", identity_binary)
-                    case _:
-                        self.handle_pass_packet(identity_binary, packet)
+                self.handle_packet(identity_binary, packet)
+                depth = depth + 1 if self.socket.poll(0) else 0
+                QUEUE_DEPTH.set(depth)
 
         finally:
             self.socket.close()
+            if self.telemetry_socket is not None:
+                self.telemetry_socket.close(linger=0)
+
+    def handle_packet(self, identity_binary: bytes, packet: Packet) -> None:
+        start = time.perf_counter()
+        span = TRACER.start_span(
+            f"router {packet.intent.name} {packet.request}",
+            parent=packet.trace,
+            attributes=lambda: {"source": packet.source, "destination": packet.destination, "hops": packet.hops},
+        )
+        match packet.intent:
+            case PacketIntent.REGISTRATION:
+                self.handle_registration(identity_binary, packet)
+            case PacketIntent.ROUTING:
+                logger.info("Got routing packet from %s", identity_binary)
+            case _:
+                self.handle_pass_packet(identity_binary, packet)
+        TRACER.end_span(span)
+        HANDLE_SECONDS.labels(packet.intent.name).observe(time.perf_counter() - start)
 
     def handle_registration(self, identity_binary: bytes, packet: Packet) -> None:
         if packet.destination != self.name:
             self.handle_packet_error(identity_binary, f"Router {self.name} is not the destination")
             return
+        # Clients register under a new name after a timeout, nothing is routed to the old ones anymore.
+        for name in packet.replaces:
+            if self.clients.pop(name, None) is not None or self.telemetry_clients.pop(name, None) is not None:
+                logger.info("Client %s replaced by %s", name, packet.source)
         match packet.payload:
             case NetworkElementClass.PROVIDER:
                 self.providers[packet.source] = identity_binary
@@ -70,6 +138,12 @@ class Router:
             case NetworkElementClass.ROUTER:
                 self.routers[packet.source] = identity_binary
                 logger.info("Router %s registered", identity_binary)
+            case NetworkElementClass.TELEMETRY:
+                self.telemetry_clients[packet.source] = identity_binary
+                logger.info("Telemetry client %s registered", identity_binary)
+
+        if packet.telemetry is not None:
+            self.handle_telemetry(packet.telemetry)
 
         ack_packet = Packet(
             intent=PacketIntent.REGISTRATION_ACK,
@@ -77,25 +151,53 @@ class Router:
             destination=identity_binary.decode("utf-8"),
             hops=0,
             request="ACKNOWLEDGE",
-            payload=None,
+            # Clients need to know where to subscribe to telemetry and cache invalidations.
+            payload=self.telemetry_port if packet.payload != NetworkElementClass.PROVIDER else None,
         )
         self._send(identity_binary, ack_packet)
 
+    def handle_telemetry(self, snapshot: TelemetrySnapshot) -> None:
+        self.telemetry.add(snapshot)
+        if self.telemetry_socket is not None:
+            # PUB sockets never block, snapshots past the high water mark of a subscriber are dropped.
+            self.telemetry_socket.send_multipart([telemetry_topic(snapshot.provider), pickle.dumps(snapshot)])
+
+    def handle_router_request(self, identity_binary: bytes, packet: Packet) -> None:
+        """Answer the packets addressed to the router itself."""
+        match packet.request:
+            case "GET_TELEMETRY":
+                query = packet.payload if isinstance(packet.payload, dict) else {}
+                reply = Packet(
+                    intent=PacketIntent.DATA,
+                    request="TELEMETRY",
+                    source=self.name,
+                    destination=packet.source,
+                    payload=self.telemetry.query(provider=query.get("provider"), since=query.get("since")),
+                )
+                self._send(identity_binary, reply)
+            case "INVALIDATE" if isinstance(packet.payload, CacheInvalidation):
+                # Fire and forget, providers do not wait for a reply.
+                if self.telemetry_socket is not None:
+                    topic = invalidation_topic(packet.payload.provider, packet.payload.instrument)
+                    self.telemetry_socket.send_multipart([topic, pickle.dumps(packet.payload)])
+            case _:
+                self.handle_packet_error(identity_binary, f"Router {self.name} cannot handle request {packet.request}")
+
     def handle_pass_packet(self, identity_binary: bytes, packet: Packet) -> None:
         """Handle all the logic to get a packet from one place to another."""
         if packet.destination == self.name:
-            logger.info("Packet destination is self, dropping")
+            self.handle_router_request(identity_binary, packet)
 
         elif packet.destination in self.providers or packet.destination in self.clients:
-            logger.info("Packet destination is a provider called %s, routing message there", packet.destination)
             forward_packet = copy.copy(packet)
             forward_packet.hops += 1
+            # The next hop continues the trace from the span of the router, if it is tracing.
+            forward_packet.trace = TRACER.current() or packet.trace
             dest = self.providers.get(packet.destination) or self.clients.get(packet.destination)
             if dest is None:
                 self.handle_packet_error(identity_binary, f"Destination {packet.destination} not found.")
                 return
             self._send(dest, forward_packet)
-            logger.info("Sent packet to %s", packet.destination)
 
         else:
             logger.info("Packet destination is not a provider will ask other routers in system")
@@ -123,7 +225,8 @@ class Router:
             return None, None
 
         packet = pickle.loads(pickled_packet)
-        logger.info("Received packet from %s: %s", identity_binary, packet)
+        # Payloads are not logged, they are recorded in the spans of the packet when tracing is enabled.
+        logger.debug("Received %s packet from %s to %s", packet.intent.name, packet.source, packet.destination)
         return identity_binary, packet
 
     def _send(self, destination: bytes, packet: Packet) -> None:
@@ -133,14 +236,14 @@ class Router:
             logger.error(msg)
             raise RuntimeError(msg)
 
-        logger.info("Sending packet to %s | Packet: %s", packet.destination, packet)
         self.socket.send_multipart([destination, b"", pickle.dumps(packet)])
-        logger.info("Packet sent to %s", packet.destination)
+        logger.debug("Sent %s packet to %s", packet.intent.name, packet.destination)
 
     # TODO: This should reply with a standard, error in your packet message to whoever sent the packet instead of
     #  just logging.
     def handle_packet_error(self, destination: bytes, message: str) -> None:
         logger.error(message)
+        ERRORS.inc()
         error_packet = Packet(
             intent=PacketIntent.ERROR,
             request="ERROR",
@@ -0,0 +1,79 @@
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import zmq
+
+
+@dataclass(frozen=True, slots=True)
+class StateChange:
+    provider: str
+    instrument: str
+    # Observable parameter or operation that produced the value.
+    name: str
+    value: Any
+    timestamp: float  # time.time() when the provider published the value.
+
+
+def state_topic(provider: str, instrument: str | None = None, name: str | None = None) -> bytes:
+    """
+    PUB/SUB topic of the changes of `name`, of every observable of `instrument` or of every instrument of `provider`.
+
+    The terminators keep subscriptions from matching other names by prefix.
+    """
+    topic = b"state\0" + provider.encode() + b"\0"
+    if instrument is None:
+        return topic
+    topic += instrument.encode() + b"\0"
+    return topic if name is None else topic + name.encode() + b"\0"
+
+
+def encode_state_change(change: StateChange) -> list[bytes]:
+    """Multipart message of a change, everything but the value and timestamp travels in the topic."""
+    return [
+        state_topic(change.provider, change.instrument, change.name),
+        pickle.dumps((change.timestamp, change.value)),
+    ]
+
+
+def decode_state_change(message: list[bytes]) -> StateChange:
+    topic, pickled_value = message
+    _, provider, instrument, name, _ = topic.decode().split("\0")
+    timestamp, value = pickle.loads(pickled_value)
+    return StateChange(provider, instrument, name, value, timestamp)
+
+
+class StatePublisher:
+    def __init__(self, provider: str, socket: zmq.Socket[bytes]) -> None:
+        """
+        Publish the values of the observables of the instruments of a provider.
+
+        Values are only published when they change, unless forced. Equality is checked with `==`, values that cannot
+        be compared to a bool, like arrays, are always published. Instruments notify from their own threads, so
+        the socket is only used while holding a lock.
+        """
+        self.provider = provider
+        self.socket = socket
+        self._last: dict[tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, instrument: str, name: str, value: Any, *, force: bool = False) -> bool:
+        """Publish `value` and return True, or False if it did not change since the last time."""
+        key = (instrument, name)
+        with self._lock:
+            if not force and key in self._last:
+                try:
+                    unchanged = bool(self._last[key] == value)
+                except (TypeError, ValueError):
+                    unchanged = False
+                if unchanged:
+                    return False
+
+            self._last[key] = value
+            # PUB sockets never block, changes past the high water mark of a subscriber are dropped.
+            self.socket.send_multipart(
+                encode_state_change(StateChange(self.provider, instrument, name, value, time.time()))
+            )
+        return True
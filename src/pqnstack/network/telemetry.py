@@ -0,0 +1,94 @@
+import bisect
+import time
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from typing import Any
+
+# Upper bounds in milliseconds of the latency histogram buckets, a last bucket holds everything slower.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+@dataclass(slots=True)
+class InstrumentTelemetry:
+    """Cumulative statistics of the remote calls to one instrument since its provider started."""
+
+    calls: int = 0
+    errors: int = 0
+    total_s: float = 0.0
+    latency_counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    hw_status: dict[str, Any] = field(default_factory=dict)
+
+    def record(self, duration_s: float, *, error: bool) -> None:
+        self.calls += 1
+        self.errors += error
+        self.total_s += duration_s
+        self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_s * 1000)] += 1
+
+    def copy(self) -> "InstrumentTelemetry":
+        return replace(self, latency_counts=list(self.latency_counts), hw_status=dict(self.hw_status))
+
+
+@dataclass(frozen=True, slots=True)
+class TelemetrySnapshot:
+    provider: str
+    timestamp: float  # time.time() when the snapshot was taken.
+    instruments: dict[str, InstrumentTelemetry]
+
+
+class TelemetryRecorder:
+    def __init__(self) -> None:
+        """Collect the per-instrument statistics a provider piggybacks on its heartbeats."""
+        self.instruments: dict[str, InstrumentTelemetry] = {}
+
+    def record(self, instrument: str, duration_s: float, *, error: bool) -> None:
+        self.instruments.setdefault(instrument, InstrumentTelemetry()).record(duration_s, error=error)
+
+    def snapshot(self, provider: str, hw_status: dict[str, dict[str, Any]]) -> TelemetrySnapshot:
+        for name, status in hw_status.items():
+            self.instruments.setdefault(name, InstrumentTelemetry()).hw_status = status
+        return TelemetrySnapshot(
+            provider=provider,
+            timestamp=time.time(),
+            instruments={name: stats.copy() for name, stats in self.instruments.items()},
+        )
+
+
+class TelemetryStore:
+    def __init__(self, history: int = 512) -> None:
+        """
+        In-memory time series of the telemetry snapshots received by the router.
+
+        Every provider gets a ring buffer of its last `history` snapshots, so memory stays bounded no matter how long
+        the router runs.
+        """
+        self.history = history
+        self._series: dict[str, deque[TelemetrySnapshot]] = {}
+
+    def add(self, snapshot: TelemetrySnapshot) -> None:
+        self._series.setdefault(snapshot.provider, deque(maxlen=self.history)).append(snapshot)
+
+    @property
+    def providers(self) -> list[str]:
+        return list(self._series)
+
+    def latest(self, provider: str) -> TelemetrySnapshot | None:
+        series = self._series.get(provider)
+        return series[-1] if series else None
+
+    def query(self, provider: str | None = None, since: float | None = None) -> list[TelemetrySnapshot]:
+        """Snapshots of `provider` (or of every provider) taken after `since`, oldest first."""
+        series = self._series.values() if provider is None else [self._series.get(provider, deque())]
+        snapshots = [s for serie in series for s in serie if since is None or s.timestamp > since]
+        return sorted(snapshots, key=lambda s: s.timestamp)
+
+
+def telemetry_topic(provider: str | None = None) -> bytes:
+    """
+    PUB/SUB topic of the snapshots of `provider`, or of every provider if None.
+
+    The terminator keeps subscriptions from matching other names by prefix.
+    """
+    topic = b"telemetry\0"
+    return topic if provider is None else topic + provider.encode() + b"\0"
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from typing import Any
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedStatusMessage(NamedTuple):
+    """Decoded status message, with the fields of the real ones that `APTRotator` uses."""
+
+    msg: str
+    position: int
+    moving_forward: bool
+    moving_reverse: bool
+    homing: bool
+    homed: bool
+
+
+class SimulatedAPTDevice:
+    def __init__(
+        self,
+        velocity_eu_per_s: float = 172_768.0,
+        update_interval_s: float = 0.01,
+        command_latency_s: tuple[float, float] = (0.005, 0.002),
+        seed: int | None = None,
+    ) -> None:
+        """
+        Stand-in for a `thorlabs_apt_device` DC motor controller, for running rotators without hardware.
+
+        Like the real controllers in polled mode, a thread processes a status update every `update_interval_s` through
+        `_process_message`, and a `mot_move_completed` message when a move ends. Moves start after a random command
+        latency, normal with (mean, std) `command_latency_s`, and travel at a constant velocity, 90 degrees/s by
+        default.
+        """
+        self.velocity_eu_per_s = velocity_eu_per_s
+        self.update_interval_s = update_interval_s
+        self.command_latency_s = command_latency_s
+        self.jammed = False  # The motor stops turning while it is still trying to move, like a stalled stage.
+        self.status: dict[str, Any] = {
+            "position": 0,
+            "moving_forward": False,
+            "moving_reverse": False,
+            "jogging_forward": False,
+            "jogging_reverse": False,
+            "homing": False,
+            "homed": True,
+            "msg": "",
+        }
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._position = 0.0
+        self._target: float | None = None
+        self._start_at = 0.0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="simulated-apt-device", daemon=True)
+        self._thread.start()
+
+    def travel_time_s(self, distance_eu: float) -> float:
+        """Time the motor spends turning for a move of `distance_eu`, without the command latency."""
+        return abs(distance_eu) / self.velocity_eu_per_s
+
+    def move_absolute(self, position: int, now: bool = True, bay: int = 0, channel: int = 0) -> None:  # noqa: ARG002, FBT001, FBT002
+        mean, std = self.command_latency_s
+        with self._lock:
+            self._target = float(position)
+            self._start_at = time.monotonic() + max(0.0, self._rng.normal(mean, std))
+
+    def stop(self, immediate: bool = False, bay: int = 0, channel: int = 0) -> None:  # noqa: ARG002, FBT001, FBT002
+        with self._lock:
+            if self._target is not None:
+                self._target = None
+                self._emit("mot_move_stopped")
+
+    # The velocities `APTRotator` sets are not in the units of the positions, the simulated velocity is kept instead.
+    def set_home_params(self, velocity: int, offset_distance: int, **_: Any) -> None:
+        pass
+
+    def set_velocity_params(self, acceleration: int, max_velocity: int, **_: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        self._running = False
+        self._thread.join(timeout=1)
+
+    def _process_message(self, m: SimulatedStatusMessage) -> None:
+        self.status.update(m._asdict())
+
+    def _emit(self, msg: str) -> None:
+        target = self._target
+        moving = target is not None and msg != "mot_move_completed" and time.monotonic() >= self._start_at
+        self._process_message(
+            SimulatedStatusMessage(
+                msg=msg,
+                position=round(self._position),
+                moving_forward=moving and target is not None and target >= self._position,
+                moving_reverse=moving and target is not None and target < self._position,
+                homing=False,
+                homed=True,
+            )
+        )
+
+    def _step(self, dt: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._target is None or now < self._start_at or self.jammed:
+                self._emit("mot_get_dcstatusupdate")
+                return
+
+            distance = self._target - self._position
+            step = min(abs(distance), self.velocity_eu_per_s * min(dt, now - self._start_at))
+            self._position += step if distance > 0 else -step
+            if self._position == self._target:
+                self._emit("mot_move_completed")
+                self._target = None
+            else:
+                self._emit("mot_get_dcstatusupdate")
+
+    def _run(self) -> None:
+        last = time.monotonic()
+        while self._running:
+            time.sleep(self.update_interval_s)
+            now = time.monotonic()
+            try:
+                self._step(now - last)
+            except Exception:
+                logger.exception("Simulated APT device stopped")
+                return
+            last = now
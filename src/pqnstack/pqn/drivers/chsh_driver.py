@@ -13,6 +13,7 @@ from pqnstack.pqn.protocols.chsh import Devices
 from pqnstack.pqn.protocols.chsh import measure_chsh
 from pqnstack.pqn.protocols.measurement import CHSHValue
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,9 @@ class CHSHDevice(Instrument):
     motor_config: dict[str, dict[str, str]] = field(default_factory=dict)
     tagger_config: dict[str, str] = field(default_factory=dict)
     queue_length: int = field(default=0)
+    # Reuse and add up the counts of settings measured before, until they are older than measurement_max_age_s.
+    store_measurements: bool = False
+    measurement_max_age_s: float | None = None
 
     _motors: dict[str, RotatorInstrument] = field(init=False, repr=False)
     _tagger: TimeTaggerInstrument = field(init=False, repr=False)
@@ -36,6 +40,7 @@ class CHSHDevice(Instrument):
     _submissions: dict[str, bool] = field(default_factory=dict, init=False, repr=False)
     _value_gathered: dict[str, bool] = field(default_factory=dict, init=False, repr=False)
     _value: int = field(default=0, init=False, repr=False)
+    _store: MeasurementStore | None = field(default=None, init=False, repr=False)
 
     def __post_init__(self) -> None:
         self._client = Client(host="172.30.63.109", timeout=600000)
@@ -47,6 +52,9 @@ class CHSHDevice(Instrument):
             "TimeTaggerInstrument", self._client.get_device(self.tagger_config["location"], self.tagger_config["name"])
         )
         self.operations["measure_chsh"] = self.measure_chsh
+        self.operations["new_calibration_epoch"] = self.new_calibration_epoch
+        if self.store_measurements:
+            self._store = MeasurementStore(self.measurement_max_age_s)
 
     def start(self) -> None:
         logger.info("CHSHDevice started.")
@@ -81,4 +89,10 @@ class CHSHDevice(Instrument):
             basis2=basis2,
             devices=devices,
             config=config,
+            store=self._store,
         )
+
+    @log_operation
+    def new_calibration_epoch(self) -> int:
+        """Drop the stored measurements after the setup changed, like after realigning it."""
+        return 0 if self._store is None else self._store.new_epoch()
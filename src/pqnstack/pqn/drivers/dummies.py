@@ -30,6 +30,7 @@ class DummyInstrument(Instrument):
             "toggle_bool": self.toggle_bool,
             "set_half_input_int": self.set_half_input_int,
         }
+        self.observables = {"param_int", "uppercase_str"}
 
     @property
     def info(self) -> DummyInfo:
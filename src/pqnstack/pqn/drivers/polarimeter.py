@@ -1,10 +1,13 @@
 import logging
 import math
-from collections import deque
+import threading
+import time
 from dataclasses import KW_ONLY
 from dataclasses import dataclass
 from dataclasses import field
 
+import numpy as np
+import numpy.typing as npt
 from pyfirmata2 import Arduino
 
 from pqnstack.base.instrument import PolarimeterInstrument
@@ -14,37 +17,53 @@ logger = logging.getLogger(__name__)
 
 @dataclass(slots=True)
 class Buffer:
-    _buffer: deque[float]
+    """Moving window of the last `size` samples of a photodiode, keeps a running sum so its mean costs O(1)."""
+
+    size: int
     normalizing: bool = field(default=False)
     min: float = field(default=float("inf"), init=False)
     max: float = field(default=float("-inf"), init=False)
+    _values: npt.NDArray[np.float64] = field(init=False, repr=False)
+    _count: int = field(default=0, init=False, repr=False)
+    _sum: float = field(default=0.0, init=False, repr=False)
 
     def __post_init__(self) -> None:
+        self._values = np.zeros(self.size)
         self.clear()
 
     def __len__(self) -> int:
-        return len(self._buffer)
+        return min(self._count, self.size)
 
     def clear(self) -> None:
         """Clear all values in the buffer."""
-        self._buffer.clear()
+        self._count = 0
+        self._sum = 0.0
         self.min = float("inf")
         self.max = float("-inf")
 
     def append(self, value: float) -> None:
-        self._buffer.append(value)
+        i = self._count % self.size
+        if self._count >= self.size:
+            self._sum -= self._values[i]
+        self._values[i] = value
+        self._sum += value
+        self._count += 1
+        # The rounding errors of the running sum are dropped every time the window wraps around.
+        if i == self.size - 1:
+            self._sum = float(self._values.sum())
+
         if self.normalizing:
             self.min = min(self.min, value)
             self.max = max(self.max, value)
 
     def read(self) -> float:
-        if len(self._buffer) == 0:
+        if self._count == 0:
             return 0.0
 
         if self.max <= self.min:
             return 0.0
 
-        avg = sum(self._buffer) / len(self._buffer)
+        avg = self._sum / len(self)
         return (avg - self.min) / (self.max - self.min)
 
 
@@ -91,25 +110,150 @@ class PolarizationMeasurement:
         raise NotImplementedError
 
 
+def polarization_theta(
+    h: npt.ArrayLike, v: npt.ArrayLike, d: npt.ArrayLike, a: npt.ArrayLike, last_theta: float = 0.0
+) -> npt.NDArray[np.float64]:
+    """
+    Vectorized `PolarizationMeasurement.theta` of consecutive measurements.
+
+    Each angle is unwrapped to the full 0-360 range from the one before it, like reading the measurements one by one
+    starting after a measurement with angle `last_theta`.
+    """
+    h, v, d, a = (np.asarray(x, dtype=np.float64) for x in (h, v, d, a))
+    valid = (h + v != 0) & (d + a != 0)
+    ratio = np.divide(h, h + v, out=np.zeros_like(h), where=valid)
+    base = np.where(valid, np.mod(np.copysign(1.0, a - d) * np.degrees(np.arccos(np.sqrt(ratio))), 180), 0.0)
+
+    # The angle jumps to the other half of the circle when it skips a 60 degree wedge, the measurements that cannot
+    # be read reset it to 0.
+    previous = np.concatenate(([last_theta % 180], base[:-1]))
+    toggles = np.cumsum(valid & (np.abs(base // 60 - previous // 60) > 1))
+    indices = np.arange(len(base))
+    last_reset = np.maximum.accumulate(np.where(valid, -1, indices))
+    toggles_before = np.where(last_reset >= 0, toggles[last_reset], 0)
+    initial = np.where(last_reset >= 0, 0, last_theta // 180)
+    shifted = (initial + toggles - toggles_before) % 2
+    return np.where(valid, np.mod(base + 180 * shifted, 360), 0.0)
+
+
+@dataclass(frozen=True, slots=True)
+class PolarizationSamples:
+    """Samples of a polarimeter over a time window, oldest first."""
+
+    timestamps: npt.NDArray[np.float64]  # time.time() of every sample.
+    h: npt.NDArray[np.float64]
+    v: npt.NDArray[np.float64]
+    d: npt.NDArray[np.float64]
+    a: npt.NDArray[np.float64]
+    theta: npt.NDArray[np.float64]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class SampleHistory:
+    def __init__(self, capacity: int) -> None:
+        """
+        Ring buffer of the last `capacity` polarimeter samples.
+
+        Appending only stores the photodiode readings. The angles are computed in batches when samples are read,
+        each sample once, continuing the unwrapping of the previous batch.
+        """
+        self.capacity = capacity
+        # Columns: timestamp, h, v, d, a, theta.
+        self._rows = np.zeros((capacity, 6))
+        self._count = 0
+        self._theta_count = 0
+        self._last_theta = 0.0
+        # Samples are appended from the thread of the board and read from the thread of the provider.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp: float, h: float, v: float, d: float, a: float) -> None:
+        with self._lock:
+            self._rows[self._count % self.capacity, :5] = (timestamp, h, v, d, a)
+            self._count += 1
+
+    def latest(self) -> tuple[float, ...]:
+        """Last sample as (timestamp, h, v, d, a, theta)."""
+        with self._lock:
+            if self._count == 0:
+                msg = "No samples yet."
+                raise IndexError(msg)
+            self._update_theta()
+            return tuple(self._rows[(self._count - 1) % self.capacity].tolist())
+
+    def since(self, timestamp: float = float("-inf")) -> PolarizationSamples:
+        with self._lock:
+            self._update_theta()
+            rows = self._rows[self._indices(max(0, self._count - self.capacity))]
+        rows = rows[rows[:, 0] >= timestamp]
+        return PolarizationSamples(*rows.T)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._theta_count = 0
+            self._last_theta = 0.0
+
+    def _indices(self, start: int) -> npt.NDArray[np.intp]:
+        return np.arange(start, self._count) % self.capacity
+
+    def _update_theta(self) -> None:
+        start = max(self._theta_count, self._count - self.capacity)
+        if start == self._count:
+            return
+        if start != self._theta_count:
+            # The samples the unwrapping continues from were overwritten before being read.
+            self._last_theta = 0.0
+
+        indices = self._indices(start)
+        rows = self._rows[indices]
+        theta = polarization_theta(rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4], self._last_theta)
+        self._rows[indices, 5] = theta
+        self._last_theta = float(theta[-1])
+        self._theta_count = self._count
+
+
 @dataclass(slots=True)
 class ArduinoPolarimeter(PolarimeterInstrument):
+    """
+    Polarimeter reading 4 photodiodes through the analog pins of an Arduino.
+
+    Every sample of the board is kept for `history_s` seconds, `read_many` returns them as arrays. Each sample is
+    also published as the `sample` observable, (timestamp, h, v, d, a, theta), when the provider publishes state.
+    """
+
     sample_rate: int = 10
     average_width: int = 10
+    history_s: float = 60.0
     _: KW_ONLY
     board: Arduino = field(default_factory=lambda: Arduino(Arduino.AUTODETECT))
     pins: dict[str, int] = field(default_factory=lambda: dict(zip("hvda", range(4), strict=False)))
     _buffers: list[Buffer] = field(default_factory=list, init=False)
+    _history: SampleHistory = field(init=False, repr=False)
     _last_theta: float = field(default=0.0, init=False, repr=False)  # HACK: Allow reporting of full 2pi angle
 
+    def __post_init__(self) -> None:
+        PolarimeterInstrument.__post_init__(self)
+        self.operations["read"] = self.read
+        self.operations["read_many"] = self.read_many
+        self.observables.update(("read", "sample"))
+        self._history = SampleHistory(max(1, math.ceil(self.history_s * self.sample_rate)))
+
     def start(self) -> None:
         if not self.board:
             self.board = Arduino(Arduino.AUTODETECT)
         self.board.samplingOn(1000 // self.sample_rate)
         for pin in self.pins.values():
-            buffer = Buffer(deque(maxlen=self.average_width))
+            buffer = Buffer(self.average_width)
             self._buffers.append(buffer)
             self.board.analog[pin].register_callback(buffer.append)
             self.board.analog[pin].enable_reporting()
+        # The board reports the pins in order, a sample is complete when the last one reports.
+        self.board.analog[list(self.pins.values())[-1]].register_callback(self._append_last)
         logger.info("Polarimeter started")
 
     def close(self) -> None:
@@ -121,12 +265,14 @@ class ArduinoPolarimeter(PolarimeterInstrument):
         self._last_theta = 0.0
         for buffer in self._buffers:
             buffer.clear()
+        self._history.clear()
 
     def start_normalizing(self) -> None:
         self._last_theta = 0.0
         for buffer in self._buffers:
             buffer.clear()
             buffer.normalizing = True
+        self._history.clear()
 
     def stop_normalizing(self) -> None:
         for buffer in self._buffers:
@@ -137,3 +283,16 @@ class ArduinoPolarimeter(PolarimeterInstrument):
         pm = PolarizationMeasurement(*hvda, _last_theta=self._last_theta)
         self._last_theta = pm.theta
         return pm
+
+    def read_many(self, window_s: float | None = None) -> PolarizationSamples:
+        """Return the samples of the last `window_s` seconds, or every sample kept if None."""
+        return self._history.since(float("-inf") if window_s is None else time.time() - window_s)
+
+    def _append_last(self, value: float) -> None:
+        self._buffers[-1].append(value)
+        self._record_sample()
+
+    def _record_sample(self) -> None:
+        self._history.append(time.time(), *(buffer.read() for buffer in self._buffers))
+        if self.observer is not None:
+            self.notify("sample", self._history.latest())
@@ -0,0 +1,95 @@
+import math
+import threading
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+# Compensating waveplates on the idler path, in the order the photons cross them, with their retardance in waves.
+DEFAULT_COMPENSATORS = (
+    ("idler_compensator_qwp1", 0.25),
+    ("idler_compensator_hwp", 0.5),
+    ("idler_compensator_qwp2", 0.25),
+)
+
+_H = np.array([1, 0], dtype=np.complex128)
+
+
+def waveplate(degrees: float, waves: float) -> npt.NDArray[np.complex128]:
+    """Jones matrix of a waveplate of retardance `waves` with its fast axis at `degrees` from horizontal."""
+    theta = math.radians(degrees)
+    c, s = math.cos(theta), math.sin(theta)
+    rotation = np.array([[c, s], [-s, c]], dtype=np.complex128)
+    retarder = np.diag([1, np.exp(2j * math.pi * waves)])
+    return np.asarray(rotation.T @ retarder @ rotation, dtype=np.complex128)
+
+
+def random_unitary(rng: np.random.Generator) -> npt.NDArray[np.complex128]:
+    """Haar random 2 by 2 unitary, like the polarization rotation of a fiber that drifted."""
+    z = (rng.standard_normal((2, 2)) + 1j * rng.standard_normal((2, 2))) / math.sqrt(2)
+    q, r = np.linalg.qr(z)
+    return np.asarray(q * (np.diag(r) / np.abs(np.diag(r))), dtype=np.complex128)
+
+
+class SimulatedPolarizationTagger:
+    def __init__(  # noqa: PLR0913
+        self,
+        motors: Mapping[str, Any],
+        fiber: npt.NDArray[np.complex128] | None = None,
+        compensators: Sequence[tuple[str, float]] = DEFAULT_COMPENSATORS,
+        pair_rate_hz: float = 2000.0,
+        state_visibility: float = 0.98,
+        accidental_rate_hz: float = 2.0,
+        seed: int | None = None,
+    ) -> None:
+        """
+        Stand-in for a time tagger counting coincidences of polarization entangled pairs, for running without optics.
+
+        Pairs leave the source in the Phi+ Bell state mixed with white noise down to `state_visibility`. The idler
+        photon crosses a fiber that rotates its polarization by the unitary `fiber`, random by default, then the
+        `compensators`, then both photons cross the half and quarter waveplate of their measurement setting,
+        `signal_hwp`, `signal_qwp`, `idler_hwp` and `idler_qwp` of `motors`, before a polarizer passing H. Waveplates
+        missing from `motors` are left out. Counts are Poisson distributed, with `accidental_rate_hz` on top.
+        """
+        self.motors = motors
+        self.compensators = list(compensators)
+        self.pair_rate_hz = pair_rate_hz
+        self.state_visibility = state_visibility
+        self.accidental_rate_hz = accidental_rate_hz
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.fiber = random_unitary(self._rng) if fiber is None else fiber
+
+    def coincidence_rate_hz(self) -> float:
+        """Return the expected rate of coincidences at the current angles of the motors."""
+        signal = self._measurement("signal")
+        idler = self._measurement("idler")
+        for name, waves in reversed(self.compensators):
+            if name in self.motors:
+                idler = idler @ waveplate(self.motors[name].degrees, waves)
+        idler = idler @ self.fiber
+        # Phi+ as a matrix of signal by idler amplitudes, projected on H by both polarizers.
+        amplitude = _H @ signal @ (np.eye(2) / math.sqrt(2)) @ idler.T @ _H
+        probability = self.state_visibility * abs(amplitude) ** 2 + (1 - self.state_visibility) / 4
+        return float(self.pair_rate_hz * probability + self.accidental_rate_hz)
+
+    def measure_correlation(self, start_ch: int, stop_ch: int, integration_time_s: float, binwidth_ps: int) -> int:  # noqa: ARG002
+        with self._lock:
+            return int(self._rng.poisson(self.coincidence_rate_hz() * integration_time_s))
+
+    def count_singles(self, channels: list[int], integration_time_s: float) -> list[int]:
+        with self._lock:
+            return [
+                int(count) for count in self._rng.poisson(self.pair_rate_hz / 2 * integration_time_s, len(channels))
+            ]
+
+    def _measurement(self, photon: str) -> npt.NDArray[np.complex128]:
+        # Photons cross the half waveplate, then the quarter waveplate.
+        matrix = np.eye(2, dtype=np.complex128)
+        for suffix, waves in (("hwp", 0.5), ("qwp", 0.25)):
+            motor = self.motors.get(f"{photon}_{suffix}")
+            if motor is not None:
+                matrix = waveplate(motor.degrees, waves) @ matrix
+        return matrix
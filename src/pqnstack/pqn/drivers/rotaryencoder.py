@@ -1,4 +1,8 @@
 import atexit
+import logging
+import math
+import threading
+import time
 from dataclasses import dataclass
 from dataclasses import field
 from typing import Protocol
@@ -6,6 +10,10 @@ from typing import runtime_checkable
 
 import serial
 
+from pqnstack.pqn.drivers.serial_transport import SerialTransport
+
+logger = logging.getLogger(__name__)
+
 
 @runtime_checkable
 class RotaryEncoderInstrument(Protocol):
@@ -14,27 +22,66 @@ class RotaryEncoderInstrument(Protocol):
 
 @dataclass(slots=True)
 class SerialRotaryEncoder:
+    """
+    Rotary encoder that reports its angle over serial.
+
+    A background sampler asks for the angle every `sample_period_s` and keeps the latest reply, so `read` is a
+    snapshot that never touches the port and can be called from async code.
+    """
+
     label: str
     address: str
     offset_degrees: float = 0.0
-    _conn: serial.Serial = field(init=False, repr=False)
+    sample_period_s: float = 0.02
+    _transport: SerialTransport = field(init=False, repr=False)
+    _sampler: threading.Thread = field(init=False, repr=False)
+    _stop: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _first_sample: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _angle: float = field(default=0.0, init=False, repr=False)
+    _sampled_at: float = field(default=-math.inf, init=False, repr=False)  # time.monotonic() of the latest angle.
 
     def __post_init__(self) -> None:
-        self._conn = serial.Serial(self.address, baudrate=115200, timeout=1)
-        self._conn.write(b"open_channel")
-        self._conn.read(100)
-        self._conn.write(b"ready")
-        self._conn.read(100)
+        conn = serial.Serial(self.address, baudrate=115200, timeout=1)
+        conn.write(b"open_channel")
+        conn.read(100)
+        conn.write(b"ready")
+        conn.read(100)
+
+        self._transport = SerialTransport(conn)
+        self._sampler = threading.Thread(target=self._sample, name=f"{self.label}-sampler", daemon=True)
+        self._sampler.start()
+        # So the first reads already get an angle.
+        if not self._first_sample.wait(timeout=self._transport.reply_timeout_s):
+            logger.warning("No angle from %s yet, reading 0 until it replies", self.label)
 
         atexit.register(self.close)
 
     def close(self) -> None:
-        self._conn.close()
+        self._stop.set()
+        self._sampler.join(timeout=self._transport.reply_timeout_s + 1)
+        self._transport.close()
 
     def read(self) -> float:
-        self._conn.write(b"ANGLE?\n")
-        angle = self._conn.readline().decode().strip()
-        return float(angle) + self.offset_degrees
+        return self._angle + self.offset_degrees
+
+    @property
+    def sample_age_s(self) -> float:
+        """Seconds since the latest angle came from the encoder, infinite before the first one."""
+        return time.monotonic() - self._sampled_at
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self._angle = float(self._transport.ask(b"ANGLE?\n"))
+                self._sampled_at = time.monotonic()
+                self._first_sample.set()
+            except (TimeoutError, ValueError):
+                logger.warning("Could not read the angle of %s", self.label, exc_info=True)
+            except ConnectionError:
+                logger.exception("Lost the connection to %s", self.label)
+                return
+            self._stop.wait(self.sample_period_s - (time.monotonic() - start))
 
 
 @dataclass(slots=True)
@@ -4,33 +4,139 @@
 # NCSA/Illinois Computes
 
 import logging
+import math
+import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import Future
 from dataclasses import dataclass
 from dataclasses import field
+from typing import Any
 
 import serial
 from thorlabs_apt_device import KDC101
 from thorlabs_apt_device import TDC001
 
 from pqnstack.base.errors import DeviceNotStartedError
+from pqnstack.base.errors import MotionStalledError
+from pqnstack.base.errors import MotionTimeoutError
 from pqnstack.base.instrument import RotatorInfo
 from pqnstack.base.instrument import RotatorInstrument
+from pqnstack.pqn.drivers.apt_simulator import SimulatedAPTDevice
+from pqnstack.pqn.drivers.serial_transport import SerialTransport
 
 logger = logging.getLogger(__name__)
 
 
+# Messages after which `thorlabs_apt_device` has updated the status of a motor.
+APT_STATUS_MESSAGES = frozenset(
+    ("mot_get_statusupdate", "mot_get_dcstatusupdate", "mot_move_stopped", "mot_move_completed")
+)
+# The library starts homing this long after opening a device.
+APT_HOMING_DELAY_S = 1.0
+
+
+class APTMotionMonitor:
+    def __init__(self, device: Any) -> None:
+        """
+        Wake up waiters on the status updates of an APT motor controller.
+
+        `thorlabs_apt_device` has no status callbacks, so the message handler of the device is wrapped, and every status
+        message notifies a condition from the thread of the device right after it is decoded.
+        """
+        self.device = device
+        self.position = int(device.status["position"])
+        self.moving = False
+        self.homing = bool(device.status["homing"])
+        self.homed = bool(device.status["homed"])
+        self._condition = threading.Condition()
+
+        process_message = device._process_message  # noqa: SLF001
+
+        def process_and_notify(m: Any) -> None:
+            process_message(m)
+            if m.msg in APT_STATUS_MESSAGES:
+                self._update(device.status)
+
+        device._process_message = process_and_notify  # noqa: SLF001
+
+    def wait_for_position(
+        self, target: int, tolerance: int, timeout_s: float | None = None, stall_timeout_s: float | None = None
+    ) -> None:
+        """
+        Wait until the motor stops within `tolerance` encoder units of `target`.
+
+        :raises MotionStalledError: The position did not change for `stall_timeout_s` before reaching the target.
+        :raises MotionTimeoutError: The target was not reached in `timeout_s`.
+        """
+        self._wait(lambda: not self.moving and abs(self.position - target) <= tolerance, timeout_s, stall_timeout_s)
+
+    def wait_for_homing(self, timeout_s: float | None = None) -> None:
+        self._wait(lambda: self.homed and not self.homing and not self.moving, timeout_s, None)
+
+    def _update(self, status: dict[str, Any]) -> None:
+        with self._condition:
+            self.position = int(status["position"])
+            self.moving = bool(
+                status["moving_forward"]
+                or status["moving_reverse"]
+                or status["jogging_forward"]
+                or status["jogging_reverse"]
+            )
+            self.homing = bool(status["homing"])
+            self.homed = bool(status["homed"])
+            self._condition.notify_all()
+
+    def _wait(self, done: Callable[[], bool], timeout_s: float | None, stall_timeout_s: float | None) -> None:
+        now = time.monotonic()
+        deadline = math.inf if timeout_s is None else now + timeout_s
+        with self._condition:
+            last_position, last_progress = self.position, now
+            while not done():
+                if self.position != last_position:
+                    last_position, last_progress = self.position, now
+                stalled_at = math.inf if stall_timeout_s is None else last_progress + stall_timeout_s
+                if now >= deadline:
+                    msg = f"Motion did not finish in {timeout_s} s, the motor is at {self.position}"
+                    raise MotionTimeoutError(msg)
+                if now >= stalled_at:
+                    msg = f"Motor stalled at {self.position} for {stall_timeout_s} s"
+                    raise MotionStalledError(msg)
+                wake_at = min(deadline, stalled_at)
+                self._condition.wait(None if math.isinf(wake_at) else wake_at - now)
+                now = time.monotonic()
+
+
 @dataclass(slots=True)
 class APTRotator(RotatorInstrument):
+    """
+    Rotator on a Thorlabs TDC001 or KDC101 controller.
+
+    Moves finish as soon as a status update of the controller reports the motor stopped at the target, moves that do
+    not finish in `move_timeout_s` or stop making progress for `stall_timeout_s` stop the motor and raise. Completed
+    moves are recorded in the motion profile. With `simulated` a `SimulatedAPTDevice` stands in for the controller.
+    """
+
+    move_timeout_s: float = 30.0
+    stall_timeout_s: float = 1.0
+    tolerance_degrees: float = 0.05
+    simulated: bool = False
     _degrees: float = field(default=0.0, init=False)
-    _device: TDC001 | KDC101 = field(init=False, repr=False)
+    _device: TDC001 | KDC101 | SimulatedAPTDevice = field(init=False, repr=False)
+    _motion: APTMotionMonitor | None = field(default=None, init=False, repr=False)
     _encoder_units_per_degree: float = field(default=86384 / 45, init=False, repr=False)
 
     def start(self) -> None:
         # Additional setup for APT Rotator
-        try:
-            self._device = TDC001(serial_number=self.hw_address)
-        except RuntimeError:
-            self._device = KDC101(self.hw_address)
+        opened_at = time.monotonic()
+        if self.simulated:
+            self._device = SimulatedAPTDevice()
+        else:
+            try:
+                self._device = TDC001(serial_number=self.hw_address)
+            except RuntimeError:
+                self._device = KDC101(self.hw_address)
+        self._motion = APTMotionMonitor(self._device)
 
         offset_eu = round(self.offset_degrees * self._encoder_units_per_degree)
 
@@ -41,8 +147,12 @@ class APTRotator(RotatorInstrument):
 
         self._device.set_home_params(velocity=vel, offset_distance=offset_eu)
         self._device.set_velocity_params(vel, vel)
-        time.sleep(0.5)
-        self._wait_for_stop()
+        if not self.simulated:
+            time.sleep(max(0.0, opened_at + APT_HOMING_DELAY_S - time.monotonic()))
+        try:
+            self._motion.wait_for_homing(self.move_timeout_s)
+        except MotionTimeoutError:
+            logger.warning("%s did not report being homed after %s s", self.name, self.move_timeout_s)
 
     def close(self) -> None:
         if self._device is not None:
@@ -55,25 +165,34 @@ class APTRotator(RotatorInstrument):
             name=self.name,
             desc=self.desc,
             hw_address=self.hw_address,
-            hw_status=self._device.status,
+            hw_status=self.hw_status,
             degrees=self.degrees,
             offset_degrees=self.offset_degrees,
+            motion_model=self.motion.model,
         )
 
-    def _wait_for_stop(self) -> None:
-        if self._device is None:
+    @property
+    def hw_status(self) -> dict[str, Any]:
+        # The latest status message of the controller, kept up to date by its own thread.
+        return dict(self._device.status)
+
+    def _wait_for_stop(self, degrees: float) -> None:
+        if self._motion is None:
             msg = "Start the device before setting parameters"
             raise DeviceNotStartedError(msg)
 
         try:
-            time.sleep(0.5)
-            while (
-                self._device.status["moving_forward"]
-                or self._device.status["moving_reverse"]
-                or self._device.status["jogging_forward"]
-                or self._device.status["jogging_reverse"]
-            ):
-                time.sleep(0.1)
+            self._motion.wait_for_position(
+                int(degrees * self._encoder_units_per_degree),
+                math.ceil(self.tolerance_degrees * self._encoder_units_per_degree),
+                self.move_timeout_s,
+                self.stall_timeout_s,
+            )
+        except (MotionTimeoutError, MotionStalledError):
+            self._device.stop()
+            # The motor stopped short of the target, the absolute position is where it actually is.
+            self._degrees = self._motion.position / self._encoder_units_per_degree
+            raise
         except KeyboardInterrupt:
             self._device.stop(immediate=True)
 
@@ -83,8 +202,10 @@ class APTRotator(RotatorInstrument):
 
     @degrees.setter
     def degrees(self, degrees: float) -> None:
+        start_degrees, start = self._degrees, time.perf_counter()
         self._set_degrees_unsafe(degrees)
-        self._wait_for_stop()
+        self._wait_for_stop(degrees)
+        self.motion.record(start_degrees, degrees, time.perf_counter() - start)
 
     def _set_degrees_unsafe(self, degrees: float) -> None:
         self._degrees = degrees
@@ -93,21 +214,25 @@ class APTRotator(RotatorInstrument):
 
 @dataclass(slots=True)
 class SerialRotator(RotatorInstrument):
+    """Rotator driven over serial, the board replies with a line once a move is done."""
+
+    move_timeout_s: float = 1.0
     _degrees: float = 0.0  # The hardware doesn't support position tracking
-    _conn: serial.Serial = field(init=False, repr=False)
+    _transport: SerialTransport = field(init=False, repr=False)
 
     def start(self) -> None:
-        self._conn = serial.Serial(self.hw_address, baudrate=115200, timeout=1)
-        self._conn.write(b"open_channel")
-        self._conn.read(100)
-        self._conn.write(b"motor_ready")
-        self._conn.read(100)
+        conn = serial.Serial(self.hw_address, baudrate=115200, timeout=1)
+        conn.write(b"open_channel")
+        conn.read(100)
+        conn.write(b"motor_ready")
+        conn.read(100)
+        self._transport = SerialTransport(conn, reply_timeout_s=self.move_timeout_s)
 
         self.degrees = self.offset_degrees
 
     def close(self) -> None:
         self.degrees = 0
-        self._conn.close()
+        self._transport.close()
 
     @property
     def info(self) -> RotatorInfo:
@@ -118,6 +243,7 @@ class SerialRotator(RotatorInstrument):
             # hw_status=,
             degrees=self.degrees,
             offset_degrees=self.offset_degrees,
+            motion_model=self.motion.model,
         )
 
     @property
@@ -126,6 +252,16 @@ class SerialRotator(RotatorInstrument):
 
     @degrees.setter
     def degrees(self, degrees: float) -> None:
-        self._conn.write(f"SRA {degrees}".encode())
+        start_degrees, start = self._degrees, time.perf_counter()
+        try:
+            self.start_move(degrees).result()
+        except TimeoutError:
+            # The board does not always confirm moves, the position is assumed to be reached anyway.
+            logger.warning("%s did not confirm the move to %s degrees", self.name, degrees)
+        else:
+            self.motion.record(start_degrees, degrees, time.perf_counter() - start)
+
+    def start_move(self, degrees: float) -> Future[str]:
+        """Send a move and return right away, the future completes when the board confirms it."""
         self._degrees = degrees
-        _ = self._conn.readline().decode()
+        return self._transport.request(f"SRA {degrees}".encode())
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class SerialConnection(Protocol):
+    """The part of `serial.Serial` the transport uses, `readline` must return b"" when its timeout expires."""
+
+    def write(self, data: bytes, /) -> int | None: ...
+    def readline(self) -> bytes: ...
+    def close(self) -> None: ...
+
+
+class SerialTransport:
+    def __init__(
+        self,
+        connection: SerialConnection,
+        reply_timeout_s: float = 1.0,
+        on_unsolicited: Callable[[str], None] | None = None,
+    ) -> None:
+        """
+        Line based request/reply over a serial connection, read by a background thread.
+
+        Requests are pipelined: `request` writes the command and returns a future right away, and the reader thread
+        resolves the futures in the order the commands were written, since the devices answer every command with one
+        line in order. Callers never block on the port, async code can await `asyncio.wrap_future(...)`.
+
+        :param connection: Opened connection, its read timeout is how often the reader checks for late requests.
+        :param reply_timeout_s: Requests still without a reply after this long fail with a TimeoutError once the
+         line goes quiet.
+        :param on_unsolicited: Called from the reader thread with lines that arrive when no request is waiting.
+        """
+        self.connection = connection
+        self.reply_timeout_s = reply_timeout_s
+        self.on_unsolicited = on_unsolicited
+
+        self._pending: deque[tuple[float, Future[str]]] = deque()
+        # Keeps the order of the pending requests the same as the order of the commands on the wire.
+        self._write_lock = threading.Lock()
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, name="serial-transport-reader", daemon=True)
+        self._reader.start()
+
+    def request(self, command: bytes) -> Future[str]:
+        """Write `command` and return a future of its reply line, without the line terminator."""
+        future: Future[str] = Future()
+        with self._write_lock:
+            if not self._running:
+                msg = "Serial transport is closed."
+                raise RuntimeError(msg)
+            self._pending.append((time.monotonic() + self.reply_timeout_s, future))
+            self.connection.write(command)
+        return future
+
+    def ask(self, command: bytes, timeout_s: float | None = None) -> str:
+        """Write `command` and wait for its reply, up to the reply timeout of the transport by default."""
+        return self.request(command).result(timeout=timeout_s)
+
+    def send(self, command: bytes) -> None:
+        """Write a command the device does not reply to."""
+        with self._write_lock:
+            self.connection.write(command)
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._running = False
+        self._reader.join(timeout=self.reply_timeout_s + 1)
+        self.connection.close()
+        self._fail_pending("Serial transport closed before the reply arrived.")
+
+    def _read_loop(self) -> None:
+        while self._running:
+            try:
+                line = self.connection.readline()
+            except Exception:
+                logger.exception("Serial transport stopped reading")
+                with self._write_lock:
+                    self._running = False
+                self._fail_pending("Serial transport stopped reading.")
+                break
+
+            if not line:
+                # Only a quiet line expires requests, a late reply still goes to the request it answers.
+                self._expire(time.monotonic())
+                continue
+
+            reply = line.decode(errors="replace").strip()
+            if self._pending:
+                _, future = self._pending.popleft()
+                if not future.cancelled():
+                    future.set_result(reply)
+            elif self.on_unsolicited is not None:
+                self.on_unsolicited(reply)
+            else:
+                logger.debug("Dropped serial line with no request waiting: %s", reply)
+
+    def _expire(self, now: float) -> None:
+        while self._pending and self._pending[0][0] < now:
+            _, future = self._pending.popleft()
+            if not future.cancelled():
+                future.set_exception(TimeoutError("No reply from the serial device."))
+
+    def _fail_pending(self, message: str) -> None:
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.cancelled():
+                future.set_exception(ConnectionError(message))
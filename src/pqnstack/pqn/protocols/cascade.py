@@ -0,0 +1,210 @@
+import math
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Generator
+from dataclasses import dataclass
+from typing import cast
+
+import numpy as np
+import numpy.typing as npt
+
+from pqnstack.pqn.protocols.rng import Bits
+
+Indices = npt.NDArray[np.intp]
+
+
+@dataclass(frozen=True, slots=True)
+class ParityQuery:
+    """Parities of the ranges `[starts[i], stops[i])` of the key shuffled with the permutation of `pass_index`."""
+
+    pass_index: int
+    starts: Indices
+    stops: Indices
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+@dataclass(frozen=True, slots=True)
+class CascadeResult:
+    key: Bits
+    corrected_bits: int
+    leaked_bits: int  # Parities disclosed to the peer, to be removed by privacy amplification.
+    rounds: int  # Parity exchanges with the peer.
+    converged: bool  # False if the round budget ran out before every block was even.
+
+
+def pass_permutation(n_bits: int, seed: int, pass_index: int) -> Indices:
+    """Shuffle of the key for a Cascade pass. The first pass keeps the key order, both nodes derive the rest from `seed`."""
+    if pass_index == 0:
+        return np.arange(n_bits)
+    return np.random.default_rng([seed, pass_index]).permutation(n_bits)
+
+
+def _prefix_parities(bits: Bits) -> Bits:
+    """`out[i]` is the parity of `bits[:i]`, so the parity of `bits[a:b]` is `out[a] ^ out[b]`."""
+    out = np.zeros(len(bits) + 1, dtype=np.uint8)
+    np.bitwise_xor.accumulate(bits, out=out[1:])
+    return out
+
+
+class CascadeResponder:
+    def __init__(self, key: Bits, seed: int) -> None:
+        """
+        Follower side of Cascade, answering parity queries about its key, which is the reference both keys converge to.
+
+        :param key: Sifted key without the bits disclosed for QBER estimation.
+        :param seed: Seed shared with the leader for the permutation of every pass.
+        """
+        self.key = key
+        self.seed = seed
+        self._prefix: dict[int, Bits] = {}
+
+    def parities(self, query: ParityQuery) -> Bits:
+        prefix = self._prefix.get(query.pass_index)
+        if prefix is None:
+            perm = pass_permutation(len(self.key), self.seed, query.pass_index)
+            prefix = self._prefix[query.pass_index] = _prefix_parities(self.key[perm])
+        out: Bits = prefix[query.stops] ^ prefix[query.starts]
+        return out
+
+
+@dataclass(slots=True)
+class _Pass:
+    index: int
+    perm: Indices
+    inverse: Indices
+    block_size: int
+    odd: npt.NDArray[np.bool_]  # Blocks whose parity differs from the peer's.
+
+
+class CascadeReconciler:
+    def __init__(self, key: Bits, qber: float, seed: int, n_passes: int = 4, max_rounds: int = 500) -> None:
+        """
+        Leader side of Cascade, correcting its key towards the follower's one.
+
+        Blocks of the first pass hold about 0.73 / qber bits and double in size every pass. Instead of one round trip
+        per parity, every exchange asks for the parities of all the blocks of a new pass, or for one bisection step of
+        all the odd blocks of a pass at once, so a pass costs about log2 of its block size rounds. Correcting a bit
+        makes the blocks of other passes containing it odd, these are bisected in turn until every block is even.
+
+        :param key: Sifted key without the bits disclosed for QBER estimation.
+        :param qber: Estimated QBER, sets the initial block size.
+        :param seed: Seed shared with the follower for the permutation of every pass.
+        :param n_passes: Number of Cascade passes.
+        :param max_rounds: Maximum number of parity exchanges, the result is marked as not converged if it runs out.
+        """
+        self.key = key.copy()
+        self.qber = qber
+        self.seed = seed
+        self.n_passes = n_passes
+        self.max_rounds = max_rounds
+
+        n_bits = len(key)
+        self.initial_block_size = n_bits if qber <= 0 else max(1, min(n_bits, math.ceil(0.73 / qber)))
+
+        self._rounds = 0
+        self._leaked_bits = 0
+        self._corrected_bits = 0
+
+    def run(self, ask: Callable[[ParityQuery], Bits]) -> CascadeResult:
+        """Reconcile the key, calling `ask` to get the follower's answer to every query."""
+        protocol = self._protocol()
+        try:
+            query = next(protocol)
+            while True:
+                query = protocol.send(ask(query))
+        except StopIteration as done:
+            return cast("CascadeResult", done.value)
+
+    async def run_async(self, ask: Callable[[ParityQuery], Awaitable[Bits]]) -> CascadeResult:
+        """Like `run`, for an `ask` that talks to the follower over the network."""
+        protocol = self._protocol()
+        try:
+            query = next(protocol)
+            while True:
+                query = protocol.send(await ask(query))
+        except StopIteration as done:
+            return cast("CascadeResult", done.value)
+
+    def _result(self, *, converged: bool) -> CascadeResult:
+        return CascadeResult(
+            key=self.key,
+            corrected_bits=self._corrected_bits,
+            leaked_bits=self._leaked_bits,
+            rounds=self._rounds,
+            converged=converged,
+        )
+
+    def _ask(self, query: ParityQuery) -> Generator[ParityQuery, Bits, Bits]:
+        answer = yield query
+        self._rounds += 1
+        self._leaked_bits += len(query)
+        return answer
+
+    def _protocol(self) -> Generator[ParityQuery, Bits, CascadeResult]:
+        n_bits = len(self.key)
+        passes: list[_Pass] = []
+        for pass_index in range(self.n_passes):
+            block_size = min(self.initial_block_size << pass_index, n_bits)
+            if n_bits == 0 or (passes and passes[-1].block_size == n_bits):
+                break  # Another single block pass would only disclose the parity of the whole key again.
+            if self._rounds >= self.max_rounds:
+                return self._result(converged=False)
+
+            perm = pass_permutation(n_bits, self.seed, pass_index)
+            starts = np.arange(0, n_bits, block_size)
+            stops = np.minimum(starts + block_size, n_bits)
+            peer = yield from self._ask(ParityQuery(pass_index, starts, stops))
+
+            own = _prefix_parities(self.key[perm])
+            odd = (own[stops] ^ own[starts]) != peer
+            passes.append(_Pass(pass_index, perm, np.argsort(perm), block_size, odd))
+
+            # Bisect the earliest pass with odd blocks first, its blocks are the smallest ones.
+            while (current := next((p for p in passes if p.odd.any()), None)) is not None:
+                flipped = yield from self._bisect(current)
+                if flipped is None:
+                    return self._result(converged=False)
+
+                self.key[flipped] ^= 1
+                self._corrected_bits += len(flipped)
+                for p in passes:
+                    np.logical_xor.at(p.odd, p.inverse[flipped] // p.block_size, True)  # noqa: FBT003
+
+        return self._result(converged=True)
+
+    def _bisect(self, p: _Pass) -> Generator[ParityQuery, Bits, Indices | None]:
+        """Locate one error in every odd block of `p`, returns the key positions to flip or None if out of rounds."""
+        n_bits = len(self.key)
+        starts = np.flatnonzero(p.odd) * p.block_size
+        stops = np.minimum(starts + p.block_size, n_bits)
+        own = _prefix_parities(self.key[p.perm])
+
+        while (active := stops - starts > 1).any():
+            if self._rounds >= self.max_rounds:
+                return None
+
+            s, e = starts[active], stops[active]
+            mids = (s + e) // 2
+            peer_left = yield from self._ask(ParityQuery(p.index, s, mids))
+
+            # The error is in the left half if its parities differ, otherwise the right half is the odd one.
+            go_left = (own[mids] ^ own[s]) != peer_left
+            starts[active] = np.where(go_left, s, mids)
+            stops[active] = np.where(go_left, mids, e)
+
+        flipped: Indices = p.perm[starts]
+        return flipped
+
+
+def cascade_corrector(
+    ask: Callable[[ParityQuery], Bits], seed: int, n_passes: int = 4, max_rounds: int = 500
+) -> Callable[[Bits, float], tuple[Bits, int]]:
+    """Cascade as an `ErrorCorrector` hook for `pqnstack.pqn.protocols.qkd.distill_key`."""
+
+    def correct(key: Bits, qber: float) -> tuple[Bits, int]:
+        result = CascadeReconciler(key, qber, seed, n_passes, max_rounds).run(ask)
+        return result.key, result.leaked_bits
+
+    return correct
@@ -1,13 +1,23 @@
 import datetime
 import math
+from collections.abc import Collection
 from dataclasses import dataclass
-from time import sleep
+from pathlib import Path
 
 from pqnstack.base.instrument import RotatorInstrument
 from pqnstack.base.instrument import TimeTaggerInstrument
 from pqnstack.pqn.protocols.measurement import CHSHValue
 from pqnstack.pqn.protocols.measurement import ExpectationValue
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.measurement_store import StoredCounts
+from pqnstack.pqn.protocols.measurement_store import count_rates
+from pqnstack.pqn.protocols.statistics import calculate_chsh_error
+from pqnstack.pqn.protocols.statistics import rate_expectation_value
+from pqnstack.pqn.protocols.sweep import Sweep
+from pqnstack.pqn.protocols.sweep import SweepCheckpoint
+from pqnstack.pqn.protocols.sweep import SweepSetting
+from pqnstack.pqn.protocols.sweep import stored_counts
 
 
 @dataclass
@@ -19,53 +29,35 @@ class Devices:
     timetagger: TimeTaggerInstrument
 
 
-def calculate_chsh_expectation_error(counts: list[int], dark_count: int = 0) -> float:
-    total_counts = sum(counts)
-    corrected_total = total_counts - 4 * dark_count
-    if corrected_total <= 0:
-        return 0
-    first_term = math.sqrt(total_counts) / corrected_total
-    expectation = abs(counts[0] + counts[3] - counts[1] - counts[2])
-    second_term = (expectation / corrected_total**2) * math.sqrt(total_counts + 4 * dark_count)
-    return first_term + second_term
-
-
-def calculate_chsh_error(error_values: list[float]) -> float:
-    return math.sqrt(sum(x**2 for x in error_values))
-
-
 def basis_to_wp(basis: float) -> list[float]:
     return [basis / 2, 0.0]  # TODO: Make input a complex number and have the quarter waveplate angle calculated from it
 
 
-def measure_expectation_value(
-    devices: Devices, config: MeasurementConfig, base1: float, base2: float
+def measure_expectation_value(  # noqa: PLR0913
+    devices: Devices,
+    config: MeasurementConfig,
+    base1: float,
+    base2: float,
+    store: MeasurementStore | None = None,
+    checkpoint: SweepCheckpoint | None = None,
 ) -> ExpectationValue:
-    idler_wp_angles = basis_to_wp(base1)
-    signal_wp_angles = basis_to_wp(base2)
-
-    angles_idler = [idler_wp_angles, [idler_wp_angles[0] + 45, idler_wp_angles[1]]]
-    angles_signal = [signal_wp_angles, [signal_wp_angles[0] + 45, signal_wp_angles[1]]]
-
-    coincidence_counts = []
-    for angle_idler in angles_idler:
-        for angle_signal in angles_signal:
-            devices.idler_hwp.move_to(angle_idler[0])
-            devices.signal_hwp.move_to(angle_signal[0])
-            if devices.idler_qwp is not None:
-                devices.idler_qwp.move_to(angle_idler[1])
-            if devices.signal_qwp is not None:
-                devices.signal_qwp.move_to(angle_signal[1])
-            sleep(2)
-            counts = devices.timetagger.measure_correlation(
-                config.channel1, config.channel2, int(config.integration_time_s), int(config.binwidth_ps)
-            )
-            coincidence_counts.append(counts)
-
-    numerator = coincidence_counts[0] - coincidence_counts[1] - coincidence_counts[2] + coincidence_counts[3]
-    denominator = sum(coincidence_counts) - 4 * config.dark_count
-    expectation_val = 0 if denominator == 0 else numerator / denominator
-    expectation_error = calculate_chsh_expectation_error(coincidence_counts, config.dark_count)
+    """
+    Measure the coincidences of the 4 settings of an expectation value.
+
+    With a `store`, settings it already holds are not measured again and the motors are not moved for them. The
+    value is computed from the count rate of every setting, so settings integrated for different times combine. With
+    `config.target_error` the settings are integrated until the error of the expectation value reaches it. With a
+    `checkpoint` the integrations are recorded as they end and the ones it already holds are not measured again.
+    """
+    store = MeasurementStore() if store is None else store
+    angles_idler, angles_signal = _waveplate_angles(base1, base2)
+    motors = _motors(devices)
+    settings = expectation_settings(base1, base2, motors)
+
+    sweep = Sweep(motors, devices.timetagger, config, store, checkpoint=checkpoint)
+    results = stored_counts(sweep.run(settings, lambda results: _expectation_error(results, config)))
+    rates, variances = count_rates(results)
+    expectation_val, expectation_error = rate_expectation_value(rates, variances, _dark_rate(config))
 
     return ExpectationValue(
         timestamp=datetime.datetime.now(datetime.UTC).isoformat(),
@@ -73,20 +65,85 @@ def measure_expectation_value(
         input_base2=base2,
         idler_wp_angles=angles_idler,
         signal_wp_angles=angles_signal,
-        raw_counts=coincidence_counts,
+        raw_counts=[result.counts for result in results],
         error=expectation_error,
         value=expectation_val,
+        integration_times_s=[result.integration_time_s for result in results],
     )
 
 
-def measure_chsh(basis1: list[float], basis2: list[float], devices: Devices, config: MeasurementConfig) -> CHSHValue:
+def expectation_settings(base1: float, base2: float, motors: Collection[str]) -> list[SweepSetting]:
+    """Build the settings of the 4 coincidence measurements of an expectation value, for the waveplates in `motors`."""
+    angles_idler, angles_signal = _waveplate_angles(base1, base2)
+    settings = []
+    for angle_idler in angles_idler:
+        for angle_signal in angles_signal:
+            setting = {"idler_hwp": angle_idler[0], "signal_hwp": angle_signal[0]}
+            if "idler_qwp" in motors:
+                setting["idler_qwp"] = angle_idler[1]
+            if "signal_qwp" in motors:
+                setting["signal_qwp"] = angle_signal[1]
+            settings.append(SweepSetting(setting))
+    return settings
+
+
+def _waveplate_angles(base1: float, base2: float) -> tuple[list[list[float]], list[list[float]]]:
+    """Half and quarter waveplate angles of the idler and signal settings, the base and its orthogonal each."""
+    idler_wp_angles = basis_to_wp(base1)
+    signal_wp_angles = basis_to_wp(base2)
+    angles_idler = [idler_wp_angles, [idler_wp_angles[0] + 45, idler_wp_angles[1]]]
+    angles_signal = [signal_wp_angles, [signal_wp_angles[0] + 45, signal_wp_angles[1]]]
+    return angles_idler, angles_signal
+
+
+def _expectation_error(results: list[StoredCounts], config: MeasurementConfig) -> float:
+    """Error of the expectation value of `results`, infinite while there are no counts above the dark counts."""
+    rates, variances = count_rates(results)
+    if sum(rates) - 4 * _dark_rate(config) <= 0:
+        return math.inf
+    return rate_expectation_value(rates, variances, _dark_rate(config))[1]
+
+
+def _dark_rate(config: MeasurementConfig) -> float:
+    # `config.dark_count` is given per integration time.
+    return config.dark_count / config.integration_time_s
+
+
+def _motors(devices: Devices) -> dict[str, RotatorInstrument]:
+    motors = {"idler_hwp": devices.idler_hwp, "signal_hwp": devices.signal_hwp}
+    if devices.idler_qwp is not None:
+        motors["idler_qwp"] = devices.idler_qwp
+    if devices.signal_qwp is not None:
+        motors["signal_qwp"] = devices.signal_qwp
+    return motors
+
+
+def measure_chsh(  # noqa: PLR0913
+    basis1: list[float],
+    basis2: list[float],
+    devices: Devices,
+    config: MeasurementConfig,
+    store: MeasurementStore | None = None,
+    checkpoint: SweepCheckpoint | str | Path | None = None,
+) -> CHSHValue:
+    """
+    Measure the CHSH value of the bases, with `config.target_error` the error it aims for is the CHSH error.
+
+    With a `checkpoint` a run that failed picks up from the integrations it recorded when run again.
+    """
+    store = MeasurementStore() if store is None else store
+    if isinstance(checkpoint, str | Path):
+        checkpoint = SweepCheckpoint(checkpoint)
     expectation_values = []
     expectation_errors = []
     raw_results = []
 
+    if config.target_error is not None:
+        # The errors of the expectation values add up in quadrature.
+        config = config.model_copy(update={"target_error": config.target_error / math.sqrt(len(basis1) * len(basis2))})
     for base1 in basis1:
         for base2 in basis2:
-            raw = measure_expectation_value(devices, config, base1, base2)
+            raw = measure_expectation_value(devices, config, base1, base2, store, checkpoint)
             expectation_values.append(raw.value)
             expectation_errors.append(raw.error)
             raw_results.append(raw)
@@ -101,4 +158,5 @@ def measure_chsh(basis1: list[float], basis2: list[float], devices: Devices, con
         basis2=basis2,
         chsh_value=chsh_value,
         chsh_error=chsh_error,
+        integration_time_s=sum(sum(raw.integration_times_s) for raw in raw_results),
     )
@@ -0,0 +1,371 @@
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Collection
+from collections.abc import Mapping
+from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy as np
+import numpy.typing as npt
+
+from pqnstack.base.instrument import RotatorInstrument
+from pqnstack.base.instrument import TimeTaggerInstrument
+from pqnstack.constants import DA_BASIS
+from pqnstack.constants import HV_BASIS
+from pqnstack.constants import MeasurementBasis
+from pqnstack.pqn.protocols.chsh import expectation_settings
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.measurement_store import StoredCounts
+from pqnstack.pqn.protocols.measurement_store import count_rates
+from pqnstack.pqn.protocols.statistics import calculate_chsh_error
+from pqnstack.pqn.protocols.statistics import rate_expectation_value
+from pqnstack.pqn.protocols.statistics import rate_visibility
+from pqnstack.pqn.protocols.sweep import SETTLE_S
+from pqnstack.pqn.protocols.sweep import Sweep
+from pqnstack.pqn.protocols.sweep import SweepSetting
+from pqnstack.pqn.protocols.sweep import basis_settings
+from pqnstack.pqn.protocols.sweep import stored_counts
+
+logger = logging.getLogger(__name__)
+
+# Period of the response of a waveplate, when the motor does not give one.
+WAVEPLATE_PERIOD_DEGREES = 180.0
+# Speed assumed for motors that did not record enough moves to fit a motion model, the one of the APT rotators.
+DEFAULT_VELOCITY_DPS = 90.0
+# Angles the fitted response of a waveplate is evaluated at over a period, to find its maximum.
+_FIT_RESOLUTION = 720
+
+
+@dataclass(frozen=True, slots=True)
+class CompensationObjective:
+    """What the compensation maximizes: a value and its error computed from the counts of measurement settings."""
+
+    name: str
+    settings: list[SweepSetting]  # Of the measurement waveplates, measured at every angle of the compensators.
+    evaluate: Callable[[list[StoredCounts]], tuple[float, float]]
+
+
+@dataclass(frozen=True, slots=True)
+class CompensationStep:
+    """One evaluation of the objective, at the angles of the compensators."""
+
+    angles: dict[str, float]
+    value: float
+    error: float
+    integration_time_s: float  # Added up over the settings of the objective, stored counts included.
+    elapsed_s: float  # Since the compensation started.
+
+
+@dataclass(frozen=True, slots=True)
+class CompensationResult:
+    angles: dict[str, float]  # Of the best evaluation, where the compensators are left.
+    value: float
+    error: float
+    evaluations: int
+    elapsed_s: float
+    history: list[CompensationStep] = field(default_factory=list)
+
+
+def visibility_objective(
+    motors: Collection[str], bases: Sequence[MeasurementBasis] = (HV_BASIS, DA_BASIS)
+) -> CompensationObjective:
+    """
+    Build an objective maximizing the mean visibility of `bases`.
+
+    Aligning the polarization of the photons takes visibilities in two mutually unbiased bases, HV and DA by default.
+    The measurement settings use the waveplates of `basis_settings` among `motors`.
+    """
+    settings = [setting for basis in bases for setting in basis_settings(basis, motors)]
+    sizes = [len(basis.pairs) for basis in bases]
+
+    def evaluate(results: list[StoredCounts]) -> tuple[float, float]:
+        rates, variances = count_rates(results)
+        values, errors = [], []
+        start = 0
+        for size in sizes:
+            basis_rates, basis_variances = rates[start : start + size], variances[start : start + size]
+            start += size
+            if max(basis_rates) == 0:
+                return 0.0, math.inf
+            visibility, error = rate_visibility(basis_rates, basis_variances)
+            values.append(visibility)
+            errors.append(error)
+        return sum(values) / len(values), math.sqrt(sum(error**2 for error in errors)) / len(errors)
+
+    return CompensationObjective(name="visibility", settings=settings, evaluate=evaluate)
+
+
+def chsh_objective(
+    motors: Collection[str], basis1: Sequence[float], basis2: Sequence[float], dark_rate_hz: float = 0
+) -> CompensationObjective:
+    """
+    Build an objective maximizing the magnitude of the CHSH value of the bases, measured like `measure_chsh` does.
+
+    :param dark_rate_hz: Dark counts per second of every setting, subtracted like `MeasurementConfig.dark_count`.
+    """
+    settings = [
+        setting for base1 in basis1 for base2 in basis2 for setting in expectation_settings(base1, base2, motors)
+    ]
+
+    def evaluate(results: list[StoredCounts]) -> tuple[float, float]:
+        rates, variances = count_rates(results)
+        if sum(rates) == 0:
+            return 0.0, math.inf
+        expectations = [
+            rate_expectation_value(rates[start : start + 4], variances[start : start + 4], dark_rate_hz)
+            for start in range(0, len(rates), 4)
+        ]
+        value = abs(-expectations[0][0] + expectations[1][0] + expectations[2][0] + expectations[3][0])
+        return value, calculate_chsh_error([error for _, error in expectations])
+
+    return CompensationObjective(name="chsh", settings=settings, evaluate=evaluate)
+
+
+class PolarizationCompensator:
+    def __init__(  # noqa: PLR0913
+        self,
+        motors: Mapping[str, RotatorInstrument],
+        tagger: TimeTaggerInstrument,
+        config: MeasurementConfig,
+        compensators: Sequence[str],
+        objective: CompensationObjective,
+        store: MeasurementStore | None = None,
+        settle_s: float = SETTLE_S,
+    ) -> None:
+        """
+        Turn the `compensators` waveplates to maximize `objective`, measured with the other waveplates of `motors`.
+
+        The search starts one compensator at a time: the counts of every setting vary with the angle of a single
+        waveplate as a sum of two harmonics of its period, so a few angles over the period locate its maximum. The
+        compensators are coupled though, and from there a Nelder-Mead simplex over all of them climbs to the optimum.
+        Both take a few dozen evaluations where a grid scan over all compensators takes thousands.
+
+        Evaluations are short while the values compared are far apart: they integrate until the error of the objective
+        is a quarter of the spread of the simplex, down to `config.target_error`, and the best angles are integrated
+        further as it shrinks. Settings are kept in a `MeasurementStore`, so angles measured before are integrated
+        further instead of measured again. Moves are weighed against what they can gain: a fitted maximum within the
+        error of the best measured angle is not moved to, and the points of a shrinking simplex are visited in the order
+        the motion models of the motors say is quickest.
+        """
+        self.motors = motors
+        self.config = config
+        self.compensators = list(compensators)
+        self.objective = objective
+        self.store = MeasurementStore() if store is None else store
+        self.sweep = Sweep(motors, tagger, config, self.store, settle_s=settle_s)
+
+    def run(  # noqa: PLR0913
+        self,
+        start: Mapping[str, float] | None = None,
+        points: int = 7,
+        start_error: float | None = None,
+        tolerance_degrees: float = 0.5,
+        max_evaluations: int = 150,
+        progress: Callable[[CompensationStep], None] | None = None,
+        stop: threading.Event | None = None,
+    ) -> CompensationResult:
+        """
+        Search the compensator angles from `start`, their current angles by default, and leave them at the best.
+
+        :param points: Angles each compensator is measured at over its period, at least 5 to fit the harmonics of a
+            quarter waveplate.
+        :param start_error: Error the first evaluations integrate to, 4 times `config.target_error` by default.
+        :param tolerance_degrees: The search ends once the simplex is smaller.
+        :param stop: Set to stop the search after the evaluation in progress, the best angles so far are returned.
+        """
+        if points < 5:  # noqa: PLR2004
+            msg = f"Fitting the response of a waveplate takes at least 5 points, got {points}"
+            raise ValueError(msg)
+        angles = {motor: float(self.motors[motor].degrees) for motor in self.compensators}
+        angles.update(start or {})
+        final_error = self.config.target_error
+        coarse_error = None if final_error is None else start_error or 4 * final_error
+        history: list[CompensationStep] = []
+        started = time.perf_counter()
+
+        def evaluate(candidate: Mapping[str, float], target_error: float | None = coarse_error) -> CompensationStep:
+            step = self._evaluate(candidate, target_error, started)
+            history.append(step)
+            if progress is not None:
+                progress(step)
+            return step
+
+        def done() -> bool:
+            return len(history) >= max_evaluations or (stop is not None and stop.is_set())
+
+        best = evaluate(angles)
+        for motor in self.compensators:
+            if done():
+                break
+            best = self._scan(motor, best, points, evaluate, done)
+        logger.info("Compensation scan: %s %.4f +- %.4f", self.objective.name, best.value, best.error)
+        edge = min(self._period(motor) for motor in self.compensators) / points
+        while not done():
+            # A simplex can collapse on a ridge it cannot tell from noise, start it afresh until that stops paying.
+            climbed = self._simplex(best, edge, tolerance_degrees, coarse_error, evaluate, done)
+            logger.info("Compensation simplex: %s %.4f +- %.4f", self.objective.name, climbed.value, climbed.error)
+            gained = climbed.value - best.value > climbed.error
+            best = max(best, climbed, key=lambda step: step.value)
+            if not gained:
+                break
+
+        self._move_to(best.angles)
+        return CompensationResult(
+            angles=best.angles,
+            value=best.value,
+            error=best.error,
+            evaluations=len(history),
+            elapsed_s=time.perf_counter() - started,
+            history=history,
+        )
+
+    def _scan(
+        self,
+        motor: str,
+        best: CompensationStep,
+        points: int,
+        evaluate: Callable[[Mapping[str, float]], CompensationStep],
+        done: Callable[[], bool],
+    ) -> CompensationStep:
+        """Measure `motor` over its period, fit the harmonics of the values and evaluate at their maximum."""
+        period = self._period(motor)
+        center = best.angles[motor]
+        steps = [best]
+        # Spread around the current angle and visited in one pass, the motor turns a period at most.
+        for k in range(-(points // 2), points - points // 2):
+            if done():
+                return max(steps, key=lambda step: step.value)
+            if k != 0:
+                steps.append(evaluate({**best.angles, motor: center + period * k / points}))
+        offsets = np.array([step.angles[motor] - center for step in steps])
+        values = np.array([step.value for step in steps])
+        coefficients = np.linalg.lstsq(_harmonics(offsets, period), values, rcond=None)[0]
+        grid = np.linspace(-period / 2, period / 2, _FIT_RESOLUTION, endpoint=False)
+        fitted = _harmonics(grid, period) @ coefficients
+        measured = max(steps, key=lambda step: step.value)
+        if fitted.max() - measured.value <= measured.error:
+            return measured
+        candidate = evaluate({**best.angles, motor: center + float(grid[np.argmax(fitted)])})
+        return max(measured, candidate, key=lambda step: step.value)
+
+    def _simplex(  # noqa: PLR0913
+        self,
+        best: CompensationStep,
+        edge_degrees: float,
+        tolerance_degrees: float,
+        coarse_error: float | None,
+        evaluate: Callable[[Mapping[str, float], float | None], CompensationStep],
+        done: Callable[[], bool],
+    ) -> CompensationStep:
+        """Climb from `best` with a Nelder-Mead simplex over the compensators, starting with edges of `edge_degrees`."""
+        names = self.compensators
+        vertices = [best] + [evaluate({**best.angles, m: best.angles[m] + edge_degrees}, coarse_error) for m in names]
+        refined_to: dict[tuple[float, ...], float] = {}  # Lowest error target the best vertices were integrated to.
+        while not done():
+            vertices.sort(key=lambda step: -step.value)
+            points = np.array([[vertex.angles[m] for m in names] for vertex in vertices])
+            target_error = self._simplex_error(vertices, coarse_error)
+            spread = vertices[0].value - vertices[-1].value
+            indistinct = target_error == self.config.target_error and spread < max(v.error for v in vertices)
+            if np.abs(points[1:] - points[0]).max() < tolerance_degrees or indistinct:
+                break
+            key = tuple(points[0].tolist())
+            if (
+                target_error is not None
+                and vertices[0].error > target_error
+                and target_error < refined_to.get(key, math.inf)
+            ):
+                # The best vertex may only lead by noise, integrate it further before building on it.
+                refined_to[key] = target_error
+                vertices[0] = evaluate(vertices[0].angles, target_error)
+                continue
+
+            def at(point: npt.NDArray[np.float64], target_error: float | None = target_error) -> CompensationStep:
+                return evaluate(dict(zip(names, point.tolist(), strict=True)), target_error)
+
+            centroid = points[:-1].mean(axis=0)
+            reflected = at(2 * centroid - points[-1])
+            if reflected.value > vertices[0].value:
+                expanded = at(3 * centroid - 2 * points[-1])
+                vertices[-1] = expanded if expanded.value > reflected.value else reflected
+            elif reflected.value > vertices[-2].value:
+                vertices[-1] = reflected
+            else:
+                outside = reflected.value > vertices[-1].value
+                contracted = at(
+                    centroid + 0.5 * ((points[-1] if not outside else 2 * centroid - points[-1]) - centroid)
+                )
+                if contracted.value > max(reflected.value, vertices[-1].value):
+                    vertices[-1] = contracted
+                else:
+                    shrunk = [0.5 * (points[0] + point) for point in points[1:]]
+                    for i in self._nearest_first([dict(zip(names, p.tolist(), strict=True)) for p in shrunk]):
+                        if done():
+                            break
+                        vertices[i + 1] = at(shrunk[i])
+        return max(vertices, key=lambda step: step.value)
+
+    def _simplex_error(self, vertices: list[CompensationStep], coarse_error: float | None) -> float | None:
+        """Error that tells the vertices apart, a quarter of the spread of their values within the error targets."""
+        final_error = self.config.target_error
+        if final_error is None or coarse_error is None:
+            return None
+        spread = max(vertex.value for vertex in vertices) - min(vertex.value for vertex in vertices)
+        return max(final_error, min(coarse_error, spread / 4))
+
+    def _evaluate(self, angles: Mapping[str, float], target_error: float | None, started: float) -> CompensationStep:
+        self.sweep.config = self.config.model_copy(update={"target_error": target_error})
+        settings = [SweepSetting({**setting.angles, **angles}, setting.label) for setting in self.objective.settings]
+        results = stored_counts(self.sweep.run(settings, lambda results: self.objective.evaluate(results)[1]))
+        value, error = self.objective.evaluate(results)
+        return CompensationStep(
+            angles=dict(angles),
+            value=value,
+            error=error,
+            integration_time_s=sum(result.integration_time_s for result in results),
+            elapsed_s=time.perf_counter() - started,
+        )
+
+    def _move_to(self, angles: Mapping[str, float]) -> None:
+        for motor, angle in angles.items():
+            if self.sweep.positions.get(motor) != angle:
+                self.motors[motor].move_to(angle)
+                self.sweep.positions[motor] = angle
+
+    def _period(self, motor: str) -> float:
+        return getattr(self.motors[motor], "period_degrees", None) or WAVEPLATE_PERIOD_DEGREES
+
+    def _nearest_first(self, candidates: list[dict[str, float]]) -> list[int]:
+        """Order `candidates` greedily by the time of the concurrent moves to each from the one before."""
+        positions = dict(self.sweep.positions)
+        remaining = list(range(len(candidates)))
+        order = []
+        while remaining:
+            nearest = min(remaining, key=lambda i: self._move_time_s(positions, candidates[i]))
+            remaining.remove(nearest)
+            order.append(nearest)
+            positions.update(candidates[nearest])
+        return order
+
+    def _move_time_s(self, positions: Mapping[str, float], angles: Mapping[str, float]) -> float:
+        """Estimate how long moving the compensators to `angles` takes, with their motion models when they have one."""
+        times = [0.0]
+        for motor, angle in angles.items():
+            start = positions.get(motor, angle)
+            model = getattr(getattr(self.motors[motor], "info", None), "motion_model", None)
+            if model is None:
+                times.append(abs(angle - start) / DEFAULT_VELOCITY_DPS)
+            elif angle != start:
+                times.append(float(model.predict_s(start, angle)))
+        return max(times)
+
+
+def _harmonics(offsets: npt.NDArray[np.float64], period: float) -> npt.NDArray[np.float64]:
+    """Design matrix of the first two harmonics of `period`, what the counts through a waveplate are made of."""
+    phase = 2 * np.pi * offsets[:, None] / period
+    return np.hstack([np.ones_like(phase), np.cos(phase), np.sin(phase), np.cos(2 * phase), np.sin(2 * phase)])
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from dataclasses import field
 
 from pydantic import BaseModel
 
@@ -9,6 +10,13 @@ class MeasurementConfig(BaseModel):
     channel1: int = 1
     channel2: int = 2
     dark_count: int = 0
+    # Integrate each setting until it has this many coincidences, counts stored from earlier runs included.
+    min_counts: int | None = None
+    # Stops integrating for `min_counts` or `target_error`, 10 integration times if None.
+    max_integration_time_s: float | None = None
+    # Integrate every setting in chunks, for as long as needed for the error of the result to reach this.
+    target_error: float | None = None
+    chunk_time_s: float = 1.0
 
 
 @dataclass
@@ -21,6 +29,8 @@ class ExpectationValue:
     raw_counts: list[int]
     error: float
     value: float
+    # Time each setting was integrated for, stored integrations included.
+    integration_times_s: list[float] = field(default_factory=list)
 
 
 @dataclass
@@ -31,6 +41,7 @@ class CHSHValue:
     basis2: list[float]
     chsh_value: float
     chsh_error: float
+    integration_time_s: float = 0.0  # Total over every setting.
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Mapping
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+
+# Integrations made for `min_counts` when there is no `max_integration_time_s`, in integration times.
+DEFAULT_MAX_INTEGRATIONS = 10
+# Integration times added up from chunks are compared with this slack, for the rounding errors of the sums.
+TIME_TOLERANCE = 1e-9
+
+
+@dataclass(frozen=True, slots=True)
+class MeasurementKey:
+    # (motor, degrees) of every motor of the setting, sorted by motor.
+    angles: tuple[tuple[str, float], ...]
+    channels: tuple[int, ...]
+    binwidth_ps: int
+    epoch: int
+
+
+@dataclass(frozen=True, slots=True)
+class StoredCounts:
+    counts: int
+    integration_time_s: float
+    integrations: int
+    oldest_at: float  # time.time() of the oldest integration added up.
+
+    @property
+    def rate(self) -> float:
+        return self.counts / self.integration_time_s if self.integration_time_s > 0 else 0.0
+
+    @property
+    def rate_variance(self) -> float:
+        """Poisson variance of `rate`, counts / t**2."""
+        return self.counts / self.integration_time_s**2 if self.integration_time_s > 0 else 0.0
+
+
+def count_rates(results: Sequence[StoredCounts]) -> tuple[list[float], list[float]]:
+    """
+    Return the count rates of `results` and their Poisson variances.
+
+    Settings that accumulated more integrations than others cannot be compared by their counts, their rates can. Every
+    count measured is kept, and the settings integrated for longer get the smaller variances.
+    """
+    return [result.rate for result in results], [result.rate_variance for result in results]
+
+
+class MeasurementStore:
+    def __init__(self, max_age_s: float | None = None) -> None:
+        """
+        Keep the counts measured at each setting of motors and time tagger, to reuse and add up across protocol runs.
+
+        Measuring a setting that is already stored returns the stored counts, and asking for more counts than stored
+        integrates again and adds the new counts to them. Integrations older than `max_age_s` are dropped. Anything
+        that changes the counts without changing a setting, like realigning the optics, should start a new
+        configuration epoch with `new_epoch`.
+        """
+        self.max_age_s = max_age_s
+        self.epoch = 0
+        self._integrations: dict[MeasurementKey, deque[tuple[float, int, float]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._integrations)
+
+    def key(self, angles: Mapping[str, float], channels: Sequence[int], binwidth_ps: int) -> MeasurementKey:
+        rounded = tuple(sorted((motor, round(degrees, 6)) for motor, degrees in angles.items()))
+        return MeasurementKey(rounded, tuple(channels), binwidth_ps, self.epoch)
+
+    def new_epoch(self) -> int:
+        """Forget every stored measurement, the counts of the previous configuration do not apply anymore."""
+        with self._lock:
+            self.epoch += 1
+            self._integrations.clear()
+            return self.epoch
+
+    def get(self, key: MeasurementKey) -> StoredCounts | None:
+        """Return the counts added up over the integrations of `key` that did not expire, None if there are none."""
+        with self._lock:
+            return self._stored(key)
+
+    def add(
+        self, key: MeasurementKey, counts: int, integration_time_s: float, measured_at: float | None = None
+    ) -> StoredCounts:
+        """Add an integration of `key`, measured now unless `measured_at` gives its epoch time in seconds."""
+        with self._lock:
+            if key.epoch != self.epoch:
+                msg = f"Measurement of epoch {key.epoch} added after epoch {self.epoch} started."
+                raise ValueError(msg)
+            now = time.time() if measured_at is None else measured_at
+            self._integrations.setdefault(key, deque()).append((now, counts, integration_time_s))
+            return self._stored(key) or StoredCounts(counts, integration_time_s, 1, now)
+
+    def measure(  # noqa: PLR0913
+        self,
+        key: MeasurementKey,
+        integrate: Callable[[float], int],
+        integration_time_s: float,
+        min_counts: int | None = None,
+        max_integration_time_s: float | None = None,
+        min_integration_time_s: float | None = None,
+    ) -> StoredCounts:
+        """
+        Return the stored counts of `key`, calling `integrate(integration_time_s)` until there are enough.
+
+        Without `min_counts` one integration is enough, or as many as needed to add up to `min_integration_time_s`.
+        With it, integrations are added until the counts reach it or the total integration time reaches
+        `max_integration_time_s`, by default `DEFAULT_MAX_INTEGRATIONS` integration times.
+        """
+        if max_integration_time_s is None:
+            max_integration_time_s = DEFAULT_MAX_INTEGRATIONS * integration_time_s
+        min_integration_time_s = max(integration_time_s, min_integration_time_s or 0.0)
+        stored = self.get(key)
+        while stored is None or not _enough(stored, min_integration_time_s, min_counts, max_integration_time_s):
+            stored = self.add(key, integrate(integration_time_s), integration_time_s)
+        return stored
+
+    def _stored(self, key: MeasurementKey) -> StoredCounts | None:
+        integrations = self._integrations.get(key)
+        if integrations is None:
+            return None
+        if self.max_age_s is not None:
+            expired_before = time.time() - self.max_age_s
+            while integrations and integrations[0][0] < expired_before:
+                integrations.popleft()
+        if not integrations:
+            del self._integrations[key]
+            return None
+        return StoredCounts(
+            counts=sum(counts for _, counts, _ in integrations),
+            integration_time_s=sum(duration for _, _, duration in integrations),
+            integrations=len(integrations),
+            oldest_at=integrations[0][0],
+        )
+
+
+def measure_settings(
+    store: MeasurementStore,
+    settings: Sequence[tuple[MeasurementKey, Callable[[float], int]]],
+    config: MeasurementConfig,
+    error: Callable[[list[StoredCounts]], float],
+) -> list[StoredCounts]:
+    """
+    Measure every setting of a protocol with the integrations `config` asks for, and return their counts in order.
+
+    With `config.target_error` the settings are integrated for `config.chunk_time_s` first. Then all of them are
+    integrated further, for the same total time each, until `error` of their counts reaches the target or the time
+    reaches `config.max_integration_time_s`. The time needed is extrapolated from the error so far, errors shrink with
+    the square root of the integration time, so it usually takes a single extra pass.
+    """
+    if config.target_error is None:
+        return [
+            store.measure(key, integrate, config.integration_time_s, config.min_counts, config.max_integration_time_s)
+            for key, integrate in settings
+        ]
+
+    max_time_s = config.max_integration_time_s or DEFAULT_MAX_INTEGRATIONS * config.integration_time_s
+    chunk_s = min(config.chunk_time_s, max_time_s)
+    time_s = chunk_s
+    order = list(range(len(settings)))
+    results: list[StoredCounts | None] = [None] * len(settings)
+    while True:
+        for i in order:
+            key, integrate = settings[i]
+            results[i] = store.measure(
+                key, integrate, chunk_s, max_integration_time_s=max_time_s, min_integration_time_s=time_s
+            )
+        counts = [result for result in results if result is not None]
+        achieved = error(counts)
+        if achieved <= config.target_error or time_s >= max_time_s:
+            return counts
+        needed_s = time_s * (achieved / config.target_error) ** 2
+        time_s = min(max_time_s, max(time_s + chunk_s, chunk_s * math.ceil(needed_s / chunk_s - TIME_TOLERANCE)))
+        # The next pass starts with the setting the motors are at.
+        order.reverse()
+
+
+def _enough(
+    stored: StoredCounts, min_integration_time_s: float, min_counts: int | None, max_integration_time_s: float
+) -> bool:
+    if min_counts is None:
+        return stored.integration_time_s >= min_integration_time_s - TIME_TOLERANCE
+    return stored.counts >= min_counts or stored.integration_time_s >= max_integration_time_s - TIME_TOLERANCE
@@ -1,19 +1,35 @@
+import base64
+import math
+from collections.abc import Callable
+from collections.abc import Sequence
 from dataclasses import dataclass
 from time import sleep
 from typing import TYPE_CHECKING
 from typing import cast
 
+import numpy as np
+import numpy.typing as npt
+
 from pqnstack.constants import DEFAULT_SETTINGS
 from pqnstack.constants import HV_BASIS
+from pqnstack.constants import BellState
 from pqnstack.constants import MeasurementBasis
+from pqnstack.constants import QKDEncodingBasis
 from pqnstack.network.client import Client
 from pqnstack.network.client import ProxyInstrument
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
-from pqnstack.pqn.protocols.visibility import calculate_visibility
+from pqnstack.pqn.protocols.rng import Bits
+from pqnstack.pqn.protocols.rng import toeplitz_hash
+from pqnstack.pqn.protocols.statistics import calculate_visibility
 
 if TYPE_CHECKING:
     from pqnstack.base.instrument import RotatorInstrument
 
+# Corrects a sifted key given the estimated QBER, returning the corrected key and how many bits were disclosed.
+ErrorCorrector = Callable[[Bits, float], tuple[Bits, int]]
+# Shrinks a reconciled key given the QBER and the disclosed bits, returning the final secret key.
+PrivacyAmplifier = Callable[[Bits, float, int], Bits]
+
 
 @dataclass
 class Devices:
@@ -91,6 +107,125 @@ def qkd_run(
     return visibility, error
 
 
+def pack_bits(bits: npt.ArrayLike) -> str:
+    """Encode a 0/1 array as base64 of its `np.packbits` bytes, the wire format for bases and bits."""
+    return base64.b64encode(np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes()).decode("ascii")
+
+
+def unpack_bits(data: str, n_bits: int) -> Bits:
+    """Inverse of `pack_bits`, `n_bits` drops the padding of the last byte."""
+    packed = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+    if len(packed) != (n_bits + 7) // 8:
+        msg = f"Packed data holds {len(packed) * 8} bits, which does not fit {n_bits} bits"
+        raise ValueError(msg)
+    return np.unpackbits(packed, count=n_bits)
+
+
+def bases_to_bits(bases: Sequence[QKDEncodingBasis]) -> Bits:
+    """Map HV to 0 and DA to 1."""
+    return np.fromiter((basis.value for basis in bases), dtype=np.uint8, count=len(bases))
+
+
+def measurement_outcomes(
+    bases: Bits, choices: Bits, counts: npt.ArrayLike, threshold: int, bell_state: BellState
+) -> Bits:
+    """
+    Key bits inferred by the leader from its basis, its waveplate choice and the coincidences of every step.
+
+    Parameters
+    ----------
+    bases : Bits
+        Leader basis per step, 0 for HV and 1 for DA.
+    choices : Bits
+        Leader waveplate choice within the basis per step.
+    counts : npt.ArrayLike
+        Coincidence counts per step.
+    threshold : int
+        Counts strictly above it are read as a coincidence.
+    bell_state : BellState
+        Entangled state shared by the nodes.
+
+    Returns
+    -------
+    Bits
+        The bit the follower encoded at every step, assuming no errors.
+    """
+    above = (np.asarray(counts) > threshold).astype(np.uint8)
+    return above ^ choices ^ np.uint8(1 - bell_state.value) ^ bases
+
+
+def sift(bits: Bits, own_bases: Bits, peer_bases: Bits) -> Bits:
+    """Keep the bits of the steps where both nodes used the same basis."""
+    if not len(bits) == len(own_bases) == len(peer_bases):
+        msg = f"Cannot sift {len(bits)} bits with {len(own_bases)} and {len(peer_bases)} bases"
+        raise ValueError(msg)
+    sifted: Bits = bits[own_bases == peer_bases]
+    return sifted
+
+
+def choose_sample(n_bits: int, sample_size: int, rng: np.random.Generator | None = None) -> npt.NDArray[np.intp]:
+    """Sorted positions of the sifted key to disclose for QBER estimation."""
+    rng = np.random.default_rng() if rng is None else rng
+    return np.sort(rng.choice(n_bits, size=min(sample_size, n_bits), replace=False))
+
+
+def estimate_qber(own_sample: Bits, peer_sample: Bits) -> float:
+    """Fraction of disclosed bits on which both nodes disagree."""
+    if len(own_sample) != len(peer_sample):
+        msg = f"Samples have different lengths: {len(own_sample)} and {len(peer_sample)}"
+        raise ValueError(msg)
+    if len(own_sample) == 0:
+        return 0.0
+    return np.count_nonzero(own_sample ^ peer_sample) / len(own_sample)
+
+
+def distill_key(
+    sifted: Bits,
+    qber: float,
+    error_corrector: ErrorCorrector | None = None,
+    privacy_amplifier: PrivacyAmplifier | None = None,
+) -> Bits:
+    """Run the optional error correction and privacy amplification stages on a sifted key (without the sample)."""
+    key, leaked_bits = (sifted, 0) if error_corrector is None else error_corrector(sifted, qber)
+    if privacy_amplifier is None:
+        return key
+    return privacy_amplifier(key, qber, leaked_bits)
+
+
+def binary_entropy(p: float) -> float:
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+def secure_key_length(n_bits: int, qber: float, leaked_bits: int, security_parameter: float = 1e-10) -> int:
+    """
+    Length of the secret key that can be distilled from `n_bits` reconciled bits.
+
+    Uses the asymptotic BB84 bound `n (1 - h(qber)) - leaked - 2 log2(1 / security_parameter)`, where `leaked` are the
+    bits disclosed during error correction.
+    """
+    length = n_bits * (1 - binary_entropy(qber)) - leaked_bits - 2 * math.log2(1 / security_parameter)
+    return max(0, math.floor(length))
+
+
+def amplify(key: Bits, n_out: int, seed: int) -> Bits:
+    """Hash `key` down to `n_out` bits with a Toeplitz matrix both nodes derive from the public `seed`."""
+    if n_out == 0:
+        return np.empty(0, dtype=np.uint8)
+    toeplitz_seed = np.random.default_rng(seed).integers(0, 2, len(key) + n_out - 1, dtype=np.uint8)
+    return toeplitz_hash(key, toeplitz_seed, n_out)
+
+
+def toeplitz_amplifier(seed: int, security_parameter: float = 1e-10) -> PrivacyAmplifier:
+    """Toeplitz hashing down to `secure_key_length` as a `PrivacyAmplifier` hook for `distill_key`."""
+
+    def amplify_key(key: Bits, qber: float, leaked_bits: int) -> Bits:
+        return amplify(key, secure_key_length(len(key), qber, leaked_bits, security_parameter), seed)
+
+    return amplify_key
+
+
 if __name__ == "__main__":
     from pqnstack.network.devices.client import client
 
@@ -0,0 +1,231 @@
+import logging
+import secrets
+import threading
+from collections.abc import Callable
+from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy as np
+import numpy.typing as npt
+
+from pqnstack.base.errors import RandomnessPoolExhaustedError
+
+logger = logging.getLogger(__name__)
+
+Bits = npt.NDArray[np.uint8]
+
+
+def toeplitz_hash(bits: Bits, seed: Bits, n_out: int) -> Bits:
+    """Compress `bits` into `n_out` bits with the binary Toeplitz matrix defined by `seed`.
+
+    The matrix has `T[i, j] = seed[i - j + len(bits) - 1]`, so `seed` must hold `len(bits) + n_out - 1` bits. The
+    product is evaluated as a convolution through the FFT, which keeps the cost at O(n log n) for large blocks.
+    """
+    n_in = len(bits)
+    if len(seed) != n_in + n_out - 1:
+        msg = f"Toeplitz seed must have {n_in + n_out - 1} bits, not {len(seed)}"
+        raise ValueError(msg)
+
+    size = len(seed) + n_in - 1
+    conv = np.fft.irfft(np.fft.rfft(seed, size) * np.fft.rfft(bits, size), size)
+    window = np.rint(conv[n_in - 1 : n_in - 1 + n_out]).astype(np.int64)
+    return (window & 1).astype(np.uint8)
+
+
+@dataclass(slots=True)
+class ToeplitzExtractor:
+    """Randomness extractor turning `n_in` weakly random bits into `n_out` nearly uniform ones.
+
+    `n_out / n_in` should not exceed the min-entropy per raw bit of the source. The seed is public but must be drawn
+    from a uniform source, by default it comes from the operating system.
+    """
+
+    n_in: int
+    n_out: int
+    seed: Bits = field(default_factory=lambda: np.empty(0, dtype=np.uint8))
+
+    def __post_init__(self) -> None:
+        if not 0 < self.n_out <= self.n_in:
+            msg = f"Extractor output size must be in (0, {self.n_in}], not {self.n_out}"
+            raise ValueError(msg)
+        if len(self.seed) == 0:
+            seed_len = self.n_in + self.n_out - 1
+            self.seed = np.frombuffer(secrets.token_bytes(seed_len), dtype=np.uint8) & np.uint8(1)
+
+    def extract(self, raw_bits: Bits) -> Bits:
+        return toeplitz_hash(raw_bits, self.seed, self.n_out)
+
+
+@dataclass(frozen=True, slots=True)
+class RandomnessPoolStatus:
+    available_bits: int
+    capacity_bits: int
+    low_watermark_bits: int
+    high_watermark_bits: int
+    harvesting: bool
+    raw_bits_harvested: int
+    bits_extracted: int
+    bits_served: int
+    fallbacks: int
+
+
+class RandomnessPool:
+    def __init__(  # noqa: PLR0913
+        self,
+        source: Callable[[], Sequence[int]],
+        extractor: ToeplitzExtractor,
+        capacity_bits: int = 65536,
+        low_watermark_bits: int = 4096,
+        high_watermark_bits: int = 60000,
+        retry_period_s: float = 5.0,
+    ) -> None:
+        """
+        Background service keeping a bounded buffer of extracted random bits.
+
+        A harvester thread repeatedly calls `source`, keeps the least significant bit of every value it returns
+        (e.g. the parity of singles counts) and runs full blocks of raw bits through `extractor`. Harvesting stops
+        once `high_watermark_bits` are buffered and resumes when consumers drain the pool below
+        `low_watermark_bits`, so the timetagger is only busy when bits are actually being used.
+
+        :param source: Callable returning raw integers. It is only ever called from the harvester thread, so it can
+         own thread-bound resources like zmq sockets.
+        :param extractor: Extractor applied to every `extractor.n_in` raw bits.
+        :param capacity_bits: Size of the ring buffer.
+        :param low_watermark_bits: Fill level below which harvesting resumes.
+        :param high_watermark_bits: Fill level at which harvesting pauses.
+        :param retry_period_s: Time to wait before calling `source` again after it raised.
+        """
+        if not 0 <= low_watermark_bits < high_watermark_bits <= capacity_bits:
+            msg = "Watermarks must satisfy 0 <= low < high <= capacity"
+            raise ValueError(msg)
+
+        self.source = source
+        self.extractor = extractor
+        self.capacity_bits = capacity_bits
+        self.low_watermark_bits = low_watermark_bits
+        self.high_watermark_bits = high_watermark_bits
+        self.retry_period_s = retry_period_s
+
+        self._buffer: Bits = np.zeros(capacity_bits, dtype=np.uint8)
+        self._head = 0  # Index of the oldest buffered bit.
+        self._size = 0
+        self._raw: Bits = np.zeros(extractor.n_in, dtype=np.uint8)
+        self._raw_size = 0
+
+        self._cond = threading.Condition()
+        self._harvesting = True
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+        self._raw_bits_harvested = 0
+        self._bits_extracted = 0
+        self._bits_served = 0
+        self._fallbacks = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._harvest_loop, name="rng-pool-harvester", daemon=True)
+        self._thread.start()
+        logger.info("Randomness pool started with capacity %d bits", self.capacity_bits)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info("Randomness pool stopped")
+
+    @property
+    def status(self) -> RandomnessPoolStatus:
+        with self._cond:
+            return RandomnessPoolStatus(
+                available_bits=self._size,
+                capacity_bits=self.capacity_bits,
+                low_watermark_bits=self.low_watermark_bits,
+                high_watermark_bits=self.high_watermark_bits,
+                harvesting=self._harvesting,
+                raw_bits_harvested=self._raw_bits_harvested,
+                bits_extracted=self._bits_extracted,
+                bits_served=self._bits_served,
+                fallbacks=self._fallbacks,
+            )
+
+    def take(self, n_bits: int) -> Bits:
+        """Remove and return `n_bits` bits without waiting, raising if the pool does not hold enough of them."""
+        with self._cond:
+            if n_bits > self._size:
+                msg = f"Requested {n_bits} random bits but only {self._size} are available"
+                raise RandomnessPoolExhaustedError(msg)
+
+            idx = (self._head + np.arange(n_bits)) % self.capacity_bits
+            out: Bits = self._buffer[idx]
+            self._head = (self._head + n_bits) % self.capacity_bits
+            self._size -= n_bits
+            self._bits_served += n_bits
+
+            if not self._harvesting and self._size <= self.low_watermark_bits:
+                self._harvesting = True
+                self._cond.notify_all()
+        return out
+
+    def randbits(self, k: int) -> int:
+        """Return a `k` bit integer from the pool, falling back to `secrets.randbits` when it runs dry."""
+        try:
+            bits = self.take(k)
+        except RandomnessPoolExhaustedError:
+            logger.warning("Randomness pool exhausted, falling back to the operating system's random source")
+            with self._cond:
+                self._fallbacks += 1
+            return secrets.randbits(k)
+
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bit)
+        return value
+
+    def _push(self, bits: Bits) -> None:
+        with self._cond:
+            n = min(len(bits), self.capacity_bits - self._size)
+            idx = (self._head + self._size + np.arange(n)) % self.capacity_bits
+            self._buffer[idx] = bits[:n]
+            self._size += n
+            self._bits_extracted += n
+            if self._size >= self.high_watermark_bits:
+                self._harvesting = False
+
+    def _feed(self, values: Sequence[int]) -> None:
+        lsb = np.asarray(values, dtype=np.int64).ravel() & 1
+        self._raw_bits_harvested += len(lsb)
+        while len(lsb) > 0:
+            n = min(len(lsb), self.extractor.n_in - self._raw_size)
+            self._raw[self._raw_size : self._raw_size + n] = lsb[:n]
+            self._raw_size += n
+            lsb = lsb[n:]
+            if self._raw_size == self.extractor.n_in:
+                self._push(self.extractor.extract(self._raw))
+                self._raw_size = 0
+
+    def _harvest_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._harvesting)
+                if not self._running:
+                    return
+
+            try:
+                values = self.source()
+            except Exception:
+                logger.exception("Randomness pool source failed, retrying in %s s", self.retry_period_s)
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running, timeout=self.retry_period_s)
+                continue
+
+            self._feed(values)
@@ -0,0 +1,241 @@
+import math
+from collections.abc import Callable
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+import numpy.typing as npt
+
+from pqnstack.constants import BellState
+from pqnstack.pqn.protocols.tomography import TOMOGRAPHY_BASIS
+from pqnstack.pqn.protocols.tomography import figures_of_merit
+from pqnstack.pqn.protocols.tomography import linear_inversion
+from pqnstack.pqn.protocols.tomography import maximum_likelihood
+from pqnstack.pqn.protocols.tomography import project_to_density_matrix
+
+# Takes counts stacked along a leading resample axis, returns one or more values per resample.
+Statistic = Callable[[npt.NDArray[np.int64]], npt.NDArray[np.float64]]
+
+# Resamples drawn with their own seed and handed to a worker at a time. Fixed so that results do not depend on the
+# number of workers.
+DEFAULT_BATCH_SIZE = 1000
+TOMOGRAPHY_FIGURES = ("fidelity", "concurrence", "purity")
+
+
+def calculate_chsh_expectation_error(counts: list[int], dark_count: float = 0) -> float:
+    total_counts = sum(counts)
+    corrected_total = total_counts - 4 * dark_count
+    if corrected_total <= 0:
+        return 0
+    first_term = math.sqrt(total_counts) / corrected_total
+    expectation = abs(counts[0] + counts[3] - counts[1] - counts[2])
+    second_term = (expectation / corrected_total**2) * math.sqrt(total_counts + 4 * dark_count)
+    return first_term + second_term
+
+
+def calculate_chsh_error(error_values: list[float]) -> float:
+    return math.sqrt(sum(x**2 for x in error_values))
+
+
+def calculate_visibility(
+    coincidence_counts: dict[tuple[str, str], int],
+    pairs: list[tuple[str, str]],
+) -> tuple[float, float]:
+    c_values = [coincidence_counts[pair] for pair in pairs]
+    c_max, c_min = max(c_values), min(c_values)
+
+    denominator = (c_max + c_min) ** 2
+    if denominator == 0:
+        return 0.0, 0.0
+
+    c_err = 2 * math.sqrt((c_min**2) * c_max + (c_max**2) * c_min) / denominator
+    return (c_max - c_min) / (c_max + c_min), c_err
+
+
+def rate_expectation_value(
+    rates: Sequence[float], variances: Sequence[float], dark_rate: float = 0
+) -> tuple[float, float]:
+    """
+    Compute the expectation value of the rates of its 4 settings, and its error from the variances of the rates.
+
+    Unlike `calculate_chsh_expectation_error` the settings may be integrated for different times. The error propagates
+    the variances to first order, with counts integrated for the same time it is sqrt((1 - E**2) / N).
+    """
+    signs = (1, -1, -1, 1)
+    denominator = sum(rates) - 4 * dark_rate
+    if denominator <= 0:
+        return 0.0, 0.0
+    value = sum(sign * rate for sign, rate in zip(signs, rates, strict=True)) / denominator
+    variance = sum((sign - value) ** 2 * var for sign, var in zip(signs, variances, strict=True)) / denominator**2
+    return value, math.sqrt(variance)
+
+
+def rate_visibility(rates: Sequence[float], variances: Sequence[float]) -> tuple[float, float]:
+    """Compute the visibility of the rates of the pairs of a basis and its error, like `calculate_visibility`."""
+    high = max(range(len(rates)), key=rates.__getitem__)
+    low = min(range(len(rates)), key=rates.__getitem__)
+    r_max, r_min = rates[high], rates[low]
+    total = r_max + r_min
+    if total == 0:
+        return 0.0, 0.0
+    error = 2 * math.sqrt(r_min**2 * variances[high] + r_max**2 * variances[low]) / total**2
+    return (r_max - r_min) / total, error
+
+
+@dataclass(frozen=True, slots=True)
+class ConfidenceInterval:
+    value: float  # Of the measured counts.
+    low: float
+    high: float
+    standard_error: float  # Standard deviation over the resamples.
+    confidence: float
+    resamples: int
+
+
+def expectation_values(counts: npt.ArrayLike, dark_count: float = 0) -> npt.NDArray[np.float64]:
+    """Compute the expectation values of groups of 4 settings along the last axis, 0 without counts above dark."""
+    n = np.asarray(counts, dtype=np.float64)
+    numerator = n[..., 0] - n[..., 1] - n[..., 2] + n[..., 3]
+    denominator = n.sum(axis=-1) - 4 * dark_count
+    safe = np.where(denominator == 0, 1, denominator)
+    return np.asarray(np.where(denominator == 0, 0, numerator / safe), dtype=np.float64)
+
+
+def chsh_values(counts: npt.ArrayLike, dark_count: float = 0) -> npt.NDArray[np.float64]:
+    """CHSH values of counts shaped (..., 4, 4), the 4 settings of each of the 4 expectation values of `measure_chsh`."""
+    e = expectation_values(counts, dark_count)
+    return np.asarray(-e[..., 0] + e[..., 1] + e[..., 2] + e[..., 3], dtype=np.float64)
+
+
+def visibility_values(counts: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    """Visibilities of the basis pair counts along the last axis, 0 where there are no counts."""
+    n = np.asarray(counts, dtype=np.float64)
+    c_max, c_min = n.max(axis=-1), n.min(axis=-1)
+    total = c_max + c_min
+    return np.asarray(np.where(total == 0, 0, (c_max - c_min) / np.where(total == 0, 1, total)), dtype=np.float64)
+
+
+def tomography_values(
+    counts: npt.ArrayLike, bell_state: BellState = BellState.Phi_plus, method: str = "projected"
+) -> npt.NDArray[np.float64]:
+    """
+    Fidelity, concurrence and purity along the last axis of the tomography counts along the last axis.
+
+    "projected" projects the linear inversion to the closest density matrix, for every resample at once. "mle"
+    reconstructs each resample by maximum likelihood, a few milliseconds each, and is worth spreading across workers.
+    """
+    n = np.asarray(counts, dtype=np.float64)
+    if method == "projected":
+        rho = project_to_density_matrix(linear_inversion(n))
+    elif method == "mle":
+        flat = n.reshape(-1, n.shape[-1])
+        rho = np.stack([maximum_likelihood(resample)[0] for resample in flat]).reshape(*n.shape[:-1], 4, 4)
+    else:
+        msg = f"Unknown reconstruction method: {method}"
+        raise ValueError(msg)
+    return figures_of_merit(rho, bell_state)
+
+
+def bootstrap(  # noqa: PLR0913
+    statistic: Statistic,
+    counts: npt.ArrayLike,
+    resamples: int = 2000,
+    seed: int | None = None,
+    workers: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> npt.NDArray[np.float64]:
+    """
+    Values of `statistic` over Poisson resamples of `counts`, shaped (resamples, ...).
+
+    Every count is resampled from a Poisson distribution with the measured count as mean, and each batch of resamples
+    is drawn and evaluated as one array operation. Batches get their own seeds spawned from `seed`, so the same seed
+    gives the same values with any number of `workers`. With `workers` the batches are spread across a process pool,
+    `statistic` must then be picklable, a module level function or a `functools.partial` of one.
+    """
+    means = np.asarray(counts, dtype=np.float64)
+    sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    resample = partial(_resample_batch, statistic, means)
+    if workers is None or workers <= 1 or len(sizes) == 1:
+        batches = list(map(resample, seeds, sizes))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(resample, seeds, sizes))
+    return np.concatenate(batches)
+
+
+def confidence_interval(value: float, samples: npt.NDArray[np.float64], confidence: float = 0.95) -> ConfidenceInterval:
+    """Percentile interval of bootstrap `samples` of a single value."""
+    low, high = np.quantile(samples, [(1 - confidence) / 2, (1 + confidence) / 2])
+    return ConfidenceInterval(
+        value=value,
+        low=float(low),
+        high=float(high),
+        standard_error=float(samples.std(ddof=1)),
+        confidence=confidence,
+        resamples=len(samples),
+    )
+
+
+def chsh_confidence_interval(  # noqa: PLR0913
+    counts: npt.ArrayLike,
+    dark_count: float = 0,
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> ConfidenceInterval:
+    """
+    Bootstrap interval of the CHSH value of 16 counts, the `raw_counts` of the 4 expectation values of a `CHSHValue`.
+
+    :param dark_count: Dark counts per setting in the integration time of the counts, subtracted from every resample.
+    """
+    n = np.asarray(counts).reshape(4, 4)
+    statistic = partial(chsh_values, dark_count=dark_count)
+    samples = bootstrap(statistic, n, resamples, seed, workers)
+    return confidence_interval(float(chsh_values(n, dark_count)), samples, confidence)
+
+
+def visibility_confidence_interval(
+    counts: npt.ArrayLike,
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> ConfidenceInterval:
+    """Bootstrap interval of the visibility of the counts of the pairs of a basis."""
+    n = np.asarray(counts)
+    samples = bootstrap(visibility_values, n, resamples, seed, workers)
+    return confidence_interval(float(visibility_values(n)), samples, confidence)
+
+
+def tomography_confidence_intervals(  # noqa: PLR0913
+    counts: npt.ArrayLike,
+    bell_state: BellState = BellState.Phi_plus,
+    method: str = "projected",
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> dict[str, ConfidenceInterval]:
+    """Bootstrap intervals of the fidelity to `bell_state`, concurrence and purity of the 36 tomography counts."""
+    n = np.asarray(counts)
+    if n.shape != (len(TOMOGRAPHY_BASIS.pairs),):
+        msg = f"Tomography takes {len(TOMOGRAPHY_BASIS.pairs)} counts, got {n.shape}"
+        raise ValueError(msg)
+    statistic = partial(tomography_values, bell_state=bell_state, method=method)
+    samples = bootstrap(statistic, n, resamples, seed, workers)
+    values = statistic(n[None])[0]
+    return {
+        name: confidence_interval(float(values[i]), samples[:, i], confidence)
+        for i, name in enumerate(TOMOGRAPHY_FIGURES)
+    }
+
+
+def _resample_batch(
+    statistic: Statistic, means: npt.NDArray[np.float64], seed: np.random.SeedSequence, size: int
+) -> npt.NDArray[np.float64]:
+    rng = np.random.default_rng(seed)
+    return statistic(rng.poisson(means, size=(size, *means.shape)))
@@ -0,0 +1,447 @@
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from collections.abc import AsyncIterator
+from collections.abc import Callable
+from collections.abc import Collection
+from collections.abc import Mapping
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from pqnstack.base.errors import MotionStalledError
+from pqnstack.base.errors import MotionTimeoutError
+from pqnstack.base.errors import SweepCancelledError
+from pqnstack.base.instrument import RotatorInstrument
+from pqnstack.base.instrument import TimeTaggerInstrument
+from pqnstack.constants import MeasurementBasis
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.measurement_store import StoredCounts
+from pqnstack.pqn.protocols.measurement_store import measure_settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds the optics are left to settle after the motors move, before integrating.
+SETTLE_S = 2.0
+# Failures of instruments over the network or of the motors that are worth trying again, remote instruments raise
+# them on the client too, see `REMOTE_ERRORS`.
+RETRIED_ERRORS: tuple[type[Exception], ...] = (TimeoutError, ConnectionError, MotionTimeoutError, MotionStalledError)
+# Motors of the signal and idler photons, the half wave plate angle and quarter wave plate angle of a basis state.
+BASIS_MOTORS = (("signal_hwp", "signal_qwp"), ("idler_hwp", "idler_qwp"))
+
+
+@dataclass(frozen=True, slots=True)
+class SweepSetting:
+    angles: dict[str, float]  # Degrees of every motor the setting moves.
+    label: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class SweepProgress:
+    """One integration of a sweep, the last progress of a stream carries the `results` instead."""
+
+    index: int  # Of the setting in the settings of the sweep.
+    label: str
+    counts: int
+    integration_time_s: float
+    move_s: float  # Moving and settling before the integration, 0 if the motors were there.
+    measure_s: float
+    integrations: int  # Done so far.
+    elapsed_s: float
+    results: npt.NDArray[np.void] | None = field(default=None, compare=False)
+
+
+def basis_settings(basis: MeasurementBasis, motors: Collection[str]) -> list[SweepSetting]:
+    """
+    Build the settings of the pairs of `basis`, signal state first, for the motors among `BASIS_MOTORS` in `motors`.
+
+    Quarter wave plates are only moved if there are any.
+    """
+    settings = []
+    for pair in basis.pairs:
+        if pair[0] not in basis.settings or pair[1] not in basis.settings:
+            msg = f"State {pair[0]} or {pair[1]} is not defined in settings."
+            raise KeyError(msg)
+        angles = {
+            motor: angle
+            for state, wave_plates in zip(pair, BASIS_MOTORS, strict=True)
+            for motor, angle in zip(wave_plates, basis.settings[state], strict=True)
+            if motor in motors
+        }
+        settings.append(SweepSetting(angles, label="".join(pair)))
+    return settings
+
+
+def grid_settings(axes: Mapping[str, Sequence[float]]) -> list[SweepSetting]:
+    """Every combination of the angles of each motor, the last motor changing fastest."""
+    return [
+        SweepSetting(dict(zip(axes, angles, strict=True)), label=",".join(f"{angle:g}" for angle in angles))
+        for angles in itertools.product(*axes.values())
+    ]
+
+
+def stored_counts(results: npt.NDArray[np.void]) -> list[StoredCounts]:
+    """Return the counts of the rows of sweep results, for the analyses that take `StoredCounts`."""
+    return [
+        StoredCounts(int(row["counts"]), float(row["integration_time_s"]), int(row["integrations"]), 0.0)
+        for row in results
+    ]
+
+
+class SweepCheckpoint:
+    # Paths of the checkpoints loaded into each store, loading one twice would count its integrations twice.
+    _loaded: weakref.WeakKeyDictionary[MeasurementStore, set[Path]] = weakref.WeakKeyDictionary()
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, path: str | Path) -> None:
+        """
+        Append-only file of the integrations of sweeps, a JSON line each, to resume them after a failure.
+
+        Lines are flushed to disk as soon as they are written, a crash loses at most the integration in progress.
+        Integrations are matched to settings like in `MeasurementStore`, by motor angles, channels and bin width, so
+        a checkpoint can hold several sweeps, like the expectation values of a CHSH run. Delete the file to measure
+        everything again, and whenever the optics change.
+        """
+        self.path = Path(path).expanduser().resolve()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        angles: Mapping[str, float],
+        channels: Sequence[int],
+        binwidth_ps: int,
+        counts: int,
+        integration_time_s: float,
+    ) -> None:
+        line = json.dumps(
+            {
+                "angles": dict(angles),
+                "channels": list(channels),
+                "binwidth_ps": binwidth_ps,
+                "counts": counts,
+                "integration_time_s": integration_time_s,
+                "time": time.time(),
+            }
+        )
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as file:
+                file.write(line + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def load(self, store: MeasurementStore) -> int:
+        """
+        Add the recorded integrations to `store`, once per store, and return how many were added.
+
+        Integrations older than the `max_age_s` of the store are skipped, so is a line cut short by a crash.
+        """
+        with self._loaded_lock:
+            loaded_paths = self._loaded.setdefault(store, set())
+            if self.path in loaded_paths:
+                return 0
+            loaded_paths.add(self.path)
+        if not self.path.exists():
+            return 0
+        with self._lock:
+            lines = self.path.read_text().splitlines()
+        oldest = -math.inf if store.max_age_s is None else time.time() - store.max_age_s
+        loaded = 0
+        for number, line in enumerate(lines, start=1):
+            try:
+                record = json.loads(line)
+                if record["time"] < oldest:
+                    continue
+                key = store.key(record["angles"], record["channels"], record["binwidth_ps"])
+                store.add(key, int(record["counts"]), float(record["integration_time_s"]), float(record["time"]))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Skipping unreadable line %d of the sweep checkpoint %s", number, self.path)
+                continue
+            loaded += 1
+        if loaded:
+            logger.info("Resuming from %d integrations in %s", loaded, self.path)
+        return loaded
+
+
+class Sweep:
+    def __init__(  # noqa: PLR0913
+        self,
+        motors: Mapping[str, RotatorInstrument],
+        tagger: TimeTaggerInstrument,
+        config: MeasurementConfig,
+        store: MeasurementStore | None = None,
+        settle_s: float = SETTLE_S,
+        reorder: bool = True,  # noqa: FBT001, FBT002
+        checkpoint: SweepCheckpoint | str | Path | None = None,
+        retries: int = 3,
+        backoff_s: float = 1.0,
+    ) -> None:
+        """
+        Measure coincidences over a list of motor settings, the acquisition loop the protocols share.
+
+        Each setting is integrated as `config` asks for, through `measure_settings`, so stored counts are reused
+        and `min_counts` and `target_error` apply. The motors of a setting move concurrently, only the ones that are
+        elsewhere, and the settings are visited in the order that moves the motors least unless `reorder` is False.
+        Results come back in the order of the settings either way. The sweep remembers where it left the motors, so
+        running it again does not move motors that are already there; motors moved by anything else in between need a
+        new sweep.
+
+        :param checkpoint: Every integration is appended to it as soon as it ends, and a sweep starts with the
+            integrations already in it. Running a failed sweep again with the same checkpoint picks up where it
+            stopped.
+        :param retries: Moves and integrations that fail with one of `RETRIED_ERRORS` are tried again this many
+            times, waiting `backoff_s` before the first retry and twice as long before each of the next ones.
+        """
+        self.motors = motors
+        self.tagger = tagger
+        self.config = config
+        self.store = store
+        self.settle_s = settle_s
+        self.reorder = reorder
+        if isinstance(checkpoint, str | Path):
+            checkpoint = SweepCheckpoint(checkpoint)
+        self.checkpoint = checkpoint
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.positions: dict[str, float] = {}  # Angles the sweep last moved the motors to.
+
+    def run(
+        self,
+        settings: Sequence[SweepSetting],
+        error: Callable[[list[StoredCounts]], float] | None = None,
+        progress: Callable[[SweepProgress], None] | None = None,
+        stop: threading.Event | None = None,
+    ) -> npt.NDArray[np.void]:
+        """
+        Measure every setting and return a structured array with a row per setting.
+
+        The rows hold the index and label of the setting, the angle of every motor, the counts, the total integration
+        time and the number of integrations added up.
+
+        :param error: Error of the counts of all settings, integrated until it reaches `config.target_error`.
+        :param progress: Called after every integration, from the thread running the sweep.
+        :param stop: Set to stop the sweep before its next integration, it then raises `SweepCancelledError`.
+        """
+        store = MeasurementStore() if self.store is None else self.store
+        channels = (self.config.channel1, self.config.channel2)
+        if self.checkpoint is not None:
+            self.checkpoint.load(store)
+        positions = self.positions
+        order = self.visit_order(settings) if self.reorder else list(range(len(settings)))
+        counter = itertools.count(1)
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.motors)), thread_name_prefix="sweep-motor") as pool:
+
+            def integrator(index: int) -> Callable[[float], int]:
+                setting = settings[index]
+
+                def integrate(integration_time_s: float) -> int:
+                    counts, move_s, measure_s = self._acquire(pool, setting, positions, integration_time_s, stop)
+                    if self.checkpoint is not None:
+                        self.checkpoint.record(
+                            setting.angles, channels, self.config.binwidth_ps, counts, integration_time_s
+                        )
+                    if progress is not None:
+                        progress(
+                            SweepProgress(
+                                index=index,
+                                label=setting.label,
+                                counts=counts,
+                                integration_time_s=integration_time_s,
+                                move_s=move_s,
+                                measure_s=measure_s,
+                                integrations=next(counter),
+                                elapsed_s=time.perf_counter() - start,
+                            )
+                        )
+                    return counts
+
+                return integrate
+
+            keyed = [
+                (store.key(settings[index].angles, channels, self.config.binwidth_ps), integrator(index))
+                for index in order
+            ]
+            measured = measure_settings(store, keyed, self.config, error or _no_error)
+
+        results = [StoredCounts(0, 0.0, 0, 0.0)] * len(settings)
+        for index, counts in zip(order, measured, strict=True):
+            results[index] = counts
+        logger.debug("Swept %d settings in %.1f s", len(settings), time.perf_counter() - start)
+        return self._results_array(settings, results)
+
+    async def stream(
+        self,
+        settings: Sequence[SweepSetting],
+        error: Callable[[list[StoredCounts]], float] | None = None,
+    ) -> AsyncIterator[SweepProgress]:
+        """
+        Run the sweep in a worker thread and yield its progress as it goes, the last progress carries the results.
+
+        Closing the stream early stops the sweep before its next integration.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[SweepProgress | None] = asyncio.Queue()
+        stop = threading.Event()
+
+        def progress(update: SweepProgress) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, update)
+
+        start = time.perf_counter()
+        task = asyncio.ensure_future(asyncio.to_thread(self.run, settings, error, progress, stop))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (update := await queue.get()) is not None:
+                yield update
+            results = await task
+            yield SweepProgress(
+                index=-1,
+                label="",
+                counts=int(results["counts"].sum()),
+                integration_time_s=float(results["integration_time_s"].sum()),
+                move_s=0.0,
+                measure_s=0.0,
+                integrations=int(results["integrations"].sum()),
+                elapsed_s=time.perf_counter() - start,
+                results=results,
+            )
+        finally:
+            if not task.done():
+                stop.set()
+                # The sweep ends with SweepCancelledError once it notices, nobody waits for it anymore.
+                task.add_done_callback(lambda finished: finished.cancelled() or finished.exception())
+
+    def visit_order(self, settings: Sequence[SweepSetting]) -> list[int]:
+        """
+        Order of the settings that keeps the moves short, nearest setting first from where the motors are.
+
+        Motors move concurrently, so a move takes as long as the largest angle any motor turns. Angles of rotators
+        with a `period_degrees` are compared modulo the period.
+        """
+        positions = {motor: float(self.motors[motor].degrees) for motor in {m for s in settings for m in s.angles}}
+        periods = {motor: getattr(self.motors[motor], "period_degrees", None) for motor in positions}
+        remaining = list(range(len(settings)))
+        order = []
+        while remaining:
+            nearest = min(remaining, key=lambda index: _move_degrees(positions, settings[index].angles, periods))
+            remaining.remove(nearest)
+            order.append(nearest)
+            positions.update(settings[nearest].angles)
+        return order
+
+    def _acquire(
+        self,
+        pool: ThreadPoolExecutor,
+        setting: SweepSetting,
+        positions: dict[str, float],
+        integration_time_s: float,
+        stop: threading.Event | None,
+    ) -> tuple[int, float, float]:
+        """Move to `setting` and integrate, retrying transient failures, return the counts and the time of each."""
+        for attempt in itertools.count():
+            if stop is not None and stop.is_set():
+                raise SweepCancelledError
+            try:
+                move_start = time.perf_counter()
+                if self._move(pool, setting.angles, positions):
+                    time.sleep(self.settle_s)
+                measure_start = time.perf_counter()
+                counts = int(
+                    self.tagger.measure_correlation(
+                        self.config.channel1, self.config.channel2, integration_time_s, self.config.binwidth_ps
+                    )
+                )
+            except RETRIED_ERRORS:
+                if attempt >= self.retries:
+                    raise
+                delay_s = self.backoff_s * 2**attempt
+                logger.warning(
+                    "Setting %s failed, retry %d of %d in %.1f s",
+                    setting.label or setting.angles,
+                    attempt + 1,
+                    self.retries,
+                    delay_s,
+                    exc_info=True,
+                )
+                if stop is None:
+                    time.sleep(delay_s)
+                else:
+                    stop.wait(delay_s)
+            else:
+                return counts, measure_start - move_start, time.perf_counter() - measure_start
+        raise AssertionError  # pragma: no cover
+
+    def _move(self, pool: ThreadPoolExecutor, angles: Mapping[str, float], positions: dict[str, float]) -> bool:
+        """
+        Move the motors that are not at `angles` at the same time, and return whether any moved.
+
+        A motor whose move fails is forgotten, the next attempt moves it again.
+        """
+        moves = {motor: angle for motor, angle in angles.items() if positions.get(motor) != angle}
+        futures = {motor: pool.submit(self.motors[motor].move_to, moves[motor]) for motor in moves}
+        wait(futures.values())
+        for motor, future in futures.items():
+            if future.exception() is None:
+                positions[motor] = moves[motor]
+            else:
+                positions.pop(motor, None)
+        for future in futures.values():
+            future.result()
+        return bool(moves)
+
+    def _results_array(self, settings: Sequence[SweepSetting], results: list[StoredCounts]) -> npt.NDArray[np.void]:
+        motors = sorted({motor for setting in settings for motor in setting.angles})
+        label_length = max([1, *(len(setting.label) for setting in settings)])
+        dtype = np.dtype(
+            [
+                ("index", np.int64),
+                ("label", f"U{label_length}"),
+                *((motor, np.float64) for motor in motors),
+                ("counts", np.int64),
+                ("integration_time_s", np.float64),
+                ("integrations", np.int64),
+            ]
+        )
+        array = np.zeros(len(settings), dtype=dtype)
+        for index, (setting, result) in enumerate(zip(settings, results, strict=True)):
+            array[index] = (
+                index,
+                setting.label,
+                *(setting.angles.get(motor, np.nan) for motor in motors),
+                result.counts,
+                result.integration_time_s,
+                result.integrations,
+            )
+        return array
+
+
+def _no_error(_: list[StoredCounts]) -> float:
+    return 0.0
+
+
+def _move_degrees(
+    positions: Mapping[str, float], angles: Mapping[str, float], periods: Mapping[str, float | None]
+) -> float:
+    largest = 0.0
+    for motor, angle in angles.items():
+        distance = abs(angle - positions[motor])
+        period = periods[motor]
+        if period:
+            distance %= period
+            distance = min(distance, period - distance)
+        largest = max(largest, distance)
+    return largest
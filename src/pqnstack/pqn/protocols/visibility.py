@@ -1,10 +1,21 @@
+import logging
 import math
-import time
+from pathlib import Path
 from typing import Any
 
 from pqnstack.base.instrument import RotatorInstrument
 from pqnstack.constants import MeasurementBasis
 from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.measurement_store import StoredCounts
+from pqnstack.pqn.protocols.measurement_store import count_rates
+from pqnstack.pqn.protocols.statistics import rate_visibility
+from pqnstack.pqn.protocols.sweep import Sweep
+from pqnstack.pqn.protocols.sweep import SweepCheckpoint
+from pqnstack.pqn.protocols.sweep import basis_settings
+from pqnstack.pqn.protocols.sweep import stored_counts
+
+logger = logging.getLogger(__name__)
 
 
 class Devices:
@@ -16,62 +27,30 @@ def measure_visibility(
     devices: Devices,
     basis: MeasurementBasis,
     config: MeasurementConfig,
+    store: MeasurementStore | None = None,
+    checkpoint: SweepCheckpoint | str | Path | None = None,
 ) -> tuple[float, float]:
-    coincidence_counts: dict[tuple[str, str], int] = {}
-
-    for pair in basis.pairs:
-        coincidence_counts[pair] = move_and_measure(
-            devices,
-            pair[0],
-            pair[1],
-            basis.settings,
-            config,
-        )
-
-    return calculate_visibility(coincidence_counts, basis.pairs)
-
-
-def move_and_measure(
-    devices: Devices,
-    s_state: str,
-    i_state: str,
-    settings: dict[str, tuple[float, float]],
-    config: MeasurementConfig,
-) -> int:
-    if s_state not in settings or i_state not in settings:
-        msg = f"State {s_state} or {i_state} is not defined in settings."
-        raise KeyError(msg)
-
-    for motor_key, angle in [("signal_hwp", settings[s_state][0]), ("idler_hwp", settings[i_state][0])]:
-        if motor_key in devices.motors:
-            devices.motors[motor_key].move_to(angle)
-
-    if "signal_qwp" in devices.motors or "idler_qwp" in devices.motors:
-        for motor_key, angle in [("signal_qwp", settings[s_state][1]), ("idler_qwp", settings[i_state][1])]:
-            if motor_key in devices.motors:
-                devices.motors[motor_key].move_to(angle)
-
-    time.sleep(2)
-    return int(
-        devices.tagger.measure_correlation(
-            config.channel1, config.channel2, config.binwidth_ps, config.integration_time_s
-        )
+    """
+    Measure the visibility of `basis` and its error, reusing the settings `store` already holds.
+
+    With `config.target_error` the settings are integrated until the error of the visibility reaches it. With a
+    `checkpoint` a run that failed picks up from the integrations it recorded when run again.
+    """
+    sweep = Sweep(devices.motors, devices.tagger, config, store, checkpoint=checkpoint)
+
+    def error(results: list[StoredCounts]) -> float:
+        rates, variances = count_rates(results)
+        if max(rates) == 0:
+            return math.inf
+        return rate_visibility(rates, variances)[1]
+
+    results = stored_counts(sweep.run(basis_settings(basis, devices.motors), error))
+    logger.info(
+        "Visibility of the %s basis integrated for %.1f s",
+        basis.name,
+        sum(result.integration_time_s for result in results),
     )
-
-
-def calculate_visibility(
-    coincidence_counts: dict[tuple[str, str], int],
-    pairs: list[tuple[str, str]],
-) -> tuple[float, float]:
-    c_values = [coincidence_counts[pair] for pair in pairs]
-    c_max, c_min = max(c_values), min(c_values)
-
-    denominator = (c_max + c_min) ** 2
-    if denominator == 0:
-        return 0.0, 0.0
-
-    c_err = 2 * math.sqrt((c_min**2) * c_max + (c_max**2) * c_min) / denominator
-    return (c_max - c_min) / (c_max + c_min), c_err
+    return rate_visibility(*count_rates(results))
 
 
 """
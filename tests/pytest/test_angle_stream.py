@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pqnstack.app.api.routes.serial import AngleBroadcaster
+from pqnstack.app.api.routes.serial import AngleSample
+from pqnstack.app.api.routes.serial import get_angle_broadcaster
+from pqnstack.app.api.routes.serial import router
+from pqnstack.app.core.config import AngleStreamSettings
+from pqnstack.pqn.drivers.rotaryencoder import MockRotaryEncoder
+
+
+class CountingEncoder(MockRotaryEncoder):
+    reads: int = 0
+
+    def read(self) -> float:
+        self.reads += 1
+        return self.theta
+
+
+async def collect(broadcaster: AngleBroadcaster, duration_s: float, max_rate_hz: float | None = None) -> list[float]:
+    thetas: list[float] = []
+
+    async def consume() -> None:
+        async for sample in broadcaster.stream(max_rate_hz):
+            thetas.append(sample.theta)  # noqa: PERF401
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(duration_s)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return thetas
+
+
+def test_deadband_filters_small_changes() -> None:
+    encoder = MockRotaryEncoder()
+    broadcaster = AngleBroadcaster(encoder, AngleStreamSettings(sample_rate_hz=200, deadband_degrees=1.0))
+
+    async def scenario() -> list[float]:
+        collecting = asyncio.create_task(collect(broadcaster, 0.4))
+        for theta in (0.5, 0.9, 2.0, 2.5, 10.0):
+            await asyncio.sleep(0.05)
+            encoder.theta = theta
+        return await collecting
+
+    assert asyncio.run(scenario()) == [0.0, 2.0, 10.0]
+
+
+def test_clients_share_one_sampler_and_throttle_independently() -> None:
+    encoder = CountingEncoder()
+    stream_settings = AngleStreamSettings(sample_rate_hz=100, deadband_degrees=0.0, max_client_rate_hz=50)
+    broadcaster = AngleBroadcaster(encoder, stream_settings)
+
+    async def scenario() -> tuple[list[float], list[float]]:
+        async def turn() -> None:
+            for _ in range(100):
+                encoder.theta += 1
+                await asyncio.sleep(0.005)
+
+        fast, slow, _ = await asyncio.gather(
+            collect(broadcaster, 0.6, max_rate_hz=1000), collect(broadcaster, 0.6, max_rate_hz=5), turn()
+        )
+        return fast, slow
+
+    fast, slow = asyncio.run(scenario())
+    # Both clients sampled from the same loop, about 60 reads in 0.6 s instead of one loop per client.
+    assert encoder.reads < 80  # noqa: PLR2004
+    # The fast client is capped by the server maximum, the slow one by its own rate.
+    assert 10 < len(fast) <= 31  # noqa: PLR2004
+    assert 1 < len(slow) <= 4  # noqa: PLR2004
+    assert fast == sorted(fast)
+    assert slow == sorted(slow)
+    # The sampler stops with the last client.
+    assert broadcaster.latest is None
+
+
+def test_keepalive_resends_latest_angle() -> None:
+    encoder = MockRotaryEncoder(theta=42.0)
+    broadcaster = AngleBroadcaster(encoder, AngleStreamSettings(sample_rate_hz=100, keepalive_s=0.1))
+
+    thetas = asyncio.run(collect(broadcaster, 0.35))
+
+    assert thetas[0] == 42.0  # noqa: PLR2004
+    assert len(thetas) >= 3  # noqa: PLR2004
+    assert set(thetas) == {42.0}
+
+
+def test_sample_serializes_to_json() -> None:
+    assert AngleSample(theta=1.5, timestamp=2.0).model_dump() == {"theta": 1.5, "timestamp": 2.0}
+
+
+@pytest.mark.parametrize("max_rate_hz", [0, -5])
+def test_events_reject_non_positive_rates(max_rate_hz: float) -> None:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_angle_broadcaster] = lambda: AngleBroadcaster(CountingEncoder(), AngleStreamSettings())
+
+    response = TestClient(app).get("/serial/events", params={"max_rate_hz": max_rate_hz})
+
+    assert response.status_code == 422  # noqa: PLR2004
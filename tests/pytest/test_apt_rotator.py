@@ -0,0 +1,115 @@
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from pqnstack.base.errors import MotionStalledError
+from pqnstack.base.errors import MotionTimeoutError
+from pqnstack.pqn.drivers.apt_simulator import SimulatedAPTDevice
+from pqnstack.pqn.drivers.rotator import APTRotator
+
+
+@pytest.fixture
+def rotator() -> Iterator[APTRotator]:
+    rotator = APTRotator(name="hwp", desc="", hw_address="", simulated=True, stall_timeout_s=0.3)
+    rotator.start()
+    yield rotator
+    rotator.close()
+
+
+def device_of(rotator: APTRotator) -> SimulatedAPTDevice:
+    device = rotator._device  # noqa: SLF001
+    assert isinstance(device, SimulatedAPTDevice)
+    return device
+
+
+def test_move_finishes_with_the_travel(rotator: APTRotator) -> None:
+    device = device_of(rotator)
+    # 45 degrees at 90 degrees/s
+    start = time.perf_counter()
+    rotator.degrees = 45
+    elapsed = time.perf_counter() - start
+
+    assert rotator.degrees == 45  # noqa: PLR2004
+    assert abs(device.status["position"] - 86384) <= 1
+    assert 0.5 <= elapsed < 0.7  # noqa: PLR2004
+
+
+def test_small_moves_have_no_fixed_delay(rotator: APTRotator) -> None:
+    rotator.degrees = 1
+    start = time.perf_counter()
+    for i in range(10):
+        rotator.degrees = 1 + (i + 1) * 0.5
+    per_move = (time.perf_counter() - start) / 10
+
+    # 0.5 degrees take 6 ms to travel, the status updates come every 10 ms.
+    assert per_move < 0.05  # noqa: PLR2004
+
+
+def test_stalled_motor_stops_and_raises(rotator: APTRotator) -> None:
+    device = device_of(rotator)
+    device.jammed = True
+
+    with pytest.raises(MotionStalledError):
+        rotator.degrees = 90
+
+    # The move was cancelled, the motor does not pick it up again when it frees up.
+    position = device.status["position"]
+    device.jammed = False
+    time.sleep(0.05)
+    assert device.status["position"] == position
+    assert not device.status["moving_forward"]
+
+
+def test_slow_move_times_out(rotator: APTRotator) -> None:
+    rotator.move_timeout_s = 0.2
+
+    with pytest.raises(MotionTimeoutError):
+        rotator.degrees = 90
+
+
+def test_failed_move_tracks_the_actual_position(rotator: APTRotator) -> None:
+    device = device_of(rotator)
+    rotator.degrees = 30
+    device.jammed = True
+
+    with pytest.raises(MotionStalledError):
+        rotator.degrees = 90
+
+    assert rotator.degrees == pytest.approx(30, abs=0.01)
+    assert rotator.degrees == pytest.approx(device.status["position"] / 1919.64, abs=0.01)
+
+
+@pytest.mark.parametrize(
+    ("period", "start", "angle", "expected"),
+    [
+        (None, 350, 10, 10),
+        (360, 350, 10, 370),
+        (360, 10, 350, -10),
+        (180, 170, 10, 190),
+        (180, 100, 10, 10),
+        (180, 370, 0, 360),
+    ],
+)
+def test_move_to_takes_the_shortest_path(
+    rotator: APTRotator, period: float | None, start: float, angle: float, expected: float
+) -> None:
+    device_of(rotator).velocity_eu_per_s *= 20
+    rotator.degrees = start
+    rotator.period_degrees = period
+
+    assert rotator.move_to(angle) == pytest.approx(expected)
+    assert rotator.degrees == pytest.approx(expected)
+
+
+def test_wrapping_moves_are_short(rotator: APTRotator) -> None:
+    rotator.period_degrees = 360
+    device_of(rotator).velocity_eu_per_s *= 20
+    rotator.degrees = 355
+    device_of(rotator).velocity_eu_per_s /= 20
+    positions = [rotator.move_to(angle) for angle in (5, 355, 5, 355)]
+
+    # Four 10 degree moves back and forth across 360 instead of four 350 degree ones.
+    assert positions == pytest.approx([365, 355, 365, 355])
+    assert device_of(rotator).status["position"] / 1919.64 == pytest.approx(355, abs=0.01)
+    assert rotator.move_by(-20) == pytest.approx(335)
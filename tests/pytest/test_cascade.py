@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from pqnstack.pqn.protocols.cascade import CascadeReconciler
+from pqnstack.pqn.protocols.cascade import CascadeResponder
+from pqnstack.pqn.protocols.cascade import cascade_corrector
+from pqnstack.pqn.protocols.qkd import amplify
+from pqnstack.pqn.protocols.qkd import distill_key
+from pqnstack.pqn.protocols.qkd import secure_key_length
+from pqnstack.pqn.protocols.qkd import toeplitz_amplifier
+
+
+def _noisy_keys(n_bits: int, qber: float, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    reference = rng.integers(0, 2, n_bits, dtype=np.uint8)
+    noisy = reference ^ (rng.random(n_bits) < qber).astype(np.uint8)
+    return reference, noisy
+
+
+@pytest.mark.parametrize(("n_bits", "qber"), [(1, 0.0), (500, 0.05), (20_000, 0.02), (20_000, 0.1)])
+def test_cascade_reconciles_keys(n_bits: int, qber: float) -> None:
+    reference, noisy = _noisy_keys(n_bits, qber, n_bits)
+    responder = CascadeResponder(reference, seed=3)
+
+    result = CascadeReconciler(noisy, qber, seed=3).run(responder.parities)
+
+    assert result.converged
+    np.testing.assert_array_equal(result.key, reference)
+    assert result.corrected_bits == np.count_nonzero(noisy != reference)
+    assert result.leaked_bits <= n_bits
+
+
+def test_cascade_stops_at_round_budget() -> None:
+    reference, noisy = _noisy_keys(10_000, 0.05, 0)
+    result = CascadeReconciler(noisy, 0.05, seed=1, max_rounds=3).run(CascadeResponder(reference, seed=1).parities)
+
+    assert not result.converged
+    assert result.rounds == 3  # noqa: PLR2004
+
+
+def test_distilled_keys_match() -> None:
+    reference, noisy = _noisy_keys(50_000, 0.03, 5)
+    responder = CascadeResponder(reference, seed=9)
+
+    leader_key = distill_key(noisy, 0.03, cascade_corrector(responder.parities, seed=9), toeplitz_amplifier(seed=11))
+    follower_key = amplify(reference, len(leader_key), seed=11)
+
+    assert 0 < len(leader_key) < len(reference)
+    np.testing.assert_array_equal(leader_key, follower_key)
+
+
+def test_secure_key_length() -> None:
+    assert secure_key_length(1000, 0.5, 0) == 0
+    assert secure_key_length(10_000, 0.0, 1000, security_parameter=2**-10) == 10_000 - 1000 - 20
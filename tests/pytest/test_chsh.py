@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from pqnstack.app.api.routes import chsh
+from pqnstack.app.core.config import NodeState
+from pqnstack.app.core.config import get_state
+
+
+class FlakyHwp:
+    def __init__(self, *, fails: bool) -> None:
+        self.fails = fails
+        self.angles: list[float] = []
+
+    def move_to(self, angle: float) -> None:
+        if self.fails:
+            raise TimeoutError
+        self.angles.append(angle)
+
+
+def test_request_hwp_is_resolved_again_after_a_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    hwps = [FlakyHwp(fails=True), FlakyHwp(fails=False)]
+    resolved = iter(hwps)
+    monkeypatch.setattr(chsh, "_get_request_hwp", lambda: next(resolved))
+    state = NodeState(chsh_request_schedule=[22.5, 112.5])
+    app = FastAPI()
+    app.include_router(chsh.router)
+    app.dependency_overrides[get_state] = lambda: state
+    client = TestClient(app, raise_server_exceptions=False)
+
+    failed = client.post("/chsh/request-angle-by-step", params={"step": 0})
+    assert state.chsh_request_hwp is None
+    moved = client.post("/chsh/request-angle-by-step", params={"step": 1})
+
+    assert failed.status_code == 500  # noqa: PLR2004
+    assert moved.status_code == 200  # noqa: PLR2004
+    assert state.chsh_request_hwp is hwps[1]
+    assert hwps[1].angles == [112.5 / 2]
+    # The proxy lives in the app's state and is never sent to clients.
+    assert "chsh_request_hwp" not in state.model_dump()
+
+
+def move_follower(*statuses: int) -> tuple[list[int], float | HTTPException]:
+    """Run `_move_follower` against a follower answering with `statuses` in turn."""
+    replies = iter(statuses)
+    requests: list[int] = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(int(request.url.params["step"]))
+        return httpx.Response(next(replies), json=0.5)
+
+    async def scenario() -> float | HTTPException:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as http_client:
+            try:
+                move_s: float = await chsh._move_follower(http_client, "follower", 3)  # noqa: SLF001
+            except HTTPException as e:
+                return e
+            return move_s
+
+    return requests, asyncio.run(scenario())
+
+
+def test_follower_move_is_retried_once_after_a_server_error() -> None:
+    assert move_follower(503, 200) == ([3, 3], 0.5)
+
+    requests, result = move_follower(500, 500)
+    assert requests == [3, 3]
+    assert isinstance(result, HTTPException)
+    assert result.status_code == 500  # noqa: PLR2004
+
+
+def test_follower_rejecting_a_step_is_a_conflict() -> None:
+    requests, result = move_follower(400)
+
+    assert requests == [3]
+    assert isinstance(result, HTTPException)
+    assert result.status_code == 409  # noqa: PLR2004
@@ -0,0 +1,111 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+
+from pqnstack.constants import DA_BASIS
+from pqnstack.constants import HV_BASIS
+from pqnstack.pqn.drivers.polarization_simulator import DEFAULT_COMPENSATORS
+from pqnstack.pqn.drivers.polarization_simulator import SimulatedPolarizationTagger
+from pqnstack.pqn.protocols.compensation import CompensationStep
+from pqnstack.pqn.protocols.compensation import PolarizationCompensator
+from pqnstack.pqn.protocols.compensation import chsh_objective
+from pqnstack.pqn.protocols.compensation import visibility_objective
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.sweep import basis_settings
+
+COMPENSATORS = [name for name, _ in DEFAULT_COMPENSATORS]
+
+
+@dataclass
+class FakeMotor:
+    degrees: float = 0.0
+
+    def move_to(self, angle: float) -> float:
+        self.degrees = angle
+        return angle
+
+
+def make_setup(seed: int) -> tuple[dict[str, FakeMotor], SimulatedPolarizationTagger]:
+    motors = {name: FakeMotor() for name in ["signal_hwp", "idler_hwp", *COMPENSATORS]}
+    return motors, SimulatedPolarizationTagger(motors, seed=seed)
+
+
+def true_visibility(motors: dict[str, FakeMotor], tagger: SimulatedPolarizationTagger) -> float:
+    """Mean HV and DA visibility of the expected rates, without counting noise."""
+    visibilities = []
+    for basis in (HV_BASIS, DA_BASIS):
+        rates = []
+        for setting in basis_settings(basis, ["signal_hwp", "idler_hwp"]):
+            for motor, angle in setting.angles.items():
+                motors[motor].degrees = angle
+            rates.append(tagger.coincidence_rate_hz())
+        visibilities.append((max(rates) - min(rates)) / (max(rates) + min(rates)))
+    return float(np.mean(visibilities))
+
+
+def test_aligned_fiber_gives_the_visibility_of_the_source() -> None:
+    motors, tagger = make_setup(seed=0)
+    tagger.fiber = np.eye(2, dtype=np.complex128)
+
+    assert true_visibility(motors, tagger) == pytest.approx(0.976, abs=1e-3)
+
+
+def test_compensation_recovers_the_visibility() -> None:
+    motors, tagger = make_setup(seed=1)
+    assert true_visibility(motors, tagger) < 0.5  # noqa: PLR2004
+    config = MeasurementConfig(integration_time_s=0.2, target_error=0.005)
+    compensator = PolarizationCompensator(
+        motors, tagger, config, COMPENSATORS, visibility_objective(motors), settle_s=0
+    )
+
+    result = compensator.run()
+
+    # A grid scan of the 3 compensators every 15 degrees takes 1728 evaluations.
+    assert result.evaluations <= 150  # noqa: PLR2004
+    assert [motors[name].degrees for name in COMPENSATORS] == list(result.angles.values())
+    assert true_visibility(motors, tagger) > 0.96  # noqa: PLR2004
+    assert result.value == pytest.approx(true_visibility(motors, tagger), abs=0.02)
+
+
+def test_chsh_objective_reaches_a_violation() -> None:
+    motors, tagger = make_setup(seed=2)
+    config = MeasurementConfig(integration_time_s=0.5, target_error=0.02)
+    objective = chsh_objective(motors, [0, 45], [22.5, 67.5])
+    compensator = PolarizationCompensator(motors, tagger, config, COMPENSATORS, objective, settle_s=0)
+
+    result = compensator.run()
+
+    assert len(objective.settings) == 16  # noqa: PLR2004
+    assert result.value > 2.6  # noqa: PLR2004
+
+
+def test_stop_returns_the_best_angles_so_far() -> None:
+    motors, tagger = make_setup(seed=3)
+    config = MeasurementConfig(integration_time_s=0.2)
+    compensator = PolarizationCompensator(
+        motors, tagger, config, COMPENSATORS, visibility_objective(motors), settle_s=0
+    )
+    stop = threading.Event()
+    steps: list[CompensationStep] = []
+
+    def progress(step: CompensationStep) -> None:
+        steps.append(step)
+        if len(steps) == 5:  # noqa: PLR2004
+            stop.set()
+
+    result = compensator.run(progress=progress, stop=stop)
+
+    assert result.evaluations == 5  # noqa: PLR2004
+    assert result.value == max(step.value for step in steps)
+
+
+def test_fit_needs_enough_points() -> None:
+    motors, tagger = make_setup(seed=0)
+    compensator = PolarizationCompensator(
+        motors, tagger, MeasurementConfig(integration_time_s=1), COMPENSATORS, visibility_objective(motors), settle_s=0
+    )
+
+    with pytest.raises(ValueError, match="at least 5 points"):
+        compensator.run(points=3)
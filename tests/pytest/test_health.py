@@ -0,0 +1,138 @@
+import asyncio
+import math
+import threading
+import time
+from functools import partial
+from typing import Any
+
+import pytest
+
+from pqnstack.app.api.routes import health
+from pqnstack.app.api.routes.health import HealthMonitor
+from pqnstack.app.core.config import HealthSettings
+from pqnstack.pqn.drivers.rotaryencoder import SerialRotaryEncoder
+
+
+class FakeClient:
+    instances: list["FakeClient"] = []  # noqa: RUF012
+    release = threading.Event()
+
+    def __init__(self, **_: Any) -> None:
+        self.blocks = not self.instances
+        self.disconnected = False
+        self.instances.append(self)
+
+    def get_available_devices(self, _: str) -> dict[str, str]:
+        if self.blocks:
+            self.release.wait(5)
+        return {"motor": "APTRotator"}
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+
+
+def test_timed_out_probe_client_is_replaced_and_closed_when_the_probe_returns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(health, "Client", FakeClient)
+    monitor = HealthMonitor(HealthSettings())
+    pairs = [("motor", "tests")]
+
+    async def probe() -> list[health.DeviceStatus]:
+        statuses: list[health.DeviceStatus] = await health._with_deadline(  # noqa: SLF001
+            partial(monitor._probe_provider, "provider", pairs),  # noqa: SLF001
+            0.1,
+            partial(health._unreachable_devices, pairs, "provider"),  # noqa: SLF001
+            partial(monitor._abandon_client, "provider"),  # noqa: SLF001
+        )
+        return statuses
+
+    async def scenario() -> tuple[bool, bool]:
+        first = await probe()
+        second = await probe()
+        disconnected_while_blocked = FakeClient.instances[0].disconnected
+        FakeClient.release.set()
+        await asyncio.sleep(0.1)
+        return not first[0].reachable and second[0].reachable, disconnected_while_blocked
+
+    outcomes, disconnected_while_blocked = asyncio.run(scenario())
+
+    abandoned, replacement = FakeClient.instances
+    assert outcomes
+    assert not disconnected_while_blocked
+    assert abandoned.disconnected
+    assert not replacement.disconnected
+    assert monitor._clients == {"provider": replacement}  # noqa: SLF001
+
+
+def counting_monitor(monkeypatch: pytest.MonkeyPatch, probe_s: float = 0.0) -> tuple[HealthMonitor, list[float]]:
+    """Monitor whose local probes only count how often they run, taking `probe_s` each."""
+    monitor = HealthMonitor(HealthSettings(monitor_interval_s=0, max_age_s=60))
+    probes: list[float] = []
+
+    async def probe_local() -> health._LocalHealth:
+        probes.append(time.monotonic())
+        await asyncio.sleep(probe_s)
+        return health._LocalHealth(router=health.ComponentStatus(reachable=True), devices=[], rotary_encoder=None)  # noqa: SLF001
+
+    monkeypatch.setattr(monitor, "_probe_local", probe_local)
+    return monitor, probes
+
+
+def test_reports_are_cached_until_they_are_too_old(monkeypatch: pytest.MonkeyPatch) -> None:
+    monitor, probes = counting_monitor(monkeypatch)
+
+    async def scenario() -> list[health.HealthStatus]:
+        return [await monitor.status(), await monitor.status(), await monitor.status(max_age_s=0)]
+
+    first, cached, fresh = asyncio.run(scenario())
+
+    assert len(probes) == 2  # noqa: PLR2004
+    assert first.router.reachable
+    assert cached.age_s >= first.age_s
+    assert fresh.age_s < cached.age_s
+
+
+def test_concurrent_requests_share_the_running_probe(monkeypatch: pytest.MonkeyPatch) -> None:
+    monitor, probes = counting_monitor(monkeypatch, probe_s=0.1)
+
+    async def scenario() -> list[health.HealthStatus]:
+        return await asyncio.gather(*(monitor.status(max_age_s=0) for _ in range(5)))
+
+    reports = asyncio.run(scenario())
+
+    assert len(probes) == 1
+    assert all(report.router.reachable for report in reports)
+
+
+def test_probes_past_their_deadline_report_a_timeout() -> None:
+    async def scenario() -> tuple[health.ComponentStatus, float]:
+        start = time.monotonic()
+        status: health.ComponentStatus = await health._with_deadline(  # noqa: SLF001
+            partial(time.sleep, 1),
+            0.05,
+            lambda e: health.ComponentStatus(reachable=False, error=e),
+        )
+        return status, time.monotonic() - start
+
+    status, elapsed_s = asyncio.run(scenario())
+
+    assert not status.reachable
+    assert status.error == "probe timed out after 0.05 s"
+    assert elapsed_s < 0.5  # noqa: PLR2004
+
+
+@pytest.mark.parametrize(("sample_age_s", "reachable"), [(0.1, True), (5.0, False), (math.inf, False)])
+def test_rotary_encoder_is_probed_through_its_latest_sample(
+    monkeypatch: pytest.MonkeyPatch,
+    sample_age_s: float,
+    reachable: bool,  # noqa: FBT001
+) -> None:
+    # Never opens a port, the probe must not open one either.
+    encoder = object.__new__(SerialRotaryEncoder)
+    encoder._sampled_at = time.monotonic() - sample_age_s  # noqa: SLF001
+    monkeypatch.setattr(health, "get_rotary_encoder", lambda: encoder)
+    monkeypatch.setattr(health.settings, "virtual_rotator", False)
+
+    status = health._probe_rotary_encoder(max_sample_age_s=1.0)  # noqa: SLF001
+
+    assert status is not None
+    assert status.reachable is reachable
@@ -0,0 +1,79 @@
+import logging
+from collections.abc import Iterator
+
+import pytest
+
+from pqnstack.base import instrument
+from pqnstack.base.instrument import LogPolicy
+from pqnstack.base.instrument import set_log_policy
+from pqnstack.pqn.drivers.dummies import DummyInstrument
+
+
+class Unformattable:
+    def __repr__(self) -> str:
+        pytest.fail("Call arguments should not be formatted while the log level is disabled")
+
+
+@pytest.fixture(autouse=True)
+def reset_policies() -> Iterator[None]:
+    yield
+    set_log_policy(LogPolicy())
+    instrument._log_policies.clear()  # noqa: SLF001
+    instrument._call_summaries.clear()  # noqa: SLF001
+    instrument._last_record_time.clear()  # noqa: SLF001
+
+
+@pytest.fixture
+def dummy() -> DummyInstrument:
+    return DummyInstrument(name="dummy", desc="", hw_address="")
+
+
+def records(caplog: pytest.LogCaptureFixture) -> list[str]:
+    return [r.getMessage() for r in caplog.records if r.name == instrument.__name__]
+
+
+def test_aggregate_every(caplog: pytest.LogCaptureFixture, dummy: DummyInstrument) -> None:
+    set_log_policy(LogPolicy(aggregate_every=10))
+    with caplog.at_level(logging.INFO):
+        for _ in range(25):
+            _ = dummy.param_int
+
+    messages = records(caplog)
+    assert len(messages) == 2  # noqa: PLR2004
+    assert "'param_int' called 10 times" in messages[0]
+    assert "got read with value 2" in messages[0]
+
+
+def test_rate_limit(caplog: pytest.LogCaptureFixture, dummy: DummyInstrument) -> None:
+    set_log_policy(LogPolicy(max_per_second=1e-3))
+    with caplog.at_level(logging.INFO):
+        for _ in range(5):
+            dummy.param_int = 3
+    set_log_policy(LogPolicy())
+    with caplog.at_level(logging.INFO):
+        _ = dummy.param_int
+
+    messages = records(caplog)
+    assert len(messages) == 2  # noqa: PLR2004
+    assert "got updated to '(3,)'" in messages[0]
+    # The suppressed writes show up in the summary of the next record.
+    assert "'param_int' called 5 times" in messages[1]
+
+
+def test_disabled_level_does_not_format(caplog: pytest.LogCaptureFixture, dummy: DummyInstrument) -> None:
+    set_log_policy(LogPolicy(level=logging.DEBUG))
+    with caplog.at_level(logging.INFO):
+        dummy.param_str = Unformattable()  # type: ignore[assignment]
+    assert records(caplog) == []
+
+
+def test_per_instrument_policy(caplog: pytest.LogCaptureFixture, dummy: DummyInstrument) -> None:
+    other = DummyInstrument(name="other", desc="", hw_address="")
+    set_log_policy(LogPolicy(level=logging.DEBUG), instrument="dummy")
+    with caplog.at_level(logging.INFO):
+        _ = dummy.param_bool
+        _ = other.param_bool
+
+    messages = records(caplog)
+    assert len(messages) == 1
+    assert messages[0].startswith("other, DummyInstrument |")
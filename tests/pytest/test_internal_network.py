@@ -8,11 +8,16 @@ from typing import Any
 
 import pytest
 
+from pqnstack.base.errors import MotionTimeoutError
 from pqnstack.network.client import Client
 from pqnstack.network.client import ProxyInstrument
+from pqnstack.network.client import TelemetryClient
 from pqnstack.network.packet import Packet
 from pqnstack.network.packet import PacketIntent
 from pqnstack.pqn.drivers.dummies import DummyInstrument
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.sweep import Sweep
+from pqnstack.pqn.protocols.sweep import SweepSetting
 
 logger = logging.getLogger(__name__)
 
@@ -101,7 +106,7 @@ def test_getting_all_instruments() -> None:
 
     response = client.get_available_devices("pqnstack-provider")
 
-    instruments_names = ["dummy1", "dummy2"]
+    instruments_names = ["dummy1", "dummy2", "hwp"]
 
     assert instruments_names == list(response.keys())
     # Get available devices returns the __class__ of the instrument as the value.
@@ -140,3 +145,113 @@ def test_proxy_instrument() -> None:
         fail_flag = True
 
     assert fail_flag, "Should not be able to set new attributes on the ProxyInstrument"
+
+
+def test_telemetry() -> None:
+    client = Client(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    proxy_instrument = client.get_device("pqnstack-provider", "dummy2")
+    proxy_instrument.double_int()
+
+    telemetry_client = TelemetryClient(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    assert telemetry_client.telemetry_port == 5557  # noqa: PLR2004
+
+    history = telemetry_client.history("pqnstack-provider")
+    assert history
+    assert all(snapshot.provider == "pqnstack-provider" for snapshot in history)
+
+    # The next beat carries the call made above.
+    telemetry_client.subscribe("pqnstack-provider")
+    snapshot = telemetry_client.receive(timeout_ms=5000)
+    assert snapshot is not None
+    assert snapshot.instruments["dummy2"].calls >= 1
+    assert snapshot.instruments["dummy2"].errors == 0
+    assert sum(snapshot.instruments["dummy2"].latency_counts) == snapshot.instruments["dummy2"].calls
+    telemetry_client.disconnect()
+
+
+def test_cached_parameters() -> None:
+    client = Client(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    cached = client.get_device("pqnstack-provider", "dummy2", cache_ttl_s={"param_str": 60, "info": 60})
+    other = client.get_device("pqnstack-provider", "dummy2")
+    assert isinstance(cached, ProxyInstrument)
+
+    first = cached.read_parameter("param_str")
+    assert cached.read_parameter("param_str") is first
+    assert cached.read_parameter("param_str", max_age_s=0) is not first
+    assert cached.info is cached.info
+
+    # Writes through the proxy drop its own reading right away.
+    cached.param_str = "cached"
+    assert cached.param_str == "cached"
+
+    # Writes from other clients are published by the provider.
+    other.param_str = "pushed"
+    deadline = time.monotonic() + 5
+    while cached.param_str != "pushed" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert cached.param_str == "pushed"
+    assert cached.read_parameter("param_str").age_s < 60  # noqa: PLR2004
+
+
+def test_state_notifications() -> None:
+    client = Client(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    client.subscribe("pqnstack-provider", "dummy1")
+    # Subscriptions reach the provider asynchronously.
+    time.sleep(0.5)
+
+    proxy_instrument = client.get_device("pqnstack-provider", "dummy1")
+    assert proxy_instrument.observables == {"param_int", "uppercase_str"}
+    proxy_instrument.param_int = 7
+    proxy_instrument.double_int()
+    proxy_instrument.uppercase_str()
+    proxy_instrument.param_bool = False
+
+    changes = []
+    while (change := client.receive_state(timeout_ms=2000)) is not None:
+        changes.append(change)
+    assert [(c.instrument, c.name, c.value) for c in changes] == [
+        ("dummy1", "param_int", 7),
+        ("dummy1", "param_int", 14),
+        ("dummy1", "uppercase_str", "HELLO"),
+    ]
+    client.disconnect()
+
+
+def test_client_recovers_from_a_timeout() -> None:
+    client = Client(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    proxy_instrument = client.get_device("pqnstack-provider", "dummy1", timeout_ms=1000)
+    param_bool = proxy_instrument.param_bool
+
+    # Toggling takes 1.4 s, the reply comes after the client gave up on it.
+    with pytest.raises(TimeoutError):
+        proxy_instrument.toggle_bool()
+
+    # The late reply of the toggle, a bool, does not answer the next request.
+    assert proxy_instrument.param_str in {"hello", "HELLO"}
+    assert proxy_instrument.param_bool is not param_bool
+    proxy_instrument.close()
+    client.disconnect()
+
+
+class ConstantTagger:
+    def measure_correlation(self, start_ch: int, stop_ch: int, integration_time_s: float, binwidth_ps: int) -> int:  # noqa: ARG002
+        return round(100 * integration_time_s)
+
+
+def test_sweep_retries_remote_motion_errors() -> None:
+    client = Client(host="localhost", port=5556, router_name="pqnstack-router", timeout=1000)
+    hwp = client.get_device("pqnstack-provider", "hwp", timeout_ms=5000)
+    config = MeasurementConfig(integration_time_s=0.1)
+
+    # The provider gives moves 0.5 s, about 45 degrees, and stops the motor where it is after that.
+    with pytest.raises(MotionTimeoutError):
+        Sweep({"hwp": hwp}, ConstantTagger(), config, settle_s=0, retries=0).run([SweepSetting({"hwp": 80})])
+
+    target = hwp.degrees + 80
+    sweep = Sweep({"hwp": hwp}, ConstantTagger(), config, settle_s=0, retries=2, backoff_s=0)
+    results = sweep.run([SweepSetting({"hwp": target})])
+
+    assert hwp.degrees == pytest.approx(target, abs=0.1)
+    assert results["counts"].tolist() == [10]
+    hwp.close()
+    client.disconnect()
@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from dataclasses import field
+
+import pytest
+
+from pqnstack.pqn.protocols import chsh
+from pqnstack.pqn.protocols import measurement_store
+from pqnstack.pqn.protocols import sweep
+from pqnstack.pqn.protocols import visibility
+from pqnstack.pqn.protocols.measurement import DA_BASIS
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.measurement_store import StoredCounts
+from pqnstack.pqn.protocols.measurement_store import count_rates
+
+
+@dataclass
+class FakeMotor:
+    degrees: float = 0.0
+    moves: int = 0
+
+    def move_to(self, angle: float) -> float:
+        self.degrees = angle
+        self.moves += 1
+        return angle
+
+
+@dataclass
+class FakeTagger:
+    """Coincidences at a rate that depends on the angles of the half wave plates, 100 per second at most."""
+
+    idler: FakeMotor
+    signal: FakeMotor
+    calls: list[float] = field(default_factory=list)
+    # The source gets brighter as the idler turns, so some settings have more counts than others.
+    brightness_per_degree: float = 0.0
+
+    def measure_correlation(self, start_ch: int, stop_ch: int, integration_time_s: float, binwidth_ps: int) -> int:  # noqa: ARG002
+        self.calls.append(integration_time_s)
+        same = (self.idler.degrees - self.signal.degrees) % 90 == 0
+        brightness = 1 + self.brightness_per_degree * self.idler.degrees
+        return round((100 if same else 10) * brightness * integration_time_s)
+
+
+@pytest.fixture(autouse=True)
+def no_settling(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sweep.time, "sleep", lambda _: None)
+
+
+def test_measurements_add_up_until_min_counts() -> None:
+    store = MeasurementStore()
+    key = store.key({"hwp": 22.5}, (1, 2), 500)
+    calls: list[float] = []
+
+    def integrate(integration_time_s: float) -> int:
+        calls.append(integration_time_s)
+        return 40
+
+    first = store.measure(key, integrate, 1.0)
+    assert (first.counts, first.integration_time_s, first.integrations) == (40, 1.0, 1)
+    # Stored counts are enough without min_counts.
+    assert store.measure(key, integrate, 1.0).counts == 40  # noqa: PLR2004
+    assert store.measure(key, integrate, 1.0, min_counts=100).counts == 120  # noqa: PLR2004
+    assert store.measure(key, integrate, 1.0, min_counts=1000, max_integration_time_s=5).integration_time_s == 5  # noqa: PLR2004
+    assert len(calls) == 5  # noqa: PLR2004
+
+
+def test_keys_ignore_float_noise_and_motor_order() -> None:
+    store = MeasurementStore()
+
+    assert store.key({"a": 22.5, "b": 0.1 + 0.2}, [1, 2], 500) == store.key({"b": 0.3, "a": 22.5}, (1, 2), 500)
+    assert store.key({"a": 22.5}, (1, 2), 500) != store.key({"a": 22.5}, (1, 3), 500)
+
+
+def test_old_integrations_expire(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(measurement_store.time, "time", lambda: now[0])
+    store = MeasurementStore(max_age_s=60)
+    key = store.key({"hwp": 0}, (1, 2), 500)
+
+    store.add(key, 10, 1.0)
+    now[0] += 45
+    assert store.add(key, 20, 1.0).counts == 30  # noqa: PLR2004
+    now[0] += 30
+    assert store.get(key) == StoredCounts(20, 1.0, 1, 1045.0)
+    now[0] += 31
+    assert store.get(key) is None
+    assert len(store) == 0
+
+
+def test_new_epoch_drops_measurements() -> None:
+    store = MeasurementStore()
+    key = store.key({"hwp": 0}, (1, 2), 500)
+    store.add(key, 10, 1.0)
+
+    assert store.new_epoch() == 1
+    assert store.get(key) is None
+    assert store.get(store.key({"hwp": 0}, (1, 2), 500)) is None
+    with pytest.raises(ValueError, match="epoch"):
+        store.add(key, 10, 1.0)
+
+
+def test_rates_keep_every_count() -> None:
+    rates, variances = count_rates([StoredCounts(300, 3.0, 3, 0.0), StoredCounts(50, 1.0, 1, 0.0)])
+
+    assert rates == [100, 50]
+    # The setting integrated for 3 s has 3 times less variance than a single 1 s integration at its rate.
+    assert variances == pytest.approx([300 / 9, 50])
+
+
+def chsh_devices() -> tuple[chsh.Devices, FakeTagger]:
+    idler, signal = FakeMotor(), FakeMotor()
+    tagger = FakeTagger(idler, signal)
+    devices = chsh.Devices(idler_hwp=idler, signal_hwp=signal, idler_qwp=None, signal_qwp=None, timetagger=tagger)
+    return devices, tagger
+
+
+def test_chsh_reuses_stored_settings() -> None:
+    devices, tagger = chsh_devices()
+    config = MeasurementConfig(integration_time_s=1)
+    store = MeasurementStore()
+
+    first = chsh.measure_chsh([0, 45], [22.5, 67.5], devices, config, store)
+    moves = devices.idler_hwp.moves
+    second = chsh.measure_chsh([0, 45], [22.5, 67.5], devices, config, store)
+
+    assert len(tagger.calls) == 16  # noqa: PLR2004
+    assert devices.idler_hwp.moves == moves
+    assert second.chsh_value == first.chsh_value
+    assert second.chsh_error == first.chsh_error
+
+
+def test_chsh_min_counts_tightens_error_bars() -> None:
+    devices, _ = chsh_devices()
+    store = MeasurementStore()
+
+    loose = chsh.measure_chsh([0, 45], [22.5, 67.5], devices, MeasurementConfig(integration_time_s=1), store)
+    tight = chsh.measure_chsh(
+        [0, 45], [22.5, 67.5], devices, MeasurementConfig(integration_time_s=1, min_counts=100), store
+    )
+
+    assert tight.chsh_value == pytest.approx(loose.chsh_value)
+    assert tight.chsh_error < loose.chsh_error / 2
+
+
+def test_chsh_without_store_matches_raw_counts() -> None:
+    devices, tagger = chsh_devices()
+
+    value = chsh.measure_expectation_value(devices, MeasurementConfig(integration_time_s=2, dark_count=3), 0, 0)
+
+    # Every setting measured once: (0, 0) and (45, 45) are aligned.
+    assert value.raw_counts == [200, 20, 20, 200]
+    assert value.value == pytest.approx((200 - 20 - 20 + 200) / (440 - 12))
+    assert tagger.calls == [2, 2, 2, 2]
+
+
+def test_visibility_reuses_stored_settings() -> None:
+    idler, signal = FakeMotor(), FakeMotor()
+    tagger = FakeTagger(idler, signal)
+    devices = visibility.Devices()
+    devices.motors = {"idler_hwp": idler, "signal_hwp": signal}
+    devices.tagger = tagger
+    store = MeasurementStore()
+    config = MeasurementConfig(integration_time_s=1)
+
+    first = visibility.measure_visibility(devices, DA_BASIS, config, store)
+    second = visibility.measure_visibility(devices, DA_BASIS, config, store)
+
+    assert first == second
+    assert first[0] == pytest.approx(90 / 110)
+    assert tagger.calls == [1, 1, 1, 1]
+
+
+def test_adaptive_chsh_reaches_the_target_error_with_less_time() -> None:
+    devices, tagger = chsh_devices()
+    tagger.brightness_per_degree = 0.2
+    adaptive_config = MeasurementConfig(integration_time_s=5, target_error=0.05, chunk_time_s=0.5)
+
+    adaptive = chsh.measure_chsh([0, 45], [22.5, 67.5], devices, adaptive_config)
+
+    assert adaptive.chsh_error <= 0.05  # noqa: PLR2004
+    times = [raw.integration_times_s for raw in adaptive.raw_results]
+    # Every setting of an expectation value is integrated for the same time, the dimmer ones for longer.
+    assert all(len(set(t)) == 1 for t in times)
+    assert times[0][0] > times[-1][0]
+
+    # A fixed integration time reaching the same error must be long enough for the dimmest settings.
+    fixed_config = MeasurementConfig(integration_time_s=times[0][0])
+    fixed = chsh.measure_chsh([0, 45], [22.5, 67.5], devices, fixed_config)
+    assert fixed.chsh_error <= 0.05  # noqa: PLR2004
+    assert adaptive.integration_time_s < fixed.integration_time_s
+    assert adaptive.chsh_value == pytest.approx(fixed.chsh_value, abs=0.02)
+
+
+def test_adaptive_integration_stops_at_the_maximum_time() -> None:
+    devices, tagger = chsh_devices()
+    config = MeasurementConfig(integration_time_s=1, target_error=1e-6, chunk_time_s=0.5, max_integration_time_s=3)
+
+    value = chsh.measure_expectation_value(devices, config, 0, 22.5)
+
+    assert value.integration_times_s == [3, 3, 3, 3]
+    assert sum(tagger.calls) == 12  # noqa: PLR2004
+
+
+def test_adaptive_visibility_reaches_the_target_error() -> None:
+    idler, signal = FakeMotor(), FakeMotor()
+    devices = visibility.Devices()
+    devices.motors = {"idler_hwp": idler, "signal_hwp": signal}
+    devices.tagger = FakeTagger(idler, signal)
+
+    _, error = visibility.measure_visibility(
+        devices, DA_BASIS, MeasurementConfig(integration_time_s=1, target_error=0.02, chunk_time_s=0.5)
+    )
+
+    assert error <= 0.02  # noqa: PLR2004
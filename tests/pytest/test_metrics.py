@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from pqnstack.base.metrics import Counter
+from pqnstack.base.metrics import Gauge
+from pqnstack.base.metrics import Histogram
+from pqnstack.base.metrics import Registry
+
+
+def test_exposition_format() -> None:
+    registry = Registry()
+    requests = Counter("requests", "Requests served.", ["route"], registry=registry)
+    depth = Gauge("depth", "Queue depth.", registry=registry)
+    latency = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    depth.set_function(lambda: 7)
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    assert registry.expose().splitlines() == [
+        "# HELP requests Requests served.",
+        "# TYPE requests counter",
+        'requests_total{route="/a\\"b"} 3.0',
+        "# HELP depth Queue depth.",
+        "# TYPE depth gauge",
+        "depth 7.0",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1.0',
+        'latency_seconds_bucket{le="1.0"} 2.0',
+        'latency_seconds_bucket{le="+Inf"} 3.0',
+        "latency_seconds_count 3.0",
+        "latency_seconds_sum 5.55",
+    ]
+
+
+def test_counter_from_many_threads() -> None:
+    counter = Counter("hits", "Hits.", registry=Registry())
+
+    def hit() -> None:
+        for _ in range(10_000):
+            counter.inc()
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.labels().get() == 80_000  # noqa: PLR2004
+
+
+def test_invalid_use() -> None:
+    registry = Registry()
+    counter = Counter("hits", "Hits.", ["route"], registry=registry)
+
+    with pytest.raises(ValueError, match="expects the labels"):
+        counter.labels("a", "b")
+    with pytest.raises(ValueError, match="only increase"):
+        counter.labels("a").inc(-1)
+    with pytest.raises(ValueError, match="already registered"):
+        Gauge("hits", "Duplicate.", registry=registry)
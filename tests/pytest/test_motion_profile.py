@@ -0,0 +1,85 @@
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pqnstack.base.motion import MotionModel
+from pqnstack.base.motion import MotionProfiler
+from pqnstack.base.motion import MoveRecord
+from pqnstack.base.motion import fit_motion_model
+from pqnstack.base.motion import profile_time_s
+from pqnstack.pqn.drivers.rotator import APTRotator
+
+TRUE_MODEL = MotionModel(overhead_s=0.05, velocity_dps=20.0, acceleration_dps2=40.0, moves=0, rms_error_s=0.0)
+
+
+def recorded_moves(count: int, noise_s: float = 0.0, seed: int = 0) -> list[MoveRecord]:
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0, 180, count + 1)
+    return [
+        MoveRecord(start, end, TRUE_MODEL.predict_s(start, end) + rng.normal(0, noise_s))
+        for start, end in itertools.pairwise(angles)
+    ]
+
+
+def test_profile_is_triangular_below_full_velocity() -> None:
+    # Full velocity is reached after 10 degrees: 0.5 s accelerating and 0.5 s decelerating.
+    times = profile_time_s([0.0, 2.5, 10.0, 30.0], 20.0, 40.0)
+    np.testing.assert_allclose(times, [0.0, 0.5, 1.0, 2.0])
+
+
+def test_fit_recovers_the_model() -> None:
+    model = fit_motion_model(recorded_moves(200, noise_s=0.002))
+
+    assert model is not None
+    assert model.overhead_s == pytest.approx(TRUE_MODEL.overhead_s, abs=0.01)
+    assert model.velocity_dps == pytest.approx(TRUE_MODEL.velocity_dps, rel=0.05)
+    assert model.acceleration_dps2 == pytest.approx(TRUE_MODEL.acceleration_dps2, rel=0.1)
+    assert model.rms_error_s < 0.005  # noqa: PLR2004
+    assert model.estimate_s(0, [90, 0, 45]) == pytest.approx(TRUE_MODEL.estimate_s(0, [90, 0, 45]), rel=0.02)
+
+
+def test_fit_needs_enough_moves() -> None:
+    assert fit_motion_model(recorded_moves(3)) is None
+    assert fit_motion_model([MoveRecord(0, 10, 1.0)] * 10) is None
+
+
+def test_profile_persists_across_restarts(tmp_path: Path) -> None:
+    path = tmp_path / "profiles" / "hwp.json"
+    profiler = MotionProfiler(path, save_every=100)
+    for move in recorded_moves(20):
+        profiler.record(move.start_degrees, move.end_degrees, move.duration_s)
+    assert not path.exists()
+    profiler.save()
+
+    restarted = MotionProfiler(path)
+    assert len(restarted) == 20  # noqa: PLR2004
+    assert restarted.model == profiler.model
+
+
+def test_corrupt_profile_starts_over(tmp_path: Path) -> None:
+    path = tmp_path / "hwp.json"
+    path.write_text("{not json")
+
+    assert len(MotionProfiler(path)) == 0
+
+
+def test_rotator_info_reports_the_model(tmp_path: Path) -> None:
+    path = tmp_path / "hwp.json"
+    rotator = APTRotator(name="hwp", desc="", hw_address="", simulated=True, motion_profile_path=str(path))
+    rotator.start()
+    try:
+        assert rotator.info.motion_model is None
+        for angle in (5, 15, 0, 30, 10, 12):
+            rotator.degrees = angle
+        model = rotator.info.motion_model
+    finally:
+        rotator.close()
+
+    assert model is not None
+    assert model.moves == 6  # noqa: PLR2004
+    # The simulated controller turns at 90 degrees/s.
+    assert model.predict_s(0, 45) == pytest.approx(0.5, abs=0.1)
+    rotator.motion.save()
+    assert len(MotionProfiler(path)) == 6  # noqa: PLR2004
@@ -0,0 +1,44 @@
+import time
+
+from pqnstack.network.cache import ParameterCache
+from pqnstack.network.cache import ParameterReading
+from pqnstack.network.cache import invalidation_topic
+from pqnstack.network.telemetry import telemetry_topic
+
+
+def test_ttl_and_max_age() -> None:
+    cache = ParameterCache({"degrees": 60})
+    degrees = ParameterReading(45.0, time.monotonic())
+    status = ParameterReading("idle", time.monotonic() - 1)
+    cache.put("degrees", degrees)
+    cache.put("status", status)
+
+    assert cache.get("degrees") is degrees
+    assert cache.get("degrees", max_age_s=0) is None
+    # Parameters without a TTL are only served when the read accepts an age explicitly.
+    assert cache.get("status") is None
+    assert cache.get("status", max_age_s=10) is status
+    assert cache.get("velocity", max_age_s=10) is None
+    assert 1 <= status.age_s < 10  # noqa: PLR2004
+
+
+def test_invalidate() -> None:
+    cache = ParameterCache({"degrees": 60, "status": 60})
+    for name in ("degrees", "status"):
+        cache.put(name, ParameterReading(0, time.monotonic()))
+
+    cache.invalidate(frozenset({"degrees"}))
+    assert cache.get("degrees") is None
+    assert cache.get("status") is not None
+
+    cache.invalidate()
+    assert cache.get("status") is None
+
+
+def test_topics_do_not_overlap() -> None:
+    rotator = invalidation_topic("provider", "rotator")
+    assert rotator.startswith(invalidation_topic("provider"))
+    assert not invalidation_topic("provider", "rotator_2").startswith(rotator)
+    assert not invalidation_topic("provider2").startswith(invalidation_topic("provider"))
+    assert not rotator.startswith(telemetry_topic())
+    assert not telemetry_topic("provider").startswith(invalidation_topic("provider"))
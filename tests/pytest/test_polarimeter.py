@@ -0,0 +1,103 @@
+from typing import Any
+
+import numpy as np
+import pytest
+
+from pqnstack.pqn.drivers.polarimeter import ArduinoPolarimeter
+from pqnstack.pqn.drivers.polarimeter import Buffer
+from pqnstack.pqn.drivers.polarimeter import PolarizationMeasurement
+from pqnstack.pqn.drivers.polarimeter import SampleHistory
+from pqnstack.pqn.drivers.polarimeter import polarization_theta
+
+
+class FakePin:
+    def __init__(self) -> None:
+        self.callback: Any = None
+
+    def register_callback(self, callback: Any) -> None:
+        self.callback = callback
+
+    def enable_reporting(self) -> None:
+        pass
+
+
+class FakeBoard:
+    def __init__(self) -> None:
+        self.analog = [FakePin() for _ in range(4)]
+
+    def samplingOn(self, interval_ms: int) -> None:  # noqa: N802
+        pass
+
+    def exit(self) -> None:
+        pass
+
+    def report(self, hvda: tuple[float, ...]) -> None:
+        for pin, value in zip(self.analog, hvda, strict=True):
+            pin.callback(value)
+
+
+def test_buffer_running_mean() -> None:
+    buffer = Buffer(size=7, normalizing=True)
+    values = np.random.default_rng(2).random(100)
+    for value in values:
+        buffer.append(value)
+
+    assert len(buffer) == 7  # noqa: PLR2004
+    expected = (values[-7:].mean() - values.min()) / (values.max() - values.min())
+    assert buffer.read() == pytest.approx(expected)
+
+    buffer.clear()
+    assert buffer.read() == 0.0
+
+
+def test_vectorized_theta_matches_scalar() -> None:
+    rng = np.random.default_rng(0)
+    hvda = rng.random((500, 4))
+    hvda[rng.integers(0, 20, 500) == 0] = 0  # Unreadable measurements reset the unwrapping.
+
+    last_theta = 200.0
+    expected = []
+    for h, v, d, a in hvda:
+        last_theta = PolarizationMeasurement(h, v, d, a, _last_theta=last_theta).theta
+        expected.append(last_theta)
+
+    np.testing.assert_allclose(polarization_theta(*hvda.T, last_theta=200.0), expected)
+
+
+def test_history_wraps_and_continues_theta() -> None:
+    rng = np.random.default_rng(1)
+    hvda = rng.random((25, 4))
+    history = SampleHistory(capacity=10)
+    thetas = []
+    for i, sample in enumerate(hvda):
+        history.append(float(i), *sample)
+        if i % 3 == 0:
+            thetas.append(history.latest()[-1])
+
+    samples = history.since()
+    assert len(samples) == 10  # noqa: PLR2004
+    np.testing.assert_array_equal(samples.timestamps, np.arange(15, 25))
+    np.testing.assert_array_equal(samples.h, hvda[15:, 0])
+    # Angles computed in batches continue from each other like a single pass.
+    np.testing.assert_allclose(samples.theta, polarization_theta(*hvda.T)[15:])
+    assert len(history.since(20)) == 5  # noqa: PLR2004
+
+
+def test_polarimeter_streams_samples() -> None:
+    board = FakeBoard()
+    polarimeter = ArduinoPolarimeter(name="polarimeter", desc="", hw_address="", sample_rate=100, board=board)
+    published = []
+    polarimeter.observer = lambda instrument, name, value: published.append((instrument, name, value))
+    polarimeter.start()
+    polarimeter.start_normalizing()
+    for hvda in np.random.default_rng(3).random((50, 4)):
+        board.report(tuple(hvda))
+
+    samples = polarimeter.read_many(window_s=60)
+    assert len(samples) == 50  # noqa: PLR2004
+    assert len(published) == 50  # noqa: PLR2004
+    instrument, name, (timestamp, *_, theta) = published[-1]
+    assert (instrument, name) == ("polarimeter", "sample")
+    assert timestamp == samples.timestamps[-1]
+    assert theta == samples.theta[-1]
+    assert {"read", "read_many"} <= set(polarimeter.operations)
@@ -0,0 +1,115 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pqnstack.app.api.routes import qkd
+from pqnstack.app.core.config import NodeState
+from pqnstack.app.core.config import get_state
+from pqnstack.app.core.config import qkd_follower_ready_event
+from pqnstack.constants import QKDEncodingBasis
+
+
+class FakeHwp:
+    def __init__(self) -> None:
+        self.angles: list[float] = []
+
+    def move_to(self, angle: float) -> None:
+        self.angles.append(angle)
+
+
+@pytest.fixture
+def follower(monkeypatch: pytest.MonkeyPatch) -> tuple[TestClient, NodeState, FakeHwp]:
+    state = NodeState(qkd_follower_basis_list=[QKDEncodingBasis.HV, QKDEncodingBasis.DA])
+    hwp = FakeHwp()
+    monkeypatch.setattr(qkd, "_get_hwp", lambda _: hwp)
+    monkeypatch.setattr(qkd, "_random_bit", lambda: 1)
+    app = FastAPI()
+    app.include_router(qkd.router)
+    app.dependency_overrides[get_state] = lambda: state
+    # Set before the session waits on it, so it never binds to the test client's event loop.
+    qkd_follower_ready_event.set()
+    return TestClient(app), state, hwp
+
+
+def test_finished_session_keeps_the_schedule_for_sifting(follower: tuple[TestClient, NodeState, FakeHwp]) -> None:
+    client, state, hwp = follower
+
+    with client.websocket_connect("/qkd/session") as session:
+        assert session.receive_json() == {"event": "ready", "n_bits": 2}
+        for index in range(2):
+            session.send_json({"event": "step", "index": index})
+            assert session.receive_json()["index"] == index
+        session.send_json({"event": "done"})
+
+    assert hwp.angles == [QKDEncodingBasis.HV.angles[1].value, QKDEncodingBasis.DA.angles[1].value]
+    assert state.qkd_request_basis_list == [QKDEncodingBasis.HV, QKDEncodingBasis.DA]
+    assert state.qkd_request_bit_list == [1, 1]
+    assert not qkd_follower_ready_event.is_set()
+
+
+@pytest.mark.parametrize(
+    "frame", [{"index": 0}, {"event": "jump", "index": 0}, {"event": "step", "index": "first"}, [0], "step"]
+)
+def test_malformed_messages_are_answered_with_an_error(
+    follower: tuple[TestClient, NodeState, FakeHwp], frame: object
+) -> None:
+    client, _, hwp = follower
+
+    with client.websocket_connect("/qkd/session") as session:
+        assert session.receive_json() == {"event": "ready", "n_bits": 2}
+        session.send_json(frame)
+        assert session.receive_json() == {"event": "error", "detail": "Malformed QKD session message"}
+        session.send_text("{not json")
+        assert session.receive_json()["event"] == "error"
+        # The session survives bad frames.
+        session.send_json({"event": "step", "index": 1})
+        assert session.receive_json()["event"] == "moved"
+        session.send_json({"event": "done"})
+
+    assert len(hwp.angles) == 1
+
+
+def test_disconnected_session_drops_the_schedule(follower: tuple[TestClient, NodeState, FakeHwp]) -> None:
+    client, state, _ = follower
+
+    with client.websocket_connect("/qkd/session") as session:
+        assert session.receive_json() == {"event": "ready", "n_bits": 2}
+        session.send_json({"event": "step", "index": 0})
+        assert session.receive_json()["event"] == "moved"
+
+    assert state.qkd_request_basis_list == []
+    assert state.qkd_request_bit_list == []
+    assert not qkd_follower_ready_event.is_set()
+
+
+def test_silent_leader_times_out(
+    follower: tuple[TestClient, NodeState, FakeHwp], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client, state, _ = follower
+    monkeypatch.setattr(qkd.settings.qkd_settings, "session_timeout_s", 0.1)
+
+    with client.websocket_connect("/qkd/session") as session:
+        assert session.receive_json() == {"event": "ready", "n_bits": 2}
+        assert session.receive_json() == {"event": "error", "detail": "QKD session timed out"}
+
+    assert state.qkd_request_bit_list == []
+    assert not qkd_follower_ready_event.is_set()
+
+
+def test_cascade_responder_follows_the_resulting_key(follower: tuple[TestClient, NodeState, FakeHwp]) -> None:
+    client, state, _ = follower
+    state.qkd_resulting_bit_list = [0, 1, 1, 0, 1, 0, 0, 1]
+    parity_request = {"seed": 7, "pass_index": 0, "starts": [0], "stops": [4]}
+
+    assert client.post("/qkd/cascade_parities", json=parity_request).status_code == 200  # noqa: PLR2004
+    responder = state.qkd_cascade_responder
+    assert responder is not None
+    client.post("/qkd/cascade_parities", json=parity_request)
+    assert state.qkd_cascade_responder is responder
+    client.post("/qkd/cascade_parities", json=parity_request | {"seed": 8})
+    assert state.qkd_cascade_responder is not responder
+
+    assert client.post("/qkd/amplify", json={"seed": 1, "n_bits": 4}).json() == 4  # noqa: PLR2004
+    assert state.qkd_cascade_responder is None
+    assert len(state.qkd_resulting_bit_list) == 4  # noqa: PLR2004
+    assert "qkd_cascade_responder" not in state.model_dump()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from pqnstack.constants import BellState
+from pqnstack.constants import QKDEncodingBasis
+from pqnstack.pqn.protocols.qkd import bases_to_bits
+from pqnstack.pqn.protocols.qkd import choose_sample
+from pqnstack.pqn.protocols.qkd import distill_key
+from pqnstack.pqn.protocols.qkd import estimate_qber
+from pqnstack.pqn.protocols.qkd import measurement_outcomes
+from pqnstack.pqn.protocols.qkd import pack_bits
+from pqnstack.pqn.protocols.qkd import sift
+from pqnstack.pqn.protocols.qkd import unpack_bits
+
+
+@pytest.mark.parametrize("n_bits", [0, 1, 7, 8, 1001])
+def test_pack_roundtrip(n_bits: int) -> None:
+    bits = np.random.default_rng(n_bits).integers(0, 2, n_bits, dtype=np.uint8)
+    np.testing.assert_array_equal(unpack_bits(pack_bits(bits), n_bits), bits)
+
+
+def test_unpack_rejects_wrong_length() -> None:
+    with pytest.raises(ValueError, match="does not fit"):
+        unpack_bits(pack_bits([1] * 9), 20)
+
+
+@pytest.mark.parametrize("bell_state", list(BellState))
+def test_measurement_outcomes_match_scalar_rule(bell_state: BellState) -> None:
+    rng = np.random.default_rng(7)
+    bases = rng.integers(0, 2, 200, dtype=np.uint8)
+    choices = rng.integers(0, 2, 200, dtype=np.uint8)
+    counts = rng.integers(0, 25, 200)
+    threshold = 10
+
+    expected = [
+        ((int(c > threshold) ^ int(ch)) ^ (1 - bell_state.value)) ^ int(b)
+        for b, ch, c in zip(bases, choices, counts, strict=True)
+    ]
+    np.testing.assert_array_equal(measurement_outcomes(bases, choices, counts, threshold, bell_state), expected)
+
+
+def test_sift_and_qber() -> None:
+    leader = bases_to_bits([QKDEncodingBasis.HV, QKDEncodingBasis.DA, QKDEncodingBasis.DA, QKDEncodingBasis.HV])
+    follower = bases_to_bits([QKDEncodingBasis.HV, QKDEncodingBasis.HV, QKDEncodingBasis.DA, QKDEncodingBasis.DA])
+    bits = np.array([1, 0, 1, 1], dtype=np.uint8)
+
+    np.testing.assert_array_equal(sift(bits, leader, follower), [1, 1])
+    assert estimate_qber(np.array([0, 1, 1, 0], dtype=np.uint8), np.array([0, 1, 0, 0], dtype=np.uint8)) == 0.25  # noqa: PLR2004
+
+
+def test_million_bit_key() -> None:
+    rng = np.random.default_rng(0)
+    n_bits = 1_000_000
+    leader_bases = rng.integers(0, 2, n_bits, dtype=np.uint8)
+    follower_bases = unpack_bits(pack_bits(rng.integers(0, 2, n_bits, dtype=np.uint8)), n_bits)
+    key = sift(rng.integers(0, 2, n_bits, dtype=np.uint8), leader_bases, follower_bases)
+
+    sample = choose_sample(len(key), 1000, rng)
+    assert len(np.unique(sample)) == 1000  # noqa: PLR2004
+    assert abs(len(key) / n_bits - 0.5) < 0.01  # noqa: PLR2004
+
+    key = np.delete(key, sample)
+    distilled = distill_key(key, 0.0, privacy_amplifier=lambda k, _qber, _leaked: k[: len(k) // 2])
+    assert len(distilled) == len(key) // 2
@@ -0,0 +1,57 @@
+import pytest
+
+from pqnstack.network.client import Client
+from pqnstack.network.packet import NetworkElementClass
+from pqnstack.network.packet import Packet
+from pqnstack.network.packet import PacketIntent
+from pqnstack.network.packet import create_registration_packet
+from pqnstack.network.router import Router
+
+
+def acknowledge(packet: Packet) -> Packet:
+    return Packet(
+        intent=PacketIntent.REGISTRATION_ACK, request="ACKNOWLEDGE", source="router1", destination=packet.source
+    )
+
+
+def test_client_gives_up_its_timed_out_names_when_registering_again(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Client, "connect", lambda _: None)
+    monkeypatch.setattr(Client, "_open_socket", lambda _: None)
+    client = Client(name="client")
+    registrations: list[Packet] = []
+
+    def ask(packet: Packet) -> Packet:
+        registrations.append(packet)
+        return acknowledge(packet)
+
+    monkeypatch.setattr(client, "ask", ask)
+
+    # The first registration after a reset may time out as well, its name is given up too.
+    client._reset_socket()  # noqa: SLF001
+    timed_out = client.name
+    client._reset_socket()  # noqa: SLF001
+    client.register()
+    client.register()
+
+    assert registrations[0].source == client.name
+    assert registrations[0].replaces == ("client", timed_out)
+    assert registrations[1].replaces == ()
+
+
+def test_router_forgets_replaced_client_names(monkeypatch: pytest.MonkeyPatch) -> None:
+    router = Router("router1")
+    monkeypatch.setattr(router, "_send", lambda *_: None)
+
+    def register(name: str, element_class: NetworkElementClass, *replaces: str) -> None:
+        packet = create_registration_packet(
+            source=name, destination="router1", payload=element_class, replaces=replaces
+        )
+        router.handle_registration(name.encode(), packet)
+
+    register("client", NetworkElementClass.CLIENT)
+    register("telemetry", NetworkElementClass.TELEMETRY)
+    register("client_a1", NetworkElementClass.CLIENT, "client", "client_gone")
+    register("telemetry_b2", NetworkElementClass.TELEMETRY, "telemetry")
+
+    assert router.clients == {"client_a1": b"client_a1"}
+    assert router.telemetry_clients == {"telemetry_b2": b"telemetry_b2"}
@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pytest
+
+from pqnstack.base.errors import RandomnessPoolExhaustedError
+from pqnstack.pqn.protocols.rng import RandomnessPool
+from pqnstack.pqn.protocols.rng import ToeplitzExtractor
+from pqnstack.pqn.protocols.rng import toeplitz_hash
+
+
+def test_toeplitz_hash_matches_matrix_product() -> None:
+    rng = np.random.default_rng(1234)
+    n_in, n_out = 257, 96
+    bits = rng.integers(0, 2, n_in, dtype=np.uint8)
+    seed = rng.integers(0, 2, n_in + n_out - 1, dtype=np.uint8)
+
+    matrix = np.array([[seed[i - j + n_in - 1] for j in range(n_in)] for i in range(n_out)], dtype=np.int64)
+    expected = (matrix @ bits) % 2
+
+    np.testing.assert_array_equal(toeplitz_hash(bits, seed, n_out), expected)
+
+
+def _wait_until_full(pool: RandomnessPool) -> None:
+    deadline = time.monotonic() + 5
+    while pool.status.available_bits < pool.high_watermark_bits and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_fills_to_high_watermark_and_serves_bits() -> None:
+    calls = 0
+
+    def source() -> list[int]:
+        nonlocal calls
+        calls += 1
+        return [calls * 7 + i for i in range(16)]
+
+    pool = RandomnessPool(
+        source, ToeplitzExtractor(n_in=64, n_out=32), capacity_bits=256, low_watermark_bits=64, high_watermark_bits=128
+    )
+    pool.start()
+    try:
+        _wait_until_full(pool)
+        status = pool.status
+        assert status.high_watermark_bits <= status.available_bits <= status.capacity_bits
+        calls_when_full = calls
+
+        bits = pool.take(100)
+        assert len(bits) == 100  # noqa: PLR2004
+        assert set(np.unique(bits)) <= {0, 1}
+
+        # Dropping below the low watermark wakes the harvester up again.
+        _wait_until_full(pool)
+        assert calls > calls_when_full
+
+        with pytest.raises(RandomnessPoolExhaustedError):
+            pool.take(pool.capacity_bits + 1)
+    finally:
+        pool.stop()
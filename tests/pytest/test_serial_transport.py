@@ -0,0 +1,88 @@
+import queue
+import threading
+from collections.abc import Callable
+
+import pytest
+
+from pqnstack.pqn.drivers import rotaryencoder
+from pqnstack.pqn.drivers.rotaryencoder import SerialRotaryEncoder
+from pqnstack.pqn.drivers.serial_transport import SerialTransport
+
+
+class FakeSerial:
+    """Answers every command with the line `respond` returns, None leaves it unanswered."""
+
+    def __init__(self, respond: Callable[[bytes], bytes | None]) -> None:
+        self.respond = respond
+        self.lines: queue.Queue[bytes] = queue.Queue()
+        self.written: list[bytes] = []
+        self.closed = threading.Event()
+
+    def write(self, data: bytes, /) -> int:
+        self.written.append(data)
+        reply = self.respond(data)
+        if reply is not None:
+            self.lines.put(reply + b"\r\n")
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:  # noqa: ARG002
+        return b""
+
+    def readline(self) -> bytes:
+        try:
+            return self.lines.get(timeout=0.01)
+        except queue.Empty:
+            return b""
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+def test_pipelined_requests_match_replies() -> None:
+    transport = SerialTransport(FakeSerial(lambda command: command.upper().strip()))
+    futures = [transport.request(f"cmd {i}\n".encode()) for i in range(100)]
+    assert [f.result(timeout=1) for f in futures] == [f"CMD {i}" for i in range(100)]
+    transport.close()
+
+
+def test_unanswered_requests_time_out() -> None:
+    unsolicited = []
+    transport = SerialTransport(
+        FakeSerial(lambda command: None if command == b"lost" else b"ok"),
+        reply_timeout_s=0.05,
+        on_unsolicited=unsolicited.append,
+    )
+    lost = transport.request(b"lost")
+    with pytest.raises(TimeoutError):
+        lost.result(timeout=1)
+    assert transport.ask(b"next", timeout_s=1) == "ok"
+
+    transport.connection.lines.put(b"button pressed\n")  # type: ignore[attr-defined]
+    for _ in range(100):
+        if unsolicited:
+            break
+        threading.Event().wait(0.01)
+    pending = transport.request(b"lost")
+    transport.close()
+    with pytest.raises(ConnectionError):
+        pending.result(timeout=1)
+    assert unsolicited == ["button pressed"]
+
+
+def test_encoder_reads_cached_angle(monkeypatch: pytest.MonkeyPatch) -> None:
+    angles = iter(range(1_000_000))
+    device = FakeSerial(lambda command: str(next(angles)).encode() if command == b"ANGLE?\n" else None)
+    monkeypatch.setattr(rotaryencoder.serial, "Serial", lambda *_, **__: device)
+
+    encoder = SerialRotaryEncoder(label="encoder", address="fake", offset_degrees=0.5, sample_period_s=0.001)
+    first = encoder.read()
+    assert first >= 0.5  # noqa: PLR2004
+    # Reads never go to the port, the sampler keeps the angle fresh in the background.
+    requests = len(device.written)
+    for _ in range(1000):
+        encoder.read()
+    assert len(device.written) - requests < 1000  # noqa: PLR2004
+    threading.Event().wait(0.05)
+    assert encoder.read() > first
+    encoder.close()
+    assert device.closed.is_set()
@@ -0,0 +1,41 @@
+import numpy as np
+
+from pqnstack.network.state import StateChange
+from pqnstack.network.state import StatePublisher
+from pqnstack.network.state import decode_state_change
+from pqnstack.network.state import encode_state_change
+from pqnstack.network.state import state_topic
+
+
+class FakeSocket:
+    def __init__(self) -> None:
+        self.sent: list[list[bytes]] = []
+
+    def send_multipart(self, message: list[bytes]) -> None:
+        self.sent.append(message)
+
+
+def test_round_trip() -> None:
+    change = StateChange("provider", "rotator", "degrees", 45.0, 1.5)
+    message = encode_state_change(change)
+
+    assert message[0].startswith(state_topic("provider", "rotator"))
+    assert not message[0].startswith(state_topic("provider", "rotator_2"))
+    assert decode_state_change(message) == change
+
+
+def test_publishes_changes_only() -> None:
+    socket = FakeSocket()
+    publisher = StatePublisher("provider", socket)  # type: ignore[arg-type]
+
+    assert publisher.publish("rotator", "degrees", 0.0)
+    assert not publisher.publish("rotator", "degrees", 0.0)
+    assert publisher.publish("rotator", "degrees", 0.0, force=True)
+    assert publisher.publish("rotator", "degrees", 10.0)
+    # Arrays cannot be compared to a bool, they are always published.
+    assert publisher.publish("polarimeter", "read", np.zeros(4))
+    assert publisher.publish("polarimeter", "read", np.zeros(4))
+
+    values = [decode_state_change(message).value for message in socket.sent]
+    assert values[:3] == [0.0, 0.0, 10.0]
+    assert len(values) == 5  # noqa: PLR2004
@@ -0,0 +1,106 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from pqnstack.constants import BellState
+from pqnstack.pqn.protocols import statistics
+from pqnstack.pqn.protocols import tomography
+from pqnstack.pqn.protocols.tomography import TOMOGRAPHY_PROJECTORS
+
+# Counts of the 4 expectation values of a CHSH run near the quantum maximum.
+CHSH_COUNTS = [[100, 900, 900, 100], [900, 100, 100, 900], [900, 100, 100, 900], [900, 100, 100, 900]]
+
+
+def test_vectorized_values_match_the_closed_forms() -> None:
+    e = statistics.expectation_values(CHSH_COUNTS)
+
+    assert e.tolist() == pytest.approx([-0.8, 0.8, 0.8, 0.8])
+    assert float(statistics.chsh_values(CHSH_COUNTS)) == pytest.approx(3.2)
+    visibility, _ = statistics.calculate_visibility({("D", "D"): 950, ("D", "A"): 50}, [("D", "D"), ("D", "A")])
+    assert float(statistics.visibility_values([950, 50])) == pytest.approx(visibility)
+    assert statistics.visibility_values(np.zeros((3, 4))).tolist() == [0, 0, 0]
+
+
+def test_rate_statistics_use_every_count() -> None:
+    # Counts integrated for 1 s, the poles of each basis are measured for the same time.
+    value, error = statistics.rate_expectation_value([100, 900, 900, 100], [100, 900, 900, 100])
+    assert value == pytest.approx(-0.8)
+    assert error == pytest.approx(math.sqrt((1 - 0.8**2) / 2000))
+    visibility, visibility_error = statistics.rate_visibility([950, 50], [950, 50])
+    assert (visibility, visibility_error) == pytest.approx(
+        statistics.calculate_visibility({("D", "D"): 950, ("D", "A"): 50}, [("D", "D"), ("D", "A")])
+    )
+
+    # The first setting integrated for 4 s: same rates, smaller errors.
+    longer = statistics.rate_expectation_value([100, 900, 900, 100], [100 / 4, 900, 900, 100])
+    assert longer[0] == pytest.approx(value)
+    assert longer[1] < error
+    assert statistics.rate_visibility([950, 50], [950 / 4, 50])[1] < visibility_error
+
+
+def test_same_seed_gives_the_same_interval() -> None:
+    first = statistics.chsh_confidence_interval(CHSH_COUNTS, seed=7)
+    second = statistics.chsh_confidence_interval(CHSH_COUNTS, seed=7)
+    other = statistics.chsh_confidence_interval(CHSH_COUNTS, seed=8)
+
+    assert first == second
+    assert first != other
+    assert first.low < first.value < first.high
+    assert first.resamples == 2000  # noqa: PLR2004
+
+
+def test_process_pool_gives_the_same_samples() -> None:
+    counts = np.asarray(CHSH_COUNTS)
+
+    serial = statistics.bootstrap(statistics.chsh_values, counts, resamples=2500, seed=3, batch_size=500)
+    pooled = statistics.bootstrap(statistics.chsh_values, counts, resamples=2500, seed=3, batch_size=500, workers=2)
+
+    assert serial.shape == (2500,)
+    np.testing.assert_array_equal(serial, pooled)
+
+
+def test_bootstrap_errors_match_poisson_statistics() -> None:
+    # With Poisson counts the variance of an expectation value E over N counts is (1 - E^2) / N.
+    expected = math.sqrt(4 * (1 - 0.8**2) / 2000)
+    interval = statistics.chsh_confidence_interval(CHSH_COUNTS, resamples=20000, seed=0)
+    assert interval.standard_error == pytest.approx(expected, rel=0.05)
+    assert interval.high - interval.low == pytest.approx(2 * 1.96 * expected, rel=0.05)
+
+    _, visibility_error = statistics.calculate_visibility({("D", "D"): 950, ("D", "A"): 50}, [("D", "D"), ("D", "A")])
+    visibility = statistics.visibility_confidence_interval([950, 50], resamples=20000, seed=0)
+    assert visibility.standard_error == pytest.approx(visibility_error, rel=0.05)
+
+
+def test_resampling_is_vectorized() -> None:
+    statistics.bootstrap(statistics.chsh_values, CHSH_COUNTS, resamples=10, seed=0)
+
+    start = time.perf_counter()
+    samples = statistics.bootstrap(statistics.chsh_values, CHSH_COUNTS, resamples=20000, seed=0)
+
+    assert samples.shape == (20000,)
+    assert time.perf_counter() - start < 0.5  # noqa: PLR2004
+
+
+@pytest.mark.parametrize("method", ["projected", "mle"])
+def test_tomography_intervals(method: str) -> None:
+    state = tomography.bell_state_vector(BellState.Phi_plus)
+    rho = 0.9 * np.outer(state, state.conj()) + 0.1 * np.eye(4) / 4
+    counts = np.round(np.einsum("kij,ji->k", TOMOGRAPHY_PROJECTORS, rho).real * 1000)
+
+    intervals = statistics.tomography_confidence_intervals(counts, method=method, resamples=200, seed=0)
+
+    assert set(intervals) == {"fidelity", "concurrence", "purity"}
+    fidelity = intervals["fidelity"]
+    assert fidelity.value == pytest.approx(0.925, abs=1e-3)
+    assert fidelity.low < fidelity.value < fidelity.high
+    assert 0 < fidelity.standard_error < 0.02  # noqa: PLR2004
+    assert intervals["concurrence"].value == pytest.approx(0.85, abs=2e-3)
+
+
+def test_tomography_intervals_reject_wrong_counts() -> None:
+    with pytest.raises(ValueError, match="36 counts"):
+        statistics.tomography_confidence_intervals([1, 2, 3])
+    with pytest.raises(ValueError, match="method"):
+        statistics.tomography_values(np.ones(36), method="bayesian")
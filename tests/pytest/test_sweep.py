@@ -0,0 +1,260 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pqnstack.base.errors import SweepCancelledError
+from pqnstack.pqn.protocols import sweep as sweep_module
+from pqnstack.pqn.protocols.measurement import HV_BASIS
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.measurement_store import MeasurementStore
+from pqnstack.pqn.protocols.sweep import Sweep
+from pqnstack.pqn.protocols.sweep import SweepCheckpoint
+from pqnstack.pqn.protocols.sweep import SweepProgress
+from pqnstack.pqn.protocols.sweep import SweepSetting
+from pqnstack.pqn.protocols.sweep import basis_settings
+from pqnstack.pqn.protocols.sweep import grid_settings
+
+
+@dataclass
+class FakeMotor:
+    degrees: float = 0.0
+    move_s: float = 0.0
+    travelled: float = 0.0
+    period_degrees: float | None = None
+
+    def move_to(self, angle: float) -> float:
+        time.sleep(self.move_s)
+        self.travelled += abs(angle - self.degrees)
+        self.degrees = angle
+        return angle
+
+
+@dataclass
+class FakeTagger:
+    """Counts the sum of the motor angles, so every setting can be told apart by its counts."""
+
+    motors: dict[str, FakeMotor]
+    calls: int = 0
+    failing_calls: tuple[int, ...] = ()  # Calls that time out, counted from 1.
+
+    def measure_correlation(self, start_ch: int, stop_ch: int, integration_time_s: float, binwidth_ps: int) -> int:  # noqa: ARG002
+        self.calls += 1
+        if self.calls in self.failing_calls:
+            msg = "Timed out waiting for the time tagger"
+            raise TimeoutError(msg)
+        return round(sum(motor.degrees for motor in self.motors.values()) * integration_time_s)
+
+
+def make_sweep(**kwargs: object) -> tuple[Sweep, dict[str, FakeMotor], FakeTagger]:
+    motors = {"signal_hwp": FakeMotor(), "idler_hwp": FakeMotor()}
+    tagger = FakeTagger(motors)
+    config = MeasurementConfig(integration_time_s=1)
+    return Sweep(motors, tagger, config, settle_s=0, **kwargs), motors, tagger
+
+
+def test_basis_settings_move_the_motors_there_are() -> None:
+    settings = basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"])
+
+    assert [setting.label for setting in settings] == ["HH", "HV", "VH", "VV"]
+    assert settings[1].angles == {"signal_hwp": 0, "idler_hwp": 45}
+    with_qwps = basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp", "signal_qwp", "idler_qwp"])
+    assert with_qwps[2].angles == {"signal_hwp": 45, "signal_qwp": 0, "idler_hwp": 0, "idler_qwp": 0}
+
+
+def test_grid_settings() -> None:
+    settings = grid_settings({"signal_hwp": [0, 10], "idler_hwp": [0, 5, 20]})
+
+    assert len(settings) == 6  # noqa: PLR2004
+    assert settings[1] == SweepSetting({"signal_hwp": 0, "idler_hwp": 5}, label="0,5")
+
+
+def test_results_come_back_in_the_order_of_the_settings() -> None:
+    sweep, motors, _ = make_sweep()
+    settings = grid_settings({"signal_hwp": [30, 0, 20, 10], "idler_hwp": [1]})
+
+    results = sweep.run(settings)
+
+    assert results.dtype.names == (
+        "index",
+        "label",
+        "idler_hwp",
+        "signal_hwp",
+        "counts",
+        "integration_time_s",
+        "integrations",
+    )
+    assert results["index"].tolist() == [0, 1, 2, 3]
+    assert results["signal_hwp"].tolist() == [30, 0, 20, 10]
+    assert results["counts"].tolist() == [31, 1, 21, 11]
+    # Visited 0, 10, 20, 30 instead of going back and forth.
+    assert motors["signal_hwp"].travelled == 30  # noqa: PLR2004
+
+
+def test_settings_are_visited_in_the_given_order_without_reorder() -> None:
+    sweep, motors, _ = make_sweep(reorder=False)
+
+    sweep.run(grid_settings({"signal_hwp": [30, 0, 20, 10], "idler_hwp": [1]}))
+
+    assert motors["signal_hwp"].travelled == 90  # noqa: PLR2004
+
+
+def test_reorder_compares_angles_modulo_the_period() -> None:
+    sweep, motors, _ = make_sweep()
+    motors["signal_hwp"].period_degrees = 180
+    settings = grid_settings({"signal_hwp": [90, 160, 10], "idler_hwp": [0]})
+
+    # 160 is 30 degrees away from 10 through 180.
+    assert sweep.visit_order(settings) == [2, 1, 0]
+
+
+def test_motors_move_at_the_same_time() -> None:
+    sweep, motors, _ = make_sweep()
+    for motor in motors.values():
+        motor.move_s = 0.2
+    progress: list[SweepProgress] = []
+
+    sweep.run([SweepSetting({"signal_hwp": 10, "idler_hwp": 20})], progress=progress.append)
+
+    assert len(progress) == 1
+    assert 0.2 <= progress[0].move_s < 0.35  # noqa: PLR2004
+
+
+def test_stored_settings_are_not_measured_again() -> None:
+    store = MeasurementStore()
+    sweep, _, tagger = make_sweep(store=store)
+    settings = basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"])
+
+    first = sweep.run(settings)
+    second = sweep.run(settings)
+
+    assert tagger.calls == 4  # noqa: PLR2004
+    np.testing.assert_array_equal(first, second)
+
+
+def test_stream_yields_progress_then_results() -> None:
+    sweep, _, _ = make_sweep()
+    settings = basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"])
+
+    async def collect() -> list[SweepProgress]:
+        return [update async for update in sweep.stream(settings)]
+
+    updates = asyncio.run(collect())
+
+    assert [update.integrations for update in updates[:-1]] == [1, 2, 3, 4]
+    assert all(update.results is None for update in updates[:-1])
+    results = updates[-1].results
+    assert results is not None
+    assert results["label"].tolist() == ["HH", "HV", "VH", "VV"]
+    assert results["counts"].tolist() == [0, 45, 45, 90]
+
+
+def test_closing_the_stream_stops_the_sweep() -> None:
+    sweep, motors, tagger = make_sweep()
+    for motor in motors.values():
+        motor.move_s = 0.05
+    settings = grid_settings({"signal_hwp": list(range(20)), "idler_hwp": [0]})
+
+    async def first_update() -> None:
+        stream = sweep.stream(settings)
+        await anext(stream)
+        await stream.aclose()
+        await asyncio.sleep(0.3)
+
+    asyncio.run(first_update())
+
+    assert tagger.calls < 5  # noqa: PLR2004
+
+
+def test_stop_raises_before_the_next_integration() -> None:
+    sweep, _, tagger = make_sweep()
+    stop = threading.Event()
+    stop.set()
+
+    with pytest.raises(SweepCancelledError):
+        sweep.run(basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"]), stop=stop)
+    assert tagger.calls == 0
+
+
+def test_transient_failures_are_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    delays: list[float] = []
+    monkeypatch.setattr(sweep_module.time, "sleep", delays.append)
+    sweep, _, tagger = make_sweep(backoff_s=0.5)
+    tagger.failing_calls = (2, 3)
+
+    results = sweep.run(basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"]))
+
+    assert results["counts"].tolist() == [0, 45, 45, 90]
+    assert tagger.calls == 6  # noqa: PLR2004
+    assert [delay for delay in delays if delay] == [0.5, 1.0]  # Settling takes 0 s here.
+
+
+def test_failures_are_raised_once_the_retries_run_out(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sweep_module.time, "sleep", lambda _: None)
+    sweep, _, tagger = make_sweep(retries=2)
+    tagger.failing_calls = (1, 2, 3)
+
+    with pytest.raises(TimeoutError):
+        sweep.run(basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"]))
+    assert tagger.calls == 3  # noqa: PLR2004
+
+
+def test_failed_sweep_resumes_from_the_checkpoint(tmp_path: Path) -> None:
+    path = tmp_path / "tomography.jsonl"
+    settings = grid_settings({"signal_hwp": [0, 10, 20, 30, 40], "idler_hwp": [1]})
+    sweep, _, tagger = make_sweep(checkpoint=path, retries=0)
+    tagger.failing_calls = (4,)
+
+    with pytest.raises(TimeoutError):
+        sweep.run(settings)
+    assert len(path.read_text().splitlines()) == 3  # noqa: PLR2004
+
+    resumed, _, resumed_tagger = make_sweep(checkpoint=path)
+    results = resumed.run(settings)
+
+    assert resumed_tagger.calls == 2  # noqa: PLR2004
+    assert results["counts"].tolist() == [1, 11, 21, 31, 41]
+    assert len(path.read_text().splitlines()) == 5  # noqa: PLR2004
+
+
+def test_checkpoint_is_loaded_once_into_a_store(tmp_path: Path) -> None:
+    path = tmp_path / "chsh.jsonl"
+    store = MeasurementStore()
+    settings = basis_settings(HV_BASIS, ["signal_hwp", "idler_hwp"])
+    make_sweep(checkpoint=path)[0].run(settings)
+
+    first = make_sweep(store=store, checkpoint=path)[0].run(settings)
+    second = make_sweep(store=store, checkpoint=SweepCheckpoint(path))[0].run(settings)
+
+    np.testing.assert_array_equal(first, second)
+    assert first["integrations"].tolist() == [1, 1, 1, 1]
+
+
+def test_checkpoint_skips_a_line_cut_short(tmp_path: Path) -> None:
+    path = tmp_path / "visibility.jsonl"
+    checkpoint = SweepCheckpoint(path)
+    checkpoint.record({"signal_hwp": 0, "idler_hwp": 45}, (1, 2), 500, 45, 1)
+    with path.open("a") as file:
+        file.write('{"angles": {"signal_hwp": 45, "idl')
+
+    store = MeasurementStore()
+    assert checkpoint.load(store) == 1
+    assert len(store) == 1
+
+
+def test_checkpoint_skips_integrations_the_store_would_have_expired(tmp_path: Path) -> None:
+    path = tmp_path / "old.jsonl"
+    record = {"angles": {"signal_hwp": 0}, "channels": [1, 2], "binwidth_ps": 500, "counts": 10}
+    lines = [{**record, "integration_time_s": 1, "time": time.time() - age_s} for age_s in (7200, 60)]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    store = MeasurementStore(max_age_s=3600)
+
+    assert SweepCheckpoint(path).load(store) == 1
+    stored = store.get(store.key({"signal_hwp": 0}, (1, 2), 500))
+    assert stored is not None
+    assert stored.oldest_at == pytest.approx(time.time() - 60, abs=5)
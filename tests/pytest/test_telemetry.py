@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+
+from pqnstack.network.instrument_provider import InstrumentProvider
+from pqnstack.network.telemetry import LATENCY_BUCKETS_MS
+from pqnstack.network.telemetry import TelemetryRecorder
+from pqnstack.network.telemetry import TelemetrySnapshot
+from pqnstack.network.telemetry import TelemetryStore
+from pqnstack.pqn.drivers.dummies import DummyInstrument
+from pqnstack.pqn.drivers.rotator import APTRotator
+
+
+def test_recorder_histogram() -> None:
+    recorder = TelemetryRecorder()
+    recorder.record("rotator", 0.0005, error=False)
+    recorder.record("rotator", 0.015, error=True)
+    recorder.record("rotator", 60.0, error=False)
+
+    snapshot = recorder.snapshot("provider", {"rotator": {"position": 45}, "timetagger": {}})
+    rotator = snapshot.instruments["rotator"]
+
+    assert rotator.calls == 3  # noqa: PLR2004
+    assert rotator.errors == 1
+    assert rotator.latency_counts[0] == 1
+    assert rotator.latency_counts[LATENCY_BUCKETS_MS.index(20)] == 1
+    assert rotator.latency_counts[-1] == 1
+    assert rotator.hw_status == {"position": 45}
+    assert snapshot.instruments["timetagger"].calls == 0
+
+    # Snapshots are copies, later calls do not change what was already sent.
+    recorder.record("rotator", 0.001, error=False)
+    assert rotator.calls == 3  # noqa: PLR2004
+
+
+def test_store_ring_buffer() -> None:
+    store = TelemetryStore(history=3)
+    for t in range(5):
+        store.add(TelemetrySnapshot(provider="a", timestamp=float(t), instruments={}))
+    store.add(TelemetrySnapshot(provider="b", timestamp=2.5, instruments={}))
+
+    assert [s.timestamp for s in store.query("a")] == [2.0, 3.0, 4.0]
+    assert [s.timestamp for s in store.query(since=2.0)] == [2.5, 3.0, 4.0]
+    assert store.query("missing") == []
+    assert store.latest("b") == TelemetrySnapshot(provider="b", timestamp=2.5, instruments={})
+    assert store.providers == ["a", "b"]
+
+
+def test_heartbeat_status_skips_logged_parameters(caplog: pytest.LogCaptureFixture) -> None:
+    rotator = APTRotator(name="hwp", desc="", hw_address="", simulated=True)
+    rotator.start()
+    provider = InstrumentProvider("provider")
+    provider.instantiated_instruments = {
+        "hwp": rotator,
+        "dummy": DummyInstrument(name="dummy", desc="", hw_address=""),
+    }
+
+    with caplog.at_level(logging.DEBUG):
+        snapshot = provider._telemetry_snapshot()  # noqa: SLF001
+    rotator.close()
+
+    assert snapshot.instruments["hwp"].hw_status["position"] == 0
+    assert snapshot.instruments["dummy"].hw_status == {}
+    assert not [record for record in caplog.records if "got read" in record.getMessage()]
@@ -0,0 +1,120 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from pqnstack.constants import BellState
+from pqnstack.pqn.protocols import sweep
+from pqnstack.pqn.protocols import tomography
+from pqnstack.pqn.protocols.measurement import MeasurementConfig
+from pqnstack.pqn.protocols.tomography import TOMOGRAPHY_BASIS
+from pqnstack.pqn.protocols.tomography import TOMOGRAPHY_PROJECTORS
+
+
+def werner(bell_state: BellState, p: float) -> npt.NDArray[np.complex128]:
+    state = tomography.bell_state_vector(bell_state)
+    return np.asarray(p * np.outer(state, state.conj()) + (1 - p) * np.eye(4) / 4, dtype=np.complex128)
+
+
+def expected_counts(rho: npt.NDArray[np.complex128], counts_per_setting: float) -> npt.NDArray[np.float64]:
+    return np.asarray(np.einsum("kij,ji->k", TOMOGRAPHY_PROJECTORS, rho).real * counts_per_setting, dtype=np.float64)
+
+
+@pytest.mark.parametrize("bell_state", list(BellState))
+@pytest.mark.parametrize("method", ["mle", "linear"])
+def test_bell_states_are_reconstructed(bell_state: BellState, method: str) -> None:
+    counts = expected_counts(werner(bell_state, 1.0), 1000)
+
+    result = tomography.reconstruct(counts, bell_state, method=method)
+
+    assert result.fidelity == pytest.approx(1, abs=1e-4)
+    assert result.concurrence == pytest.approx(1, abs=1e-3)
+    assert result.purity == pytest.approx(1, abs=1e-4)
+
+
+@pytest.mark.parametrize("p", [0.2, 0.6, 0.9])
+def test_werner_state_figures_of_merit(p: float) -> None:
+    result = tomography.reconstruct(expected_counts(werner(BellState.Phi_plus, p), 1000))
+
+    assert result.fidelity == pytest.approx((3 * p + 1) / 4, abs=1e-4)
+    assert result.concurrence == pytest.approx(max(0, (3 * p - 1) / 2), abs=1e-3)
+    assert result.purity == pytest.approx((1 + 3 * p**2) / 4, abs=1e-4)
+    assert tomography.fidelity(result.density_matrix, tomography.bell_state_vector(BellState.Psi_plus)) == (
+        pytest.approx((1 - p) / 4, abs=1e-4)
+    )
+
+
+def test_maximum_likelihood_is_physical_and_more_likely() -> None:
+    rng = np.random.default_rng(0)
+    counts = rng.poisson(expected_counts(werner(BellState.Phi_plus, 0.95), 50))
+
+    linear = tomography.linear_inversion(counts)
+    rho, _ = tomography.maximum_likelihood(counts)
+
+    # Few counts of a nearly pure state, the linear inversion has negative eigenvalues.
+    assert np.linalg.eigvalsh(linear).min() < 0
+    assert np.linalg.eigvalsh(rho).min() > -1e-12  # noqa: PLR2004
+    assert np.trace(rho).real == pytest.approx(1)
+    np.testing.assert_allclose(rho, rho.conj().T, atol=1e-12)
+    projected = tomography.project_to_density_matrix(linear)
+    assert tomography.log_likelihood(counts, rho) > tomography.log_likelihood(counts, projected)
+
+
+def test_reconstruction_takes_milliseconds() -> None:
+    rng = np.random.default_rng(1)
+    counts = [rng.poisson(expected_counts(werner(BellState.Phi_plus, 0.9), 1000)) for _ in range(20)]
+    tomography.reconstruct(counts[0])
+
+    durations = []
+    for n in counts:
+        start = time.perf_counter()
+        tomography.reconstruct(n)
+        durations.append(time.perf_counter() - start)
+
+    assert np.median(durations) < 0.02  # noqa: PLR2004
+
+
+def test_reconstruct_rejects_wrong_counts() -> None:
+    with pytest.raises(ValueError, match="36 counts"):
+        tomography.reconstruct([1, 2, 3])
+    with pytest.raises(ValueError, match="method"):
+        tomography.reconstruct(np.ones(36), method="bayesian")
+    with pytest.raises(ValueError, match="without counts"):
+        tomography.reconstruct(np.zeros(36))
+
+
+@dataclass
+class FakeMotor:
+    degrees: float = 0.0
+
+    def move_to(self, angle: float) -> float:
+        self.degrees = angle
+        return angle
+
+
+@dataclass
+class FakeTagger:
+    """Coincidences of a Phi+ source, looked up from the labels of the waveplate angles."""
+
+    devices: tomography.Devices
+
+    def measure_correlation(self, start_ch: int, stop_ch: int, integration_time_s: float, binwidth_ps: int) -> int:  # noqa: ARG002
+        labels = {angles: label for label, angles in TOMOGRAPHY_BASIS.settings.items()}
+        signal = labels[(self.devices.signal_hwp.degrees, self.devices.signal_qwp.degrees)]
+        idler = labels[(self.devices.idler_hwp.degrees, self.devices.idler_qwp.degrees)]
+        probabilities = expected_counts(werner(BellState.Phi_plus, 1.0), 1.0)
+        return round(float(probabilities[TOMOGRAPHY_BASIS.pairs.index((signal, idler))]) * 500 * integration_time_s)
+
+
+def test_measure_tomography(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sweep.time, "sleep", lambda _: None)
+    devices = tomography.Devices(FakeMotor(), FakeMotor(), FakeMotor(), FakeMotor(), timetagger=None)
+    devices.timetagger = FakeTagger(devices)
+
+    value, result = tomography.measure_tomography(devices, MeasurementConfig(integration_time_s=2))
+
+    assert len(value.tomography_raw_counts) == 36  # noqa: PLR2004
+    assert result.fidelity > 0.999  # noqa: PLR2004
+    assert result.concurrence > 0.99  # noqa: PLR2004
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from pqnstack.base.tracing import Tracer
+
+
+def test_disabled_tracer_does_not_format() -> None:
+    tracer = Tracer()
+
+    def attributes() -> dict[str, object]:
+        pytest.fail("Attributes should not be evaluated while tracing is disabled")
+
+    assert tracer.start_span("op", attributes=attributes) is None
+    with tracer.span("op", attributes=attributes) as span:
+        assert span is None
+    assert len(tracer.spans) == 0
+
+
+def test_nested_spans_and_remote_parent() -> None:
+    tracer = Tracer()
+    tracer.enable(process="client", capacity=3)
+
+    with tracer.span("outer", attributes=lambda: {"payload": list(range(1000))}) as outer:
+        assert outer is not None
+        with tracer.span("inner") as inner:
+            assert inner is not None
+    assert tracer.current() is None
+
+    # A span started from the context carried by a packet joins the trace of the sender.
+    remote = tracer.start_span("provider", parent=outer.context)
+    tracer.end_span(remote, error="instrument failed")
+
+    assert inner.context.trace_id == outer.context.trace_id
+    assert inner.parent_id == outer.context.span_id
+    assert outer.parent_id is None
+    assert remote is not None
+    assert remote.parent_id == outer.context.span_id
+    assert remote.error
+    assert outer.attributes["payload"].endswith("...")
+
+    with pytest.raises(RuntimeError), tracer.span("failing"):
+        raise RuntimeError
+
+    # Ring buffer keeps the last spans only.
+    assert [s.name for s in tracer.spans] == ["outer", "provider", "failing"]
+
+
+def test_exports(tmp_path: Path) -> None:
+    tracer = Tracer()
+    tracer.enable(process="router")
+    with tracer.span("forward", attributes=lambda: {"hops": 1}):
+        pass
+
+    tracer.export(tmp_path / "trace.json")
+    chrome = json.loads((tmp_path / "trace.json").read_text())
+    event = chrome["traceEvents"][-1]
+    assert event["ph"] == "X"
+    assert event["name"] == "forward"
+    assert event["args"]["hops"] == "1"
+
+    tracer.export(tmp_path / "trace.otlp.json", "otlp")
+    otlp = json.loads((tmp_path / "trace.otlp.json").read_text())
+    resource = otlp["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "router"
+    assert resource["scopeSpans"][0]["spans"][0]["name"] == "forward"